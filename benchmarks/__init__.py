@@ -0,0 +1 @@
+"""Benchmark harness: a scripted stand-in for soulseek-cli and a synthetic Spotify playlist."""
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+fake_soulseek.py: Scripted stand-in for the soulseek-cli commands the syncer runs.
+
+Supports `soulseek login`, `soulseek query <q>` and the interactive
+`soulseek download <q> --destination <dir> [--mode mp3|flac]`. Behaviour is
+set through environment variables and is deterministic per query and mode:
+
+  FAKE_SOULSEEK_LATENCY           mean seconds before a listing (or miss) is printed
+  FAKE_SOULSEEK_DOWNLOAD_LATENCY  mean seconds a chosen download takes
+  FAKE_SOULSEEK_HIT_RATE          share of (query, mode) pairs that list results
+  FAKE_SOULSEEK_RESULTS           number of files listed on a hit
+  FAKE_SOULSEEK_FILE_SIZE         bytes written for a downloaded file
+  FAKE_SOULSEEK_SEED              changes which queries hit
+  FAKE_SOULSEEK_LOG               file that gets one line per invocation
+"""
+
+import os
+import sys
+import time
+import zlib
+
+
+def setting(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def unit(*parts: str) -> float:
+    """Stable pseudo-random number in [0, 1) for the given key."""
+    key = ':'.join((os.environ.get('FAKE_SOULSEEK_SEED', '0'),) + parts)
+    return zlib.crc32(key.encode()) / 2 ** 32
+
+
+def pause(mean: float, *key: str) -> None:
+    if mean > 0:
+        time.sleep(mean * (0.5 + unit('latency', *key)))
+
+
+def log(argv) -> None:
+    path = os.environ.get('FAKE_SOULSEEK_LOG')
+    if path:
+        with open(path, 'a') as f:
+            f.write('\t'.join(argv) + '\n')
+
+
+def option(argv, name: str, default: str = '') -> str:
+    return argv[argv.index(name) + 1] if name in argv[:-1] else default
+
+
+def listing(query: str, mode: str, count: int) -> str:
+    ext = 'flac' if mode == 'flac' else 'mp3'
+    lines = [f"{count} results found"]
+    for i in range(1, count + 1):
+        attrs = [] if ext == 'flac' else [f"{(320, 256, 192, 128)[(i - 1) % 4]} kbps"]
+        attrs += [f"{8 + i % 5} MB", f"{1 + i % 3} MB/s"]
+        lines.append(f"{i}. [peer{i}] Music\\Artist {i}\\{query}.{ext} ({', '.join(attrs)})")
+    return '\n'.join(lines) + '\n? Choose a file to download '
+
+
+def download(argv) -> int:
+    query = argv[1] if len(argv) > 1 else ''
+    destination = option(argv, '--destination', '.')
+    mode = option(argv, '--mode', 'mp3')
+    pause(setting('FAKE_SOULSEEK_LATENCY', 0.05), 'query', query, mode)
+    if unit('hit', query, mode) >= setting('FAKE_SOULSEEK_HIT_RATE', 0.5):
+        print("No search results")
+        return 0
+    count = max(1, int(setting('FAKE_SOULSEEK_RESULTS', 5)))
+    sys.stdout.write(listing(query, mode, count))
+    sys.stdout.flush()
+    choice = sys.stdin.readline().strip()
+    if not choice.isdigit() or not 1 <= int(choice) <= count:
+        return 1
+    pause(setting('FAKE_SOULSEEK_DOWNLOAD_LATENCY', 0.05), 'download', query, mode)
+    ext = 'flac' if mode == 'flac' else 'mp3'
+    folder = os.path.join(destination, f"Artist {choice}")
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, f"{query}.{ext}"), 'wb') as f:
+        f.write(b'\0' * max(1, int(setting('FAKE_SOULSEEK_FILE_SIZE', 4096))))
+    print(f"Downloaded {query}.{ext}")
+    return 0
+
+
+def main(argv=None) -> int:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    log(argv)
+    command = argv[0] if argv else ''
+    if command == 'login':
+        print("Logged in")
+        return 0
+    if command == 'query':
+        pause(setting('FAKE_SOULSEEK_LATENCY', 0.05), 'query', *argv[1:2])
+        print("1 results found")
+        return 0
+    if command == 'download':
+        return download(argv)
+    print(f"Unknown command: {command}", file=sys.stderr)
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
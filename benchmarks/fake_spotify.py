@@ -0,0 +1,77 @@
+"""
+fake_spotify.py: In-memory stand-in for the spotipy client with a synthetic playlist.
+"""
+
+import threading
+from typing import Dict, List, Optional
+
+# Spotify serves playlist items 100 per page
+PAGE_SIZE = 100
+
+_WORDS = (
+    'blue', 'night', 'river', 'golden', 'echo', 'paper', 'summer', 'glass', 'wild', 'silver',
+    'heart', 'city', 'ghost', 'fire', 'ocean', 'shadow', 'velvet', 'thunder', 'neon', 'garden',
+)
+
+
+def synthetic_tracks(count: int, seed: int = 0) -> List[dict]:
+    """Playlist item dicts shaped like the Web API's, with distinct titles and a few artists."""
+    items = []
+    for i in range(count):
+        n = i + seed * count
+        title = f"{_WORDS[n % 20].title()} {_WORDS[(n // 20) % 20].title()} {n}"
+        items.append({'track': {
+            'id': f"track{n:06d}",
+            'uri': f"spotify:track:track{n:06d}",
+            'name': title,
+            'artists': [{'name': f"Artist {n % 97}"}],
+            'duration_ms': 150000 + (n * 7919) % 120000,
+        }})
+    return items
+
+
+class FakeSpotipy:
+    """Serves one synthetic playlist through the spotipy calls SpotifyClient makes.
+
+    Every call is counted in `calls`; removals change the snapshot_id like
+    the real API does.
+    """
+    def __init__(self, count: int, seed: int = 0, page_size: int = PAGE_SIZE) -> None:
+        self.items = synthetic_tracks(count, seed)
+        self.page_size = page_size
+        self.snapshot = 1
+        self.calls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def _page(self, offset: int) -> dict:
+        end = offset + self.page_size
+        return {
+            'items': self.items[offset:end],
+            'offset': offset,
+            'total': len(self.items),
+            'next': end if end < len(self.items) else None,
+        }
+
+    def playlist(self, playlist_id, fields=None) -> dict:
+        self._count('playlist')
+        return {'snapshot_id': f"snap{self.snapshot}"}
+
+    def playlist_items(self, playlist_id) -> dict:
+        self._count('playlist_items')
+        return self._page(0)
+
+    def next(self, result) -> Optional[dict]:
+        self._count('next')
+        return self._page(result['next']) if result.get('next') else None
+
+    def playlist_remove_all_occurrences_of_items(self, playlist_id, uris, snapshot_id=None) -> dict:
+        self._count('remove')
+        gone = set(uris)
+        with self._lock:
+            self.items = [item for item in self.items if item['track']['uri'] not in gone]
+            self.snapshot += 1
+            return {'snapshot_id': f"snap{self.snapshot}"}
@@ -0,0 +1,199 @@
+"""
+sync_benchmark.py: End-to-end sync throughput benchmark.
+
+Runs the real Syncer, SpotifyClient and SoulseekSearcher against a synthetic
+playlist (fake_spotify.py) and a scripted `soulseek` executable
+(fake_soulseek.py) placed first on PATH, in a throwaway download directory
+and State database. Usage:
+
+    python -m benchmarks.sync_benchmark --tracks 500 --latency 0.2 --hit-rate 0.6
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import resource
+import shutil
+import stat
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+from benchmarks.fake_spotify import FakeSpotipy
+
+_FAKE_SOULSEEK = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_soulseek.py')
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def _peak_rss_mb(who: int) -> float:
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def install_fake_soulseek(bin_dir: str) -> str:
+    """Write a `soulseek` launcher for fake_soulseek.py into bin_dir."""
+    os.makedirs(bin_dir, exist_ok=True)
+    path = os.path.join(bin_dir, 'soulseek')
+    with open(path, 'w') as f:
+        f.write(f"#!/bin/sh\nexec {sys.executable} {_FAKE_SOULSEEK} \"$@\"\n")
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return path
+
+
+def run_benchmark(tracks: int = 100, workers: Optional[int] = None, latency: float = 0.05,
+                  download_latency: float = 0.05, hit_rate: float = 0.5, results: int = 5,
+                  file_size: int = 4096, seed: int = 0, hedge_variants: Optional[int] = None,
+                  delete_after: bool = True, workdir: Optional[str] = None) -> Dict[str, object]:
+    """Run one sync of a synthetic playlist and return its throughput figures.
+
+    The fake CLI's behaviour is fixed by its arguments and seed, so runs with
+    the same settings spawn the same searches and are directly comparable.
+    """
+    from spotify_syncer import torrent_searchers
+    from spotify_syncer.query_cache import QueryCache
+    from spotify_syncer.soulseek_cli import SoulseekAuth
+    from spotify_syncer.spotify_client import SpotifyClient
+    from spotify_syncer.state import State
+    from spotify_syncer.syncer import Syncer
+    from spotify_syncer.timeouts import AdaptiveTimeouts
+    from spotify_syncer.torrent_searchers import SoulseekSearcher
+    from spotify_syncer.variant_stats import VariantStats
+    from spotify_syncer.work_queue import WorkQueue
+
+    root = tempfile.mkdtemp(prefix='spotify-syncer-bench-', dir=workdir)
+    spawn_log = os.path.join(root, 'soulseek.log')
+    download_dir = os.path.join(root, 'downloads')
+    os.makedirs(download_dir)
+    install_fake_soulseek(os.path.join(root, 'bin'))
+    env = {
+        'PATH': os.path.join(root, 'bin') + os.pathsep + os.environ.get('PATH', ''),
+        'FAKE_SOULSEEK_LATENCY': str(latency),
+        'FAKE_SOULSEEK_DOWNLOAD_LATENCY': str(download_latency),
+        'FAKE_SOULSEEK_HIT_RATE': str(hit_rate),
+        'FAKE_SOULSEEK_RESULTS': str(results),
+        'FAKE_SOULSEEK_FILE_SIZE': str(file_size),
+        'FAKE_SOULSEEK_SEED': str(seed),
+        'FAKE_SOULSEEK_LOG': spawn_log,
+    }
+    saved_env = {name: os.environ.get(name) for name in env}
+    saved_download_dir = torrent_searchers.DOWNLOAD_DIR
+    os.environ.update(env)
+    torrent_searchers.DOWNLOAD_DIR = download_dir
+
+    latencies: List[float] = []
+    latencies_lock = threading.Lock()
+
+    class TimedSyncer(Syncer):
+        def process_one(self, track):
+            started = time.perf_counter()
+            try:
+                return super().process_one(track)
+            finally:
+                with latencies_lock:
+                    latencies.append(time.perf_counter() - started)
+
+    state = State(os.path.join(root, 'state.db'), write_behind=True)
+    try:
+        fake = FakeSpotipy(tracks, seed=seed)
+        searcher = SoulseekSearcher(
+            auth=SoulseekAuth(), hedge_variants=hedge_variants,
+            cache=QueryCache(state), stats=VariantStats(state), timeouts=AdaptiveTimeouts(state),
+        )
+        queue = WorkQueue(state)
+        searcher.on_download = queue.mark_downloading
+        searcher.on_attempt = queue.renew
+        syncer = TimedSyncer(SpotifyClient(state, sp=fake), state, searcher,
+                             workers=workers, delete_after=delete_after, queue=queue)
+        started = time.perf_counter()
+        syncer.sync()
+        elapsed = time.perf_counter() - started
+        downloaded = len(state.downloaded)
+    finally:
+        state.conn.close()
+        torrent_searchers.DOWNLOAD_DIR = saved_download_dir
+        for name, value in saved_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+    spawns: Dict[str, int] = {}
+    if os.path.exists(spawn_log):
+        with open(spawn_log) as f:
+            for line in f:
+                command = line.split('\t', 1)[0].strip()
+                spawns[command] = spawns.get(command, 0) + 1
+    shutil.rmtree(root, ignore_errors=True)
+
+    processed = len(latencies)
+    return {
+        'tracks': tracks,
+        'processed': processed,
+        'downloaded': downloaded,
+        'workers': syncer.workers,
+        'seconds': round(elapsed, 3),
+        'tracks_per_minute': round(processed / elapsed * 60, 1) if elapsed else 0.0,
+        'cli_spawns': sum(spawns.values()),
+        'cli_spawns_by_command': spawns,
+        'spawns_per_track': round(sum(spawns.values()) / processed, 2) if processed else 0.0,
+        'latency_p50': round(percentile(latencies, 0.5), 3),
+        'latency_p95': round(percentile(latencies, 0.95), 3),
+        'peak_rss_mb': round(_peak_rss_mb(resource.RUSAGE_SELF), 1),
+        'peak_child_rss_mb': round(_peak_rss_mb(resource.RUSAGE_CHILDREN), 1),
+        'spotify_calls': dict(fake.calls),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1].strip())
+    parser.add_argument('--tracks', type=int, default=100, help='playlist size (10-10000)')
+    parser.add_argument('--workers', type=int, default=None, help='sync workers (default: SYNC_WORKERS)')
+    parser.add_argument('--latency', type=float, default=0.05, help='mean seconds until a listing')
+    parser.add_argument('--download-latency', type=float, default=0.05, help='mean seconds per download')
+    parser.add_argument('--hit-rate', type=float, default=0.5, help='share of queries that list results')
+    parser.add_argument('--results', type=int, default=5, help='files per listing')
+    parser.add_argument('--file-size', type=int, default=4096, help='bytes per downloaded file')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--hedge-variants', type=int, default=None)
+    parser.add_argument('--keep-playlist', action='store_true', help='do not remove downloaded tracks')
+    parser.add_argument('--json', action='store_true', help='print the result as JSON')
+    parser.add_argument('--verbose', action='store_true', help='keep INFO logging')
+    args = parser.parse_args(argv)
+
+    if not 10 <= args.tracks <= 10000:
+        parser.error('--tracks must be between 10 and 10000')
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s %(levelname)s:%(name)s:%(message)s')
+
+    result = run_benchmark(
+        tracks=args.tracks, workers=args.workers, latency=args.latency,
+        download_latency=args.download_latency, hit_rate=args.hit_rate, results=args.results,
+        file_size=args.file_size, seed=args.seed, hedge_variants=args.hedge_variants,
+        delete_after=not args.keep_playlist,
+    )
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return 0
+    print(f"{result['processed']} tracks ({result['downloaded']} downloaded) in {result['seconds']}s "
+          f"with {result['workers']} workers")
+    print(f"  throughput      {result['tracks_per_minute']} tracks/min")
+    print(f"  CLI spawns      {result['cli_spawns']} ({result['spawns_per_track']} per track) "
+          f"{result['cli_spawns_by_command']}")
+    print(f"  track latency   p50 {result['latency_p50']}s  p95 {result['latency_p95']}s")
+    print(f"  peak RSS        {result['peak_rss_mb']} MB (largest child {result['peak_child_rss_mb']} MB)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
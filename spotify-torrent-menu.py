@@ -7,24 +7,24 @@ spotify-torrent-menu.py: Cross-platform tray app for Spotify-to-Torrent synchron
 """
 import sys
 import os
-import threading
-import time
 import subprocess
 import logging
-import spotify_env_gui
 
 from spotify_syncer.events import event_bus
 from spotify_syncer.container import Container
-from spotify_syncer.config import DOWNLOAD_DIR, validate_env, DELETE_AFTER_DOWNLOADED
-
-# Logging setup: write to ~/spotifytorrent.log with rotation handled elsewhere
-LOG_PATH = os.path.expanduser('~/spotifytorrent.log')
-logging.basicConfig(
-    filename=LOG_PATH,
-    level=logging.INFO,
-    format='%(asctime)s %(levelname)s:%(message)s'
+from spotify_syncer.scheduler import SyncScheduler
+from spotify_syncer.config import (
+    DOWNLOAD_DIR, LOG_FILE as LOG_PATH, SYNC_INTERVAL, SYNC_MAX_INTERVAL, setup_logging, validate_env,
 )
 
+setup_logging()
+
+
+def open_settings_gui():
+    # Imported on demand: tkinter is slow to load and only needed for this window
+    import spotify_env_gui
+    spotify_env_gui.main()
+
 if sys.platform == 'darwin':
     import rumps
 
@@ -32,21 +32,30 @@ if sys.platform == 'darwin':
         def __init__(self):
             super().__init__("🎶", quit_button=None)
             self.title = "🎧 idle"
-            self.menu = ["Sync Now", "Settings", "Check for Updates", "Open Logs", "Clear State", None, "Quit"]
+            self.menu = ["Sync Now", "Retry Failed", "Settings", "Check for Updates", "Open Logs", "Clear State", None, "Quit"]
             container = Container()
             self.sp = container.spotify_client
             self.state = container.state
             self.searcher = container.searcher
+            self.syncer = container.syncer
+            # Runs every sync (timed and manual) one at a time
+            self.scheduler = SyncScheduler(self._sync, SYNC_INTERVAL, SYNC_MAX_INTERVAL)
+            self.scheduler.start(immediately=False)
 
         @rumps.clicked("Sync Now")
         def manual_sync(self, _):
             self.sync_all()
             event_bus.publish('manual_sync')
 
+        @rumps.clicked("Retry Failed")
+        def retry_failed(self, _):
+            self.sync_all(force=True)
+            event_bus.publish('manual_sync')
+
         @rumps.clicked("Settings")
         def open_settings(self, _):
             try:
-                spotify_env_gui.main()
+                open_settings_gui()
             except Exception as e:
                 rumps.alert(f"Failed to open settings: {e}")
 
@@ -60,6 +69,9 @@ if sys.platform == 'darwin':
                 rumps.notification("SpotifyTorrent", None, "Checking for updates...")
                 subprocess.check_call([script])
                 rumps.notification("SpotifyTorrent", None, "Update complete, restarting...")
+                # execv skips atexit handlers, so persist queued state and events first
+                self.state.flush()
+                event_bus.stop()
                 os.execv(sys.executable, [sys.executable, os.path.abspath(__file__)])
             except Exception as e:
                 rumps.alert(f"Update failed: {e}")
@@ -76,45 +88,18 @@ if sys.platform == 'darwin':
 
         @rumps.clicked("Quit")
         def quit_app(self, _):
+            self.scheduler.stop(timeout=5)
             rumps.quit_application()
 
-        @rumps.timer(300)
-        def auto_sync(self, _):
-            self.sync_all()
-
-        def sync_all(self):
-            threading.Thread(target=self._sync, daemon=True).start()
+        def sync_all(self, force=False):
+            self.scheduler.trigger(force=force)
 
-        def _sync(self):
-            logging.info("Sync started")
+        def _sync(self, force=False):
+            self.title = "🔄 syncing..."
             try:
-                self.title = "🔄 syncing..."
-                tracks = self.sp.get_tracks()
-                for track in tracks:
-                    if track.id not in self.state.downloaded:
-                        self._process_one(track)
-                    else:
-                        logging.info(f"Skipping already downloaded track: {track.name} by {track.artist}")
+                return self.syncer.sync(force=force)
+            finally:
                 self.title = "🎧 idle"
-                logging.info("Sync finished")
-            except Exception:
-                logging.exception("Exception occurred during sync")
-
-        def _process_one(self, track):
-            """Process a single track: search via Soulseek, notify, and remove."""
-            query = f"{track.name} {track.artist}"
-            logging.info(f"Searching Soulseek for: '{query}'")
-            result = self.searcher.search(query)
-            if not result:
-                logging.warning(f"No download for {query}")
-                event_bus.publish('torrent_not_found', query, track_name=track.name)
-                return
-            if DELETE_AFTER_DOWNLOADED:
-                self.sp.remove_tracks([track.uri])
-            self.state.add(track.id)
-            msg = f"✔️ {track.name} by {track.artist}"
-            logging.info(msg)
-            event_bus.publish('download_success', track)
 
     def main():
         try:
@@ -122,7 +107,7 @@ if sys.platform == 'darwin':
         except SystemExit:
             # Missing configuration: open settings GUI and exit
             try:
-                spotify_env_gui.main()
+                open_settings_gui()
             except Exception:
                 pass
             sys.exit(0)
@@ -140,7 +125,7 @@ elif sys.platform.startswith('linux'):
             except SystemExit:
                 # Missing configuration: open settings GUI and exit
                 try:
-                    spotify_env_gui.main()
+                    open_settings_gui()
                 except Exception:
                     pass
                 sys.exit(0)
@@ -148,12 +133,15 @@ elif sys.platform.startswith('linux'):
             self.sp = container.spotify_client
             self.state = container.state
             self.searcher = container.searcher
+            self.syncer = container.syncer
+            self.scheduler = SyncScheduler(self._sync, SYNC_INTERVAL, SYNC_MAX_INTERVAL)
             self.icon = pystray.Icon(
                 "SpotifyTorrent",
                 self._create_image(),
                 "SpotifyTorrent",
                 menu=Menu(
                     Item("Sync Now", self.manual_sync),
+                    Item("Retry Failed", self.retry_failed),
                     Item("Settings", self.open_settings),
                     Item("Check for Updates", self.check_updates),
                     Item("Open Logs", self.open_logs),
@@ -174,48 +162,24 @@ elif sys.platform.startswith('linux'):
             return image
 
         def run(self):
-            # Start periodic sync
-            threading.Thread(target=self._auto_sync_loop, daemon=True).start()
+            # Start periodic sync; the scheduler never lets two syncs overlap
+            self.scheduler.start(immediately=False)
             self.icon.run()
 
-        def _auto_sync_loop(self):
-            while True:
-                time.sleep(300)
-                self.manual_sync()
-
         def manual_sync(self, icon=None, item=None):
-            threading.Thread(target=self._sync, daemon=True).start()
+            self.scheduler.trigger()
+            event_bus.publish('manual_sync')
+
+        def retry_failed(self, icon=None, item=None):
+            self.scheduler.trigger(force=True)
             event_bus.publish('manual_sync')
 
-        def _sync(self):
-            logging.info("Sync started")
+        def _sync(self, force=False):
+            self.icon.title = "🔄 syncing..."
             try:
-                self.icon.title = "🔄 syncing..."
-                tracks = self.sp.get_tracks()
-                for track in tracks:
-                    if track.id not in self.state.downloaded:
-                        self._process_one(track)
-                    else:
-                        logging.info(f"Skipping already downloaded track: {track.name} by {track.artist}")
+                return self.syncer.sync(force=force)
+            finally:
                 self.icon.title = "idle"
-                logging.info("Sync finished")
-            except Exception:
-                logging.exception("Exception occurred during sync")
-
-        def _process_one(self, track):
-            query = f"{track.name} {track.artist}"
-            logging.info(f"Searching Soulseek for: '{query}'")
-            result = self.searcher.search(query)
-            if not result:
-                logging.warning(f"No download for {query}")
-                event_bus.publish('torrent_not_found', query, track_name=track.name)
-                return
-            if DELETE_AFTER_DOWNLOADED:
-                self.sp.remove_tracks([track.uri])
-            self.state.add(track.id)
-            msg = f"✔️ {track.name} by {track.artist}"
-            logging.info(msg)
-            event_bus.publish('download_success', track)
 
         def clear_state(self, icon=None, item=None):
             self.state.clear()
@@ -231,7 +195,7 @@ elif sys.platform.startswith('linux'):
 
         def open_settings(self, icon=None, item=None):
             try:
-                spotify_env_gui.main()
+                open_settings_gui()
             except Exception as e:
                 print(f"Failed to open settings: {e}")
 
@@ -244,11 +208,15 @@ elif sys.platform.startswith('linux'):
                 subprocess.call(["notify-send", "SpotifyTorrent", "Checking for updates..."])
                 subprocess.check_call([script])
                 subprocess.call(["notify-send", "SpotifyTorrent", "Update complete, restarting..."])
+                # execv skips atexit handlers, so persist queued state and events first
+                self.state.flush()
+                event_bus.stop()
                 os.execv(sys.executable, [sys.executable, os.path.abspath(__file__)])
             except Exception as e:
                 subprocess.call(["notify-send", "SpotifyTorrent", f"Update failed: {e}"])
 
         def quit_app(self, icon=None, item=None):
+            self.scheduler.stop(timeout=5)
             self.icon.stop()
 
     def main():
@@ -0,0 +1,200 @@
+"""
+__main__.py: Headless command line entry point (no tray or GUI imports).
+
+    python -m spotify_syncer sync --once   # one sync, then exit (cron, CI)
+    python -m spotify_syncer daemon        # sync every SYNC_INTERVAL seconds (more rarely when idle) until SIGTERM/SIGINT
+    python -m spotify_syncer status        # what the state database knows, without contacting anything
+"""
+
+import argparse
+import json
+import logging
+import os
+import signal
+import sqlite3
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+
+def _configure_logging(verbose: bool) -> None:
+    from spotify_syncer.config import setup_logging
+    setup_logging(logging.DEBUG if verbose else logging.INFO)
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s:%(name)s:%(message)s'))
+    root = logging.getLogger()
+    root.addHandler(handler)
+
+
+def _container():
+    from spotify_syncer.config import validate_env
+    validate_env()
+    from spotify_syncer.container import Container
+    return Container()
+
+
+def _shutdown(container) -> None:
+    from spotify_syncer.events import event_bus
+    container.state.flush()
+    event_bus.stop()
+
+
+def run_once(force: bool = False) -> int:
+    """Run a single sync; returns the process exit code."""
+    container = _container()
+    try:
+        container.syncer.sync(force=force)
+    except Exception:
+        logging.getLogger(__name__).exception("Sync failed")
+        return 1
+    finally:
+        _shutdown(container)
+    return 0
+
+
+def run_daemon(interval: int, force: bool = False, stop: Optional[threading.Event] = None,
+               max_interval: Optional[int] = None) -> int:
+    """Sync on the scheduler's interval until stop is set (by SIGTERM/SIGINT when run from the CLI).
+
+    A signal during a sync lets it finish so its state and removals are
+    written; a second signal exits at once.
+    """
+    from spotify_syncer.config import SYNC_MAX_INTERVAL
+    from spotify_syncer.scheduler import SyncScheduler
+
+    stop = stop or threading.Event()
+
+    def handle(signum, frame):
+        if stop.is_set():
+            raise SystemExit(128 + signum)
+        logging.getLogger(__name__).info("Stopping after the current sync...")
+        stop.set()
+
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, handle)
+        signal.signal(signal.SIGINT, handle)
+
+    container = _container()
+    scheduler = SyncScheduler(container.syncer.sync, interval,
+                              SYNC_MAX_INTERVAL if max_interval is None else max_interval)
+    logging.getLogger(__name__).info(f"Syncing every {interval}s")
+    scheduler.start(immediately=False)
+    # The first sync runs now; only it honours --force, later ones respect retry backoff
+    scheduler.trigger(force=force)
+    try:
+        while not stop.wait(1):
+            pass
+    finally:
+        scheduler.stop()
+        _shutdown(container)
+    return 0
+
+
+def status(db_path: Optional[str] = None, limit: int = 5) -> Dict[str, object]:
+    """Summarise the state database: downloads, the cached playlist and tracks backing off.
+
+    The database is only read: a missing one reads as not synced yet, and an
+    older schema is left for the next sync to migrate.
+    """
+    from spotify_syncer.config import PLAYLIST_ID
+    from spotify_syncer.state import DEFAULT_DB_PATH, State
+    from spotify_syncer.work_queue import WorkQueue
+
+    result = {
+        'database': db_path or DEFAULT_DB_PATH,
+        'downloaded': 0,
+        'playlist_id': PLAYLIST_ID or None,
+        'snapshot_id': None,
+        'playlist_tracks': 0,
+        'pending': 0,
+        'backing_off': 0,
+        'next_retry_at': None,
+        'queue': {},
+        'recent_downloads': [],
+    }
+    if not os.path.exists(result['database']):
+        return result
+    state = None
+    try:
+        state = State(result['database'], read_only=True)
+        now = time.time()
+        result['downloaded'] = len(state.downloaded)
+        cached = state.get_playlist(PLAYLIST_ID) if PLAYLIST_ID else None
+        tracks = cached[1] if cached else []
+        waiting = [t for t in tracks if t.id not in state.downloaded and not state.is_due(t.id, now)]
+        result.update({
+            'snapshot_id': cached[0] if cached else None,
+            'playlist_tracks': len(tracks),
+            'pending': sum(1 for t in tracks if t.id not in state.downloaded) - len(waiting),
+            'backing_off': len(waiting),
+            'next_retry_at': min((state.failures[t.id][1] for t in waiting), default=None),
+        })
+        result['recent_downloads'] = [
+            {key: record[key] for key in ('name', 'artist', 'path', 'finished_at')}
+            for record in state.recent_downloads(limit)
+        ]
+        result['queue'] = WorkQueue(state).counts()
+    except sqlite3.OperationalError as e:
+        logging.warning(f"Partial status for {result['database']} (the next sync upgrades it): {e}")
+    finally:
+        if state is not None:
+            state.conn.close()
+    return result
+
+
+def _print_status(info: Dict[str, object]) -> None:
+    def when(timestamp):
+        return time.strftime('%Y-%m-%d %H:%M', time.localtime(timestamp)) if timestamp else '-'
+
+    print(f"Database:       {info['database']}")
+    print(f"Downloaded:     {info['downloaded']}")
+    if info['snapshot_id']:
+        print(f"Playlist:       {info['playlist_tracks']} tracks (snapshot {info['snapshot_id']}, as of the last sync)")
+        print(f"Pending:        {info['pending']}")
+        print(f"Backing off:    {info['backing_off']} (next retry {when(info['next_retry_at'])})")
+    else:
+        print("Playlist:       not synced yet")
+    queue = info['queue']
+    unfinished = sum(queue.get(status, 0) for status in ('pending', 'searching', 'downloading'))
+    if unfinished:
+        print(f"Work queue:     {unfinished} unfinished (resumed by the next sync)")
+    if info['recent_downloads']:
+        print("Recent downloads:")
+        for record in info['recent_downloads']:
+            print(f"  {when(record['finished_at'])}  {record['name']} by {record['artist']}")
+
+
+def main(argv=None) -> int:
+    from spotify_syncer.config import SYNC_INTERVAL
+
+    parser = argparse.ArgumentParser(prog='python -m spotify_syncer', description="Sync a Spotify playlist via Soulseek.")
+    parser.add_argument('-v', '--verbose', action='store_true', help='debug logging on stderr')
+    commands = parser.add_subparsers(dest='command', required=True)
+    sync = commands.add_parser('sync', help='sync the playlist')
+    sync.add_argument('--once', action='store_true', help='run a single sync and exit (default: keep syncing like daemon)')
+    sync.add_argument('--force', action='store_true', help='also retry tracks whose earlier searches failed')
+    sync.add_argument('--interval', type=int, default=SYNC_INTERVAL, help='seconds between syncs without --once')
+    daemon = commands.add_parser('daemon', help='sync every --interval seconds until stopped')
+    daemon.add_argument('--interval', type=int, default=SYNC_INTERVAL)
+    daemon.add_argument('--force', action='store_true', help='retry failed tracks on the first sync')
+    show = commands.add_parser('status', help='show what has been synced')
+    show.add_argument('--json', action='store_true', help='print machine-readable JSON')
+    show.add_argument('--db', default=None, help='state database (default: ~/.spotifytorrent.db)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'status':
+        info = status(args.db)
+        if args.json:
+            print(json.dumps(info, indent=2))
+        else:
+            _print_status(info)
+        return 0
+    _configure_logging(args.verbose)
+    if args.command == 'sync' and args.once:
+        return run_once(force=args.force)
+    return run_daemon(max(10, args.interval), force=args.force)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
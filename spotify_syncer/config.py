@@ -5,31 +5,31 @@ try:
 except ImportError:
     load_dotenv = lambda *args, **kwargs: None
     find_dotenv = lambda *args, **kwargs: ''
-    logging.getLogger(__name__).warning(
-        "python-dotenv not installed; .env files will not be loaded."
-    )
-# Lazy import Notifier for notifications
 
-# --- Logging configuration ---
-from logging.handlers import RotatingFileHandler
-
-# log file with rotation
+# Log file with rotation, attached by setup_logging() from the entry points
 LOG_FILE = os.path.expanduser('~/spotifytorrent.log')
-handler = RotatingFileHandler(LOG_FILE, maxBytes=5*1024*1024, backupCount=3)
-formatter = logging.Formatter('%(asctime)s %(levelname)s:%(name)s:%(message)s')
-handler.setFormatter(formatter)
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
-logger.addHandler(handler)
-
-# Load .env now that logging is configured
-dotenv_path = find_dotenv()
-if dotenv_path:
-    load_dotenv(dotenv_path)
-    logging.getLogger(__name__).info(f"Loaded environment variables from {dotenv_path}")
-else:
-    logging.getLogger(__name__).warning("No .env file found; defaults and shell env will be used.")
- # --- end logging configuration ---
+
+# Load .env before the settings below are read
+DOTENV_PATH = find_dotenv()
+if DOTENV_PATH:
+    load_dotenv(DOTENV_PATH)
+
+
+def setup_logging(level: int = logging.INFO) -> None:
+    """Send logs to LOG_FILE (5 MB, 3 backups); safe to call more than once."""
+    from logging.handlers import RotatingFileHandler
+
+    logger = logging.getLogger()
+    logger.setLevel(level)
+    if any(getattr(h, 'baseFilename', None) == LOG_FILE for h in logger.handlers):
+        return
+    handler = RotatingFileHandler(LOG_FILE, maxBytes=5*1024*1024, backupCount=3)
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s:%(name)s:%(message)s'))
+    logger.addHandler(handler)
+    if DOTENV_PATH:
+        logging.getLogger(__name__).info(f"Loaded environment variables from {DOTENV_PATH}")
+    else:
+        logging.getLogger(__name__).warning("No .env file found; defaults and shell env will be used.")
 
 # Required environment variables for application configuration
 REQUIRED_ENV_VARS = [
@@ -61,7 +61,8 @@ parsed = urlparse(raw_redirect)
 if parsed.hostname == 'localhost':
     netloc = parsed.netloc.replace('localhost', '127.0.0.1')
     REDIRECT_URI = urlunparse(parsed._replace(scheme='http', netloc=netloc))
-    logging.warning(f"Redirect URI hostname 'localhost' replaced with loopback IP: {REDIRECT_URI}")
+    # A named logger: the root one would run basicConfig() and add a stray handler before setup_logging()
+    logging.getLogger(__name__).warning(f"Redirect URI hostname 'localhost' replaced with loopback IP: {REDIRECT_URI}")
 else:
     REDIRECT_URI = raw_redirect
 
@@ -85,3 +86,61 @@ DELETE_AFTER_DOWNLOADED = os.getenv('DELETE_AFTER_DOWNLOADED', 'true').strip().l
 # Soulseek credentials
 SOULSEEK_ACCOUNT = os.getenv('SOULSEEK_ACCOUNT')
 SOULSEEK_PASSWORD = os.getenv('SOULSEEK_PASSWORD')
+
+
+def _env_int(name: str, default: int, minimum: int = 0) -> int:
+    """Read an integer setting from the environment, falling back to default on bad input."""
+    raw = os.getenv(name)
+    if raw is None or not raw.strip():
+        return default
+    try:
+        value = int(raw.strip())
+    except ValueError:
+        logging.getLogger(__name__).warning(f"Invalid integer for {name}: {raw!r}; using {default}")
+        return default
+    return max(minimum, value)
+
+# Number of tracks processed concurrently during a sync
+SYNC_WORKERS = _env_int('SYNC_WORKERS', 4, minimum=1)
+
+# Seconds a successful Soulseek auth probe is trusted before re-checking
+SOULSEEK_AUTH_TTL = _env_int('SOULSEEK_AUTH_TTL', 600)
+
+# Number of top query variants raced concurrently per track (1 disables hedging)
+SOULSEEK_HEDGE_VARIANTS = _env_int('SOULSEEK_HEDGE_VARIANTS', 3, minimum=1)
+# Extra soulseek processes hedging may run at once across all sync workers
+SOULSEEK_HEDGE_SLOTS = _env_int('SOULSEEK_HEDGE_SLOTS', 4, minimum=1)
+
+# Queue State writes and commit them in batches (flushed within seconds, at sync end and on exit)
+STATE_WRITE_BEHIND = os.getenv('STATE_WRITE_BEHIND', 'true').strip().lower() in ('1', 'true', 'yes')
+
+# Backoff for tracks no search could find: base delay doubles per failure up to the cap (seconds)
+RETRY_BASE_DELAY = _env_int('RETRY_BASE_DELAY', 3600)
+RETRY_MAX_DELAY = _env_int('RETRY_MAX_DELAY', 7 * 24 * 3600)
+
+# Soulseek query outcome cache: TTLs (seconds) for listings with and without results, and entry cap
+QUERY_CACHE_POSITIVE_TTL = _env_int('QUERY_CACHE_POSITIVE_TTL', 6 * 3600)
+QUERY_CACHE_NEGATIVE_TTL = _env_int('QUERY_CACHE_NEGATIVE_TTL', 3600)
+QUERY_CACHE_SIZE = _env_int('QUERY_CACHE_SIZE', 5000, minimum=1)
+
+# Metrics export: Prometheus text on 127.0.0.1:METRICS_PORT (0 disables) and/or a JSON file
+# rewritten every METRICS_INTERVAL seconds (empty path disables)
+METRICS_PORT = _env_int('METRICS_PORT', 0)
+METRICS_FILE = os.path.expanduser(os.getenv('METRICS_FILE', '').strip())
+METRICS_INTERVAL = _env_int('METRICS_INTERVAL', 30, minimum=1)
+
+# Write a Chrome/Perfetto trace of every track's spans to this path after each sync (empty disables)
+TRACE_FILE = os.path.expanduser(os.getenv('TRACE_FILE', '').strip())
+
+# Events waiting for listeners (notifications) in the app; the oldest are dropped beyond this
+EVENT_QUEUE_SIZE = _env_int('EVENT_QUEUE_SIZE', 256, minimum=1)
+
+# Desktop notifications: 'digest' (one summary per sync), 'per_track' or 'off'
+NOTIFICATIONS = os.getenv('NOTIFICATIONS', 'digest').strip().lower()
+# A digest is also shown once its oldest outcome is this many seconds old (0: only at the end of a sync)
+NOTIFICATION_WINDOW = _env_int('NOTIFICATION_WINDOW', 600)
+
+# Seconds between automatic syncs (tray app and `python -m spotify_syncer daemon`)
+SYNC_INTERVAL = _env_int('SYNC_INTERVAL', 300, minimum=10)
+# Idle syncs (nothing to search) double the interval up to this many seconds
+SYNC_MAX_INTERVAL = _env_int('SYNC_MAX_INTERVAL', 1800, minimum=10)
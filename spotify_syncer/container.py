@@ -2,39 +2,65 @@
 container.py: Dependency Injection container for core services.
 """
 import logging
-import os
-import subprocess
-import sys
 
 from spotify_syncer.spotify_client import SpotifyClient
 from spotify_syncer.state import State
 from spotify_syncer.torrent_searchers import SoulseekSearcher
-from spotify_syncer.config import SOULSEEK_ACCOUNT, SOULSEEK_PASSWORD
+from spotify_syncer.soulseek_cli import SoulseekAuth
+from spotify_syncer.syncer import Syncer
+from spotify_syncer.query_cache import QueryCache
+from spotify_syncer.library import LibraryIndex
+from spotify_syncer.variant_stats import VariantStats
+from spotify_syncer.timeouts import AdaptiveTimeouts
+from spotify_syncer.work_queue import WorkQueue
+from spotify_syncer.events import event_bus
+from spotify_syncer.notifications import register as register_notifications
+from spotify_syncer.metrics import metrics, serve_prometheus, write_json_periodically
+from spotify_syncer.tracing import tracer
+from spotify_syncer.config import (
+    DOWNLOAD_DIR, EVENT_QUEUE_SIZE, METRICS_FILE, METRICS_INTERVAL, METRICS_PORT, TRACE_FILE,
+    NOTIFICATIONS, NOTIFICATION_WINDOW,
+    QUERY_CACHE_NEGATIVE_TTL, QUERY_CACHE_POSITIVE_TTL, QUERY_CACHE_SIZE,
+    SOULSEEK_ACCOUNT, SOULSEEK_PASSWORD, STATE_WRITE_BEHIND,
+)
 
 class Container:
     """Holds singleton instances of application services."""
     def __init__(self) -> None:
-        self.spotify_client = SpotifyClient()
-        self.state = State()
-        self.searcher = SoulseekSearcher()
+        tracer.enabled = bool(TRACE_FILE)
+        # Listeners run on the bus's dispatcher thread so notifications never stall sync workers
+        event_bus.start(EVENT_QUEUE_SIZE)
+        self.notification_digest = register_notifications(event_bus, NOTIFICATIONS, NOTIFICATION_WINDOW)
+        self.state = State(write_behind=STATE_WRITE_BEHIND)
+        self.spotify_client = SpotifyClient(self.state)
+        # Login runs in the background; the first search waits on it via the auth probe
+        self.auth = SoulseekAuth(SOULSEEK_ACCOUNT, SOULSEEK_PASSWORD)
+        self.auth.start_login()
+        self.query_cache = QueryCache(
+            self.state, QUERY_CACHE_POSITIVE_TTL, QUERY_CACHE_NEGATIVE_TTL, QUERY_CACHE_SIZE
+        )
+        self.variant_stats = VariantStats(self.state)
+        self.timeouts = AdaptiveTimeouts(self.state)
+        self.searcher = SoulseekSearcher(
+            auth=self.auth, cache=self.query_cache, stats=self.variant_stats, timeouts=self.timeouts
+        )
+        self.searcher.cleanup_staging()
+        self.library = LibraryIndex(self.state, DOWNLOAD_DIR)
+        self.work_queue = WorkQueue(self.state)
+        self.searcher.on_download = self.work_queue.mark_downloading
+        self.searcher.on_attempt = self.work_queue.renew
+        self.syncer = Syncer(
+            self.spotify_client, self.state, self.searcher, library=self.library, queue=self.work_queue
+        )
         logging.getLogger(__name__).info("Using SoulseekSearcher for torrent downloads")
+        self.start_metrics()
 
-        # Attempt Soulseek CLI login
-        if not SOULSEEK_ACCOUNT or not SOULSEEK_PASSWORD:
-            logging.getLogger(__name__).error(
-                "Soulseek account/password not set. Please set SOULSEEK_ACCOUNT and SOULSEEK_PASSWORD in your .env."
-            )
-        else:
+    def start_metrics(self) -> None:
+        """Start the configured metrics exporters; failures are logged, not fatal."""
+        if METRICS_PORT:
             try:
-                result = subprocess.run(
-                    ["soulseek", "login", SOULSEEK_ACCOUNT, SOULSEEK_PASSWORD],
-                    capture_output=True, text=True
-                )
-                if result.returncode != 0:
-                    msg = (result.stderr or result.stdout or "").strip()
-                    logging.getLogger(__name__).error(f"Soulseek login failed: {msg}")
-                else:
-                    logging.getLogger(__name__).info("Successfully logged in to Soulseek CLI.")
-            except Exception as e:
-                logging.getLogger(__name__).error(f"Could not login to Soulseek: {e}")
-                sys.exit(1)
+                self.metrics_server = serve_prometheus(metrics, METRICS_PORT)
+            except OSError as e:
+                logging.getLogger(__name__).error(f"Could not serve metrics on port {METRICS_PORT}: {e}")
+        if METRICS_FILE:
+            self.metrics_writer = write_json_periodically(metrics, METRICS_FILE, METRICS_INTERVAL)
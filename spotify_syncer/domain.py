@@ -2,7 +2,9 @@
 Domain models for SpotifyTorrent application.
 """
 
+import os
 from dataclasses import dataclass
+from typing import Optional
 
 @dataclass(frozen=True)
 class Track:
@@ -10,3 +12,44 @@ class Track:
     uri: str
     name: str
     artist: str
+    duration_ms: Optional[int] = None
+
+
+@dataclass(frozen=True)
+class Candidate:
+    """A file offered by a Soulseek peer in response to a query."""
+    user: str
+    file: str
+    size: int = 0
+    bitrate: Optional[int] = None
+    slots: bool = True
+    speed: int = 0
+    duration: Optional[int] = None  # seconds, when the listing shows it
+
+    @property
+    def filename(self) -> str:
+        return self.file.replace('\\', '/').rsplit('/', 1)[-1]
+
+    @property
+    def extension(self) -> str:
+        return os.path.splitext(self.file)[1].lower().lstrip('.')
+
+
+@dataclass(frozen=True)
+class DownloadResult:
+    """Outcome of a successful Soulseek search and download for one track."""
+    path: str
+    size: int = 0
+    query: str = ''
+    candidate: Optional[Candidate] = None
+    attempts: int = 1
+    search_seconds: float = 0.0
+    download_seconds: float = 0.0
+
+    @property
+    def url(self) -> str:
+        return f"file://{self.path}"
+
+    @property
+    def format(self) -> str:
+        return os.path.splitext(self.path)[1].lower().lstrip('.')
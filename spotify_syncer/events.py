@@ -1,21 +1,156 @@
 """In-memory event bus for decoupling components via publish/subscribe pattern."""
 
-from typing import Callable, Dict, List
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+import atexit
 import logging
+import threading
+
+from spotify_syncer.metrics import metrics
+
+# Pending event: (event, args, kwargs, coalescing key or None)
+_Pending = Tuple[str, tuple, dict, Optional[tuple]]
+
+# Sync lifecycle events bracket everything published in between (the notification digest opens and
+# closes its window on them), so they are never coalesced or dropped
+LIFECYCLE_EVENTS = frozenset({'sync_started', 'sync_finished'})
+
 
 class EventBus:
+    """Publish/subscribe with synchronous or queued delivery.
+
+    New buses deliver synchronously: publish() calls every listener before
+    returning. After start(), publish() only enqueues and a dispatcher thread
+    calls the listeners, so a slow listener (e.g. one spawning a notifier
+    process) never holds up the publisher. The queue is bounded: a publish
+    identical to one still pending is coalesced into it, and when the queue
+    is full the oldest pending event is dropped. LIFECYCLE_EVENTS are
+    exempt from both and do not count towards the capacity. stop()
+    delivers what is queued and returns to synchronous delivery; it also
+    runs at exit.
+    """
     def __init__(self):
         self._listeners: Dict[str, List[Callable]] = {}
+        self._lock = threading.Lock()
+        self._pending: Deque[_Pending] = deque()
+        self._pending_keys: Dict[tuple, int] = {}
+        # Pending events that count towards the capacity (all but LIFECYCLE_EVENTS)
+        self._droppable = 0
+        self._ready = threading.Condition(self._lock)
+        self._capacity = 0
+        self._dispatching = False
+        self._dispatcher: Optional[threading.Thread] = None
+        self._atexit = False
 
     def subscribe(self, event: str, listener: Callable):
-        self._listeners.setdefault(event, []).append(listener)
+        with self._lock:
+            self._listeners.setdefault(event, []).append(listener)
+
+    @property
+    def asynchronous(self) -> bool:
+        return self._dispatcher is not None
+
+    def start(self, capacity: int = 256) -> None:
+        """Switch to queued delivery on a dispatcher thread holding at most capacity events."""
+        with self._lock:
+            self._capacity = max(1, capacity)
+            if self._dispatcher is not None:
+                return
+            self._dispatcher = threading.Thread(target=self._dispatch, name="event-bus", daemon=True)
+            self._dispatcher.start()
+            if not self._atexit:
+                atexit.register(self.stop)
+                self._atexit = True
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Deliver queued events (waiting up to timeout) and return to synchronous delivery."""
+        with self._lock:
+            dispatcher, self._dispatcher = self._dispatcher, None
+            self._ready.notify_all()
+        if dispatcher is not None:
+            dispatcher.join(timeout)
+            if dispatcher.is_alive():
+                with self._lock:
+                    left = len(self._pending)
+                logging.warning(f"Event bus stopped with {left} undelivered events")
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued event has been delivered; False if timeout ran out first."""
+        with self._lock:
+            return self._ready.wait_for(lambda: not self._pending and not self._dispatching, timeout)
 
     def publish(self, event: str, *args, **kwargs):
-        for listener in self._listeners.get(event, []):
+        with self._lock:
+            if self._dispatcher is not None:
+                self._enqueue(event, args, kwargs)
+                return
+            # Snapshot listeners so publishers on worker threads never see a list mid-update
+            listeners = list(self._listeners.get(event, []))
+        self._deliver(event, listeners, args, kwargs)
+
+    def _enqueue(self, event: str, args: tuple, kwargs: dict) -> None:
+        lifecycle = event in LIFECYCLE_EVENTS
+        try:
+            key: Optional[tuple] = None if lifecycle else (event, args, tuple(sorted(kwargs.items())))
+            hash(key)
+        except TypeError:
+            key = None
+        if key is not None and key in self._pending_keys:
+            metrics.inc('events_dropped_total', event=event, reason='coalesced')
+            return
+        if not lifecycle and self._droppable >= self._capacity:
+            oldest = next(i for i, pending in enumerate(self._pending) if pending[0] not in LIFECYCLE_EVENTS)
+            dropped = self._pending[oldest]
+            del self._pending[oldest]
+            self._droppable -= 1
+            self._forget(dropped[3])
+            metrics.inc('events_dropped_total', event=dropped[0], reason='overflow')
+            logging.warning(f"Event queue full; dropped '{dropped[0]}' event")
+        self._pending.append((event, args, kwargs, key))
+        if not lifecycle:
+            self._droppable += 1
+        if key is not None:
+            self._pending_keys[key] = self._pending_keys.get(key, 0) + 1
+        metrics.set('events_queue_depth', len(self._pending))
+        self._ready.notify_all()
+
+    def _forget(self, key: Optional[tuple]) -> None:
+        if key is None:
+            return
+        count = self._pending_keys.pop(key, 0) - 1
+        if count > 0:
+            self._pending_keys[key] = count
+
+    def _dispatch(self) -> None:
+        current = threading.current_thread()
+        while True:
+            with self._lock:
+                self._ready.wait_for(lambda: self._pending or self._dispatcher is not current)
+                if not self._pending:
+                    # Stopped and drained
+                    self._ready.notify_all()
+                    return
+                event, args, kwargs, key = self._pending.popleft()
+                if event not in LIFECYCLE_EVENTS:
+                    self._droppable -= 1
+                self._forget(key)
+                self._dispatching = True
+                listeners = list(self._listeners.get(event, []))
+                metrics.set('events_queue_depth', len(self._pending))
+            try:
+                self._deliver(event, listeners, args, kwargs)
+            finally:
+                with self._lock:
+                    self._dispatching = False
+                    self._ready.notify_all()
+
+    @staticmethod
+    def _deliver(event: str, listeners: List[Callable], args: tuple, kwargs: dict) -> None:
+        for listener in listeners:
             try:
                 listener(*args, **kwargs)
             except Exception as e:
                 logging.error(f"Error in event listener '{event}': {e}")
 
 # Global event bus instance
-event_bus = EventBus()
\ No newline at end of file
+event_bus = EventBus()
@@ -0,0 +1,216 @@
+"""
+library.py: Index of the audio files already in DOWNLOAD_DIR.
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from typing import Dict, List, Optional, Set, Tuple
+
+from spotify_syncer.domain import Track
+from spotify_syncer.metrics import metrics
+from spotify_syncer.soulseek_cli import AUDIO_EXTENSIONS
+from spotify_syncer.torrent_searchers import STAGING_DIRNAME
+
+_BRACKETS_RE = re.compile(r"[(\[{][^)\]}]*[)\]}]")
+_FEAT_RE = re.compile(r"\b(?:feat|ft|featuring)\b.*$")
+_TRACK_NO_RE = re.compile(r"^\d{1,3}(?:\s*[-._)]\s*|\s+)")
+# Shorter artist names ('x', 'mo', 'u2') turn up in unrelated paths too often to trust a match
+MIN_ARTIST_CHARS = 3
+# A directory modified this recently may change again within the same mtime tick; list it again next time
+_SETTLE_SECONDS = 2.0
+
+
+def normalize(text: str) -> str:
+    """Fold case, accents and punctuation, and drop bracketed and 'feat.' parts."""
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    text = _BRACKETS_RE.sub(' ', text).replace('&', ' and ')
+    text = ' '.join(re.sub(r"[^\w\s]|_", " ", text).split())
+    return _FEAT_RE.sub('', text).strip()
+
+
+def title_keys(stem: str) -> Set[str]:
+    """Possible normalized titles for a file name such as '01 - Artist - Title'."""
+    stripped = _TRACK_NO_RE.sub('', stem, count=1)
+    parts = [p for p in stripped.split(' - ') if p.strip() and not p.strip().isdigit()]
+    guesses = [stem, stripped] + parts[-1:] + [' - '.join(parts[1:])]
+    return {key for key in (normalize(g) for g in guesses) if key}
+
+
+def track_keys(track: Track) -> Set[str]:
+    """Normalized titles a track may be stored under ('Song - Remastered 2011' -> 'song')."""
+    return {key for key in (normalize(track.name), normalize(track.name.split(' - ')[0])) if key}
+
+
+class LibraryIndex:
+    """Audio files under a root directory, keyed by normalized title.
+
+    Entries persist in the State database together with each directory's
+    mtime, so refresh() stats every directory but only lists those whose
+    mtime changed (a file added, removed or renamed in them), indexing new
+    files and dropping deleted ones. Entries depend only on the path, so
+    files edited in place need no re-parse. A track matches a file when a
+    title key agrees and an artist name of at least MIN_ARTIST_CHARS
+    characters appears in the file name or its parent folders.
+    """
+    def __init__(self, state, root: str) -> None:
+        self.state = state
+        self.root = os.path.abspath(root)
+        self._lock = threading.Lock()
+        # path -> (mtime, title keys)
+        self._files: Dict[str, Tuple[float, List[str]]] = {}
+        # title key -> {path: normalized artist context (file name plus parent folders)}
+        self._titles: Dict[str, Dict[str, str]] = {}
+        # directory -> (mtime when last listed, subdirectory names)
+        self._dirs: Dict[str, Tuple[float, List[str]]] = {}
+        self._load()
+
+    def _load(self) -> None:
+        with self.state.lock:
+            rows = self.state.conn.execute("SELECT path, mtime, context, titles FROM library").fetchall()
+            dirs = self.state.conn.execute("SELECT path, mtime, subdirs FROM library_dirs").fetchall()
+        for path, mtime, context, titles in rows:
+            self._index(path, mtime, context, titles.split('\n'))
+        for path, mtime, subdirs in dirs:
+            self._dirs[path] = (mtime, subdirs.split('\n') if subdirs else [])
+
+    def _index(self, path: str, mtime: float, context: str, titles: List[str]) -> None:
+        self._files[path] = (mtime, titles)
+        for key in titles:
+            self._titles.setdefault(key, {})[path] = context
+
+    def _unindex(self, path: str) -> None:
+        _, titles = self._files.pop(path, (0.0, []))
+        for key in titles:
+            paths = self._titles.get(key, {})
+            paths.pop(path, None)
+            if not paths:
+                self._titles.pop(key, None)
+
+    def _describe(self, path: str) -> Tuple[str, List[str]]:
+        rel = os.path.relpath(path, self.root)
+        folders, name = os.path.split(rel)
+        stem = os.path.splitext(name)[0]
+        context = normalize(' '.join(folders.split(os.sep)[-2:] + [stem]))
+        return context, sorted(title_keys(stem))
+
+    def _list(self, directory: str) -> Tuple[List[str], List[Tuple[str, float]]]:
+        """Subdirectory names and (path, mtime) of the audio files directly in directory."""
+        subdirs: List[str] = []
+        files: List[Tuple[str, float]] = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name != STAGING_DIRNAME and not entry.name.startswith('.'):
+                            subdirs.append(entry.name)
+                    elif os.path.splitext(entry.name)[1].lower().lstrip('.') in AUDIO_EXTENSIONS:
+                        files.append((entry.path, entry.stat().st_mtime))
+                except OSError:
+                    continue
+        return subdirs, files
+
+    def refresh(self) -> int:
+        """Bring the index in line with the files on disk; returns how many entries changed."""
+        changed: List[Tuple[str, float, str, str]] = []
+        listed: Dict[str, Set[str]] = {}
+        seen_dirs = set()
+        dir_rows: List[Tuple[str, float, str]] = []
+        now = time.time()
+        with self._lock, metrics.timer('library_scan_seconds'):
+            stack = [self.root]
+            while stack:
+                directory = stack.pop()
+                try:
+                    mtime = os.stat(directory).st_mtime
+                except OSError:
+                    continue
+                seen_dirs.add(directory)
+                cached = self._dirs.get(directory)
+                if cached is not None and cached[0] == mtime:
+                    # Same entries as last time; only its subdirectories can have changed
+                    stack.extend(os.path.join(directory, d) for d in cached[1])
+                    continue
+                try:
+                    subdirs, files = self._list(directory)
+                except OSError:
+                    continue
+                listed[directory] = {path for path, _ in files}
+                for path, file_mtime in files:
+                    if path in self._files:
+                        continue
+                    context, titles = self._describe(path)
+                    self._index(path, file_mtime, context, titles)
+                    changed.append((path, file_mtime, context, '\n'.join(titles)))
+                stack.extend(os.path.join(directory, d) for d in subdirs)
+                settled = mtime if now - mtime > _SETTLE_SECONDS else -1.0
+                self._dirs[directory] = (settled, subdirs)
+                dir_rows.append((directory, settled, '\n'.join(subdirs)))
+            removed = []
+            for path in self._files:
+                directory = os.path.dirname(path)
+                # Gone with its directory, or missing from a directory that was listed again
+                if directory not in seen_dirs or (directory in listed and path not in listed[directory]):
+                    removed.append(path)
+            for path in removed:
+                self._unindex(path)
+            gone_dirs = [d for d in self._dirs if d not in seen_dirs]
+            for directory in gone_dirs:
+                del self._dirs[directory]
+        if changed or removed or dir_rows or gone_dirs:
+            self._save(changed, removed, dir_rows, gone_dirs)
+        if changed or removed:
+            logging.getLogger(__name__).info(
+                f"Library index: {len(changed)} new, {len(removed)} removed, {len(self._files)} files"
+            )
+        return len(changed) + len(removed)
+
+    def add(self, path: str) -> None:
+        """Index a single file, e.g. one just downloaded."""
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return
+        path = os.path.abspath(path)
+        context, titles = self._describe(path)
+        with self._lock:
+            self._unindex(path)
+            self._index(path, mtime, context, titles)
+        self._save([(path, mtime, context, '\n'.join(titles))], [])
+
+    def _save(self, changed: List[Tuple[str, float, str, str]], removed: List[str],
+              dirs: Optional[List[Tuple[str, float, str]]] = None, gone_dirs: Optional[List[str]] = None) -> None:
+        try:
+            with self.state.lock:
+                cursor = self.state.conn.cursor()
+                cursor.executemany("DELETE FROM library WHERE path = ?", [(p,) for p in removed])
+                cursor.executemany(
+                    "INSERT OR REPLACE INTO library(path, mtime, context, titles) VALUES(?, ?, ?, ?)", changed
+                )
+                cursor.executemany("DELETE FROM library_dirs WHERE path = ?", [(d,) for d in gone_dirs or []])
+                cursor.executemany(
+                    "INSERT OR REPLACE INTO library_dirs(path, mtime, subdirs) VALUES(?, ?, ?)", dirs or []
+                )
+                self.state.conn.commit()
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Error saving library index: {e}")
+
+    def find(self, track: Track) -> Optional[str]:
+        """Return the path of a library file matching the track, if any."""
+        artist = normalize(track.artist)
+        if len(artist.replace(' ', '')) < MIN_ARTIST_CHARS:
+            # Too short to tell apart from noise in paths; let the track be searched instead
+            return None
+        with self._lock:
+            for key in track_keys(track):
+                for path, context in self._titles.get(key, {}).items():
+                    if f" {artist} " in f" {context} ":
+                        return path
+        return None
+
+    def __len__(self) -> int:
+        return len(self._files)
@@ -0,0 +1,223 @@
+"""In-process metrics (counters, gauges, histograms) with Prometheus text and JSON export."""
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+# Latency buckets in seconds, from fast cache hits to long FLAC downloads
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    body = ','.join('{}="{}"'.format(k, v.replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs)
+    return '{' + body + '}'
+
+
+class Metrics:
+    """Thread-safe registry of named metrics, each keyed by a set of labels.
+
+    Metrics are created on first use, so instrumented code only needs the
+    name: inc() for counters, set()/add() for gauges and observe() or
+    timer() for histograms.
+    """
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._help: Dict[str, str] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._gauges: Dict[str, Dict[Labels, float]] = {}
+        # name -> labels -> [bucket counts..., sum, count]
+        self._histograms: Dict[str, Dict[Labels, List[float]]] = {}
+
+    def describe(self, name: str, help_text: str) -> None:
+        with self._lock:
+            self._help[name] = help_text
+
+    def inc(self, name: str, amount: float = 1, **labels) -> None:
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def set(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self._gauges.setdefault(name, {})[_labels(labels)] = value
+
+    def add(self, name: str, amount: float, **labels) -> None:
+        key = _labels(labels)
+        with self._lock:
+            series = self._gauges.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = _labels(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            counts = series.get(key)
+            if counts is None:
+                counts = series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[Dict[str, object]]:
+        """Observe the block's duration; the yielded dict can add or change labels before it ends."""
+        started = time.monotonic()
+        try:
+            yield labels
+        finally:
+            self.observe(name, time.monotonic() - started, **labels)
+
+    @contextmanager
+    def in_flight(self, name: str, **labels) -> Iterator[None]:
+        """Count the block in a gauge while it runs."""
+        self.add(name, 1, **labels)
+        try:
+            yield
+        finally:
+            self.add(name, -1, **labels)
+
+    def snapshot(self) -> Dict[str, object]:
+        """All current values as plain data (the JSON export format)."""
+        def series(values):
+            return [{'labels': dict(k), 'value': v} for k, v in values.items()]
+        with self._lock:
+            return {
+                'timestamp': time.time(),
+                'counters': {n: series(v) for n, v in self._counters.items()},
+                'gauges': {n: series(v) for n, v in self._gauges.items()},
+                'histograms': {
+                    n: [{
+                        'labels': dict(k),
+                        'buckets': dict(zip(map(str, self.buckets), c[:len(self.buckets)])),
+                        'sum': c[-2],
+                        'count': c[-1],
+                    } for k, c in v.items()]
+                    for n, v in self._histograms.items()
+                },
+            }
+
+    def render_prometheus(self) -> str:
+        """All current values in the Prometheus text exposition format."""
+        lines: List[str] = []
+        with self._lock:
+            for kind, metrics in (('counter', self._counters), ('gauge', self._gauges)):
+                for name in sorted(metrics):
+                    if name in self._help:
+                        lines.append(f"# HELP {name} {self._help[name]}")
+                    lines.append(f"# TYPE {name} {kind}")
+                    for key, value in metrics[name].items():
+                        lines.append(f"{name}{_format_labels(key)} {value}")
+            for name in sorted(self._histograms):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, counts in self._histograms[name].items():
+                    for bound, count in zip(self.buckets, counts):
+                        lines.append(f"{name}_bucket{_format_labels(key, ('le', str(bound)))} {count}")
+                    lines.append(f"{name}_bucket{_format_labels(key, ('le', '+Inf'))} {counts[-1]}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {counts[-2]}")
+                    lines.append(f"{name}_count{_format_labels(key)} {counts[-1]}")
+        return '\n'.join(lines) + '\n'
+
+    def write_json(self, path: str) -> None:
+        """Atomically replace path with the current snapshot."""
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self.snapshot(), f, indent=1)
+        os.replace(tmp, path)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+
+def serve_prometheus(registry: Metrics, port: int, host: str = '127.0.0.1') -> 'ThreadingHTTPServer':
+    """Serve registry at http://host:port/metrics from a daemon thread."""
+    # http.server is only loaded when the exporter is enabled
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logging.getLogger(__name__).info(f"Serving metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+def write_json_periodically(registry: Metrics, path: str, interval: float) -> threading.Event:
+    """Rewrite path with a JSON snapshot every interval seconds; set the returned event to stop."""
+    stop = threading.Event()
+
+    def run():
+        while True:
+            try:
+                registry.write_json(path)
+            except OSError as e:
+                logging.getLogger(__name__).warning(f"Could not write metrics to {path}: {e}")
+            if stop.wait(interval):
+                break
+
+    threading.Thread(target=run, name="metrics-json", daemon=True).start()
+    return stop
+
+
+# Global metrics registry
+metrics = Metrics()
+
+for _name, _help in (
+    ('spotify_fetch_seconds', 'Time to load the playlist, by source (cache or api)'),
+    ('soulseek_auth_probe_seconds', 'Time of soulseek auth probes, by result'),
+    ('soulseek_query_seconds', 'Time until a soulseek listing or exit, by mode and outcome'),
+    ('soulseek_download_seconds', 'Time of soulseek downloads, by format and outcome'),
+    ('soulseek_download_bytes_total', 'Bytes downloaded from soulseek'),
+    ('soulseek_queries_in_flight', 'soulseek query sessions waiting for a listing'),
+    ('soulseek_downloads_in_flight', 'soulseek downloads in progress'),
+    ('library_scan_seconds', 'Time to refresh the DOWNLOAD_DIR index'),
+    ('state_commit_seconds', 'Time of State database commits'),
+    ('state_rows_written_total', 'Downloaded IDs committed to the State database'),
+    ('track_seconds', 'Total time spent on a track, by outcome'),
+    ('tracks_total', 'Tracks processed, by outcome'),
+    ('sync_seconds', 'Time of a full sync'),
+    ('sync_queue_depth', 'Tracks of the current sync not yet started'),
+    ('sync_in_flight', 'Tracks being processed'),
+    ('sync_triggers_total', 'Manual sync requests, by outcome (scheduled, or coalesced into a pending run)'),
+    ('events_queue_depth', 'Events waiting for the event bus dispatcher'),
+    ('events_dropped_total', 'Events not delivered, by event and reason (coalesced or overflow)'),
+):
+    metrics.describe(_name, _help)
@@ -1,35 +1,149 @@
 """notifications.py: Event-driven notification handlers for SpotifyTorrent."""
 
 import logging
-from typing import Optional
-from events import event_bus
-from pync import Notifier
-from domain import Track
+import shutil
+import subprocess
+import threading
+import time
+from typing import Callable, List, Optional
 
+from spotify_syncer.domain import Track
 
-def handle_download_success(track: Track) -> None:
+TITLE = "SpotifyTorrent"
+# Names listed in a digest before the rest are summarised as "and N more"
+DIGEST_NAMES = 3
+
+
+def notify(message: str, title: str = TITLE) -> None:
+    """Show a desktop notification via pync on macOS or notify-send on Linux; errors are logged."""
+    try:
+        from pync import Notifier
+    except ImportError:
+        Notifier = None
+    try:
+        if Notifier is not None:
+            Notifier.notify(message, title=title)
+        elif shutil.which("notify-send"):
+            subprocess.call(["notify-send", title, message])
+    except Exception as e:
+        logging.getLogger(__name__).warning(f"Could not show notification: {e}")
+
+
+def _duration(seconds: float) -> str:
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+
+
+def handle_download_success(track: Track, correlation_id: Optional[str] = None,
+                            seconds: Optional[float] = None) -> None:
     """Notify user of a successful download."""
-    title = "SpotifyTorrent"
-    message = f"✔️ {track.name} by {track.artist}"
-    Notifier.notify(message, title=title)
+    notify(f"✔️ {track.name} by {track.artist}")
 
 
-def handle_torrent_not_found(query: str, track_name: Optional[str] = None) -> None:
+def handle_torrent_not_found(query: str, track_name: Optional[str] = None,
+                             correlation_id: Optional[str] = None, seconds: Optional[float] = None) -> None:
     """Notify user when no torrent is found for a track."""
-    title = "SpotifyTorrent"
-    message = f"❌ {track_name or query} not found"
-    Notifier.notify(message, title=title)
+    notify(f"❌ {track_name or query} not found")
 
 
 def handle_manual_sync() -> None:
     """Notify user when a manual sync is triggered."""
-    Notifier.notify("Manual sync started", title="SpotifyTorrent")
-
-# Register event handlers
-_event_pairs = [
-    ('download_success', handle_download_success),
-    ('torrent_not_found', handle_torrent_not_found),
-    ('manual_sync', handle_manual_sync),
-]
-for event, handler in _event_pairs:
-    event_bus.subscribe(event, handler)
+    notify("Manual sync started")
+
+
+class NotificationDigest:
+    """Collects per-track outcomes and shows them as one notification.
+
+    A digest is shown when a sync finishes, and also once the oldest
+    collected outcome is window seconds old (0 disables), so long syncs and
+    outcomes published outside a sync still get reported. Nothing is shown
+    for a sync that processed no tracks.
+    """
+    def __init__(self, window: float = 600, notify: Callable[[str, str], None] = notify) -> None:
+        self.window = window
+        self._notify = notify
+        self._lock = threading.Lock()
+        self._downloaded: List[str] = []
+        self._missing: List[str] = []
+        self._track_seconds = 0.0
+        self._started: Optional[float] = None
+        self._timer: Optional[threading.Timer] = None
+
+    def on_sync_started(self) -> None:
+        with self._lock:
+            if self._started is None:
+                self._started = time.monotonic()
+
+    def on_download_success(self, track: Track, correlation_id: Optional[str] = None,
+                            seconds: Optional[float] = None) -> None:
+        self._collect(self._downloaded, f"{track.name} by {track.artist}", seconds)
+
+    def on_torrent_not_found(self, query: str, track_name: Optional[str] = None,
+                             correlation_id: Optional[str] = None, seconds: Optional[float] = None) -> None:
+        self._collect(self._missing, track_name or query, seconds)
+
+    def on_sync_finished(self) -> None:
+        self.flush()
+
+    def _collect(self, names: List[str], name: str, seconds: Optional[float]) -> None:
+        with self._lock:
+            names.append(name)
+            self._track_seconds += seconds or 0.0
+            if self._started is None:
+                self._started = time.monotonic()
+            if self.window and self._timer is None:
+                self._timer = threading.Timer(self.window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self) -> None:
+        """Show the collected outcomes as one notification and start a new digest."""
+        with self._lock:
+            downloaded, missing = self._downloaded, self._missing
+            track_seconds, started = self._track_seconds, self._started
+            self._downloaded, self._missing, self._track_seconds, self._started = [], [], 0.0, None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        count = len(downloaded) + len(missing)
+        if not count:
+            return
+        parts = []
+        if downloaded:
+            parts.append(f"✔️ {len(downloaded)} downloaded")
+        if missing:
+            parts.append(f"❌ {len(missing)} not found")
+        elapsed = time.monotonic() - started if started is not None else track_seconds
+        lines = [f"{', '.join(parts)} in {_duration(elapsed)} (avg {_duration(track_seconds / count)} per track)"]
+        if downloaded:
+            more = len(downloaded) - DIGEST_NAMES
+            lines.append(", ".join(downloaded[:DIGEST_NAMES]) + (f" and {more} more" if more > 0 else ""))
+        self._notify("\n".join(lines), TITLE)
+
+
+def register(bus, mode: str = 'digest', window: float = 600) -> Optional[NotificationDigest]:
+    """Subscribe notification handlers to bus.
+
+    mode is 'digest' (one summary per sync or window), 'per_track' (one
+    notification per download or miss) or 'off'. Returns the digest, if any.
+    """
+    digest = None
+    if mode == 'per_track':
+        bus.subscribe('download_success', handle_download_success)
+        bus.subscribe('torrent_not_found', handle_torrent_not_found)
+    elif mode == 'digest':
+        digest = NotificationDigest(window)
+        bus.subscribe('sync_started', digest.on_sync_started)
+        bus.subscribe('download_success', digest.on_download_success)
+        bus.subscribe('torrent_not_found', digest.on_torrent_not_found)
+        bus.subscribe('sync_finished', digest.on_sync_finished)
+    elif mode != 'off':
+        logging.getLogger(__name__).warning(f"Unknown NOTIFICATIONS mode '{mode}'; notifications disabled")
+        return None
+    if mode != 'off':
+        bus.subscribe('manual_sync', handle_manual_sync)
+    return digest
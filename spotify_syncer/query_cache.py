@@ -0,0 +1,88 @@
+"""
+query_cache.py: Persistent TTL cache of Soulseek query outcomes.
+"""
+
+import json
+import logging
+import re
+import time
+from dataclasses import asdict
+from typing import List, Optional
+
+from spotify_syncer.domain import Candidate
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase and collapse punctuation/whitespace so equivalent queries share an entry."""
+    return ' '.join(re.sub(r"[^\w\s]", " ", query.lower()).split())
+
+
+class QueryCache:
+    """Query outcomes and parsed candidate lists, stored in the State database.
+
+    Entries are keyed by normalized query and mode. Listings with results
+    expire after positive_ttl seconds, empty ones after negative_ttl; once
+    more than max_entries are stored the least recently used are evicted.
+    """
+    def __init__(self, state, positive_ttl: float = 6 * 3600, negative_ttl: float = 3600,
+                 max_entries: int = 5000) -> None:
+        self.state = state
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max(1, max_entries)
+
+    def get(self, query: str, mode: Optional[str]) -> Optional[List[Candidate]]:
+        """Return the cached candidates (empty for a cached miss), or None if not cached or expired."""
+        key = (normalize_query(query), mode or '')
+        now = time.time()
+        try:
+            with self.state.lock:
+                conn = self.state.conn
+                row = conn.execute(
+                    "SELECT candidates, expires_at FROM query_cache WHERE query = ? AND mode = ?", key
+                ).fetchone()
+                if row is None:
+                    return None
+                if row[1] <= now:
+                    conn.execute("DELETE FROM query_cache WHERE query = ? AND mode = ?", key)
+                    conn.commit()
+                    return None
+                conn.execute("UPDATE query_cache SET used_at = ? WHERE query = ? AND mode = ?", (now,) + key)
+                conn.commit()
+            return [Candidate(**c) for c in json.loads(row[0])]
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Error reading query cache: {e}")
+            return None
+
+    def put(self, query: str, mode: Optional[str], candidates: List[Candidate]) -> None:
+        """Store the listing for a query; an empty list records that it found nothing."""
+        now = time.time()
+        ttl = self.positive_ttl if candidates else self.negative_ttl
+        if ttl <= 0:
+            return
+        try:
+            with self.state.lock:
+                conn = self.state.conn
+                conn.execute(
+                    "INSERT OR REPLACE INTO query_cache(query, mode, candidates, expires_at, used_at) "
+                    "VALUES(?, ?, ?, ?, ?)",
+                    (normalize_query(query), mode or '', json.dumps([asdict(c) for c in candidates]),
+                     now + ttl, now)
+                )
+                conn.execute(
+                    "DELETE FROM query_cache WHERE rowid IN ("
+                    "SELECT rowid FROM query_cache ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+                conn.commit()
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Error writing query cache: {e}")
+
+    def clear(self) -> None:
+        """Drop every cached query outcome."""
+        try:
+            with self.state.lock:
+                self.state.conn.execute("DELETE FROM query_cache")
+                self.state.conn.commit()
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Error clearing query cache: {e}")
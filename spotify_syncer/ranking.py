@@ -0,0 +1,111 @@
+"""
+ranking.py: Score Soulseek candidates against the Spotify track being fetched.
+"""
+
+import math
+import re
+import unicodedata
+from typing import FrozenSet, Iterable, List, Optional, Tuple
+
+from spotify_syncer.domain import Candidate, Track
+
+_TOKEN_RE = re.compile(r"[^\W_]+")
+_BRACKETS_RE = re.compile(r"[(\[][^)\]]*[)\]]")
+
+# Words that mark a different recording of the same song unless the track title has them too
+VERSION_MARKERS = frozenset({
+    'live', 'remix', 'rmx', 'mix', 'edit', 'acoustic', 'instrumental', 'karaoke', 'cover',
+    'demo', 'remaster', 'remastered', 'version', 'session', 'unplugged', 'reprise', 'bootleg',
+    'nightcore', 'sped', 'slowed', 'reverb', '8bit',
+})
+
+# Candidates covering less of the title than this are treated as a different song
+MIN_TITLE_MATCH = 0.6
+
+
+def tokens(text: str) -> FrozenSet[str]:
+    """Lowercase words of text with accents folded and apostrophes dropped ("Don't" -> "dont")."""
+    text = unicodedata.normalize('NFKD', text.lower().replace("'", '').replace('\u2019', '').replace('&', ' and '))
+    return frozenset(_TOKEN_RE.findall(''.join(c for c in text if not unicodedata.combining(c))))
+
+
+class CandidateRanker:
+    """Ranks candidates for one track, best first.
+
+    Token sets for the track are computed once, so scoring a listing of
+    hundreds of candidates is a few set operations per candidate. The score
+    blends title and artist token coverage, unwanted version markers,
+    bitrate, size, peer speed and free slots, plus duration when both the
+    track and the candidate carry one.
+    """
+    def __init__(self, title: str, artist: str = '', duration_ms: Optional[int] = None) -> None:
+        # "Song (feat. X) - Remastered 2011" must match on "song"; its markers are still allowed
+        core = _BRACKETS_RE.sub(' ', title.split(' - ')[0])
+        self.title = tokens(core) - {'feat', 'ft', 'featuring'}
+        self.artist = tokens(artist)
+        self.duration = duration_ms / 1000 if duration_ms else None
+        self.allowed_markers = VERSION_MARKERS & tokens(title)
+
+    @classmethod
+    def for_track(cls, track: Track) -> 'CandidateRanker':
+        return cls(track.name, track.artist, track.duration_ms)
+
+    def title_match(self, candidate: Candidate, words: Optional[FrozenSet[str]] = None) -> float:
+        """Share of the title's words found in the candidate's path."""
+        if not self.title or not candidate.file:
+            return 1.0
+        words = tokens(candidate.file) if words is None else words
+        return len(self.title & words) / len(self.title)
+
+    def score(self, candidate: Candidate, words: Optional[FrozenSet[str]] = None) -> float:
+        """Higher is better; only comparable between candidates for the same track."""
+        if not candidate.file:
+            # Unparsed listing placeholder: nothing to judge it by
+            return 0.0
+        words = tokens(candidate.file) if words is None else words
+        score = 0.0
+        if self.title:
+            score += 3.0 * len(self.title & words) / len(self.title)
+            # Extra words in the file name (beyond artist/album folders) weigh lightly
+            name_words = tokens(candidate.filename)
+            score -= 0.3 * len(name_words - self.title - self.artist) / (len(name_words) or 1)
+        if self.artist:
+            score += 1.5 * len(self.artist & words) / len(self.artist)
+        score -= 1.0 * len((words & VERSION_MARKERS) - self.allowed_markers)
+
+        if candidate.extension == 'flac':
+            score += 0.5
+        elif candidate.bitrate:
+            score += 0.5 * min(candidate.bitrate, 320) / 320
+        else:
+            score += 0.2
+
+        if candidate.size:
+            if candidate.size < 512 * 1024:
+                score -= 1.0
+            elif self.duration and candidate.bitrate and candidate.extension != 'flac':
+                expected = candidate.bitrate * 125 * self.duration
+                ratio = candidate.size / expected
+                if ratio < 0.7 or ratio > 1.5:
+                    score -= 0.5
+        if self.duration and candidate.duration:
+            diff = abs(candidate.duration - self.duration)
+            score += 0.75 if diff <= 3 else -min(1.5, diff / 20)
+
+        if candidate.speed:
+            # Saturates around 5 MB/s
+            score += 0.3 * min(1.0, math.log1p(candidate.speed / 1024) / math.log1p(5 * 1024))
+        if not candidate.slots:
+            score -= 0.4
+        return score
+
+    def rank(self, candidates: Iterable[Candidate]) -> List[Candidate]:
+        """Drop candidates that are clearly another song and order the rest best first."""
+        scored: List[Tuple[float, int, Candidate]] = []
+        for position, candidate in enumerate(candidates):
+            words = tokens(candidate.file)
+            if self.title_match(candidate, words) < MIN_TITLE_MATCH:
+                continue
+            scored.append((-self.score(candidate, words), position, candidate))
+        scored.sort(key=lambda item: (item[0], item[1]))
+        return [candidate for _, _, candidate in scored]
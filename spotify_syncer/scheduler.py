@@ -0,0 +1,106 @@
+"""
+scheduler.py: Runs syncs one at a time on a jittered, load-adaptive interval.
+"""
+
+import logging
+import random
+import threading
+import time
+from typing import Callable, Optional
+
+from spotify_syncer.metrics import metrics
+
+# Longest single wait; a wall-clock jump (e.g. waking from sleep) is noticed within this many seconds
+_MAX_WAIT = 30.0
+
+
+class SyncScheduler:
+    """Owns the only thread that runs syncs.
+
+    trigger() asks for a sync now: if one is already running, all triggers
+    that arrive meanwhile collapse into a single follow-up run (forced if
+    any of them was). Scheduled runs are timed from when the previous run
+    finished, so ticks missed during a long sync or while the machine slept
+    produce one run, not a burst. run(force) returns how many tracks it
+    searched: after a run that found work the next one is interval seconds
+    away, and each idle run doubles the gap up to max_interval. Every gap is
+    spread by +/- jitter so several instances don't hit Spotify in step.
+    """
+    def __init__(self, run: Callable[[bool], Optional[int]], interval: float,
+                 max_interval: Optional[float] = None, jitter: float = 0.1) -> None:
+        self.run = run
+        self.interval = interval
+        self.max_interval = max(interval, max_interval or interval)
+        self.jitter = jitter
+        self.next_run_at: Optional[float] = None
+        self._gap = interval
+        self._cond = threading.Condition()
+        self._requested = False
+        self._force = False
+        self._running = False
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def start(self, immediately: bool = True) -> None:
+        """Start the scheduler thread; the first sync runs at once unless immediately is False."""
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopped = False
+            self.next_run_at = time.time() + (0 if immediately else self._spread(self.interval))
+            self._thread = threading.Thread(target=self._loop, name="sync-scheduler", daemon=True)
+            self._thread.start()
+
+    def trigger(self, force: bool = False) -> None:
+        """Request a sync as soon as possible; coalesced with any request already waiting."""
+        with self._cond:
+            outcome = 'coalesced' if self._requested or self._running else 'scheduled'
+            self._requested = True
+            self._force = self._force or force
+            self._cond.notify_all()
+        metrics.inc('sync_triggers_total', outcome=outcome)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop scheduling and wait up to timeout for a running sync to finish."""
+        with self._cond:
+            thread, self._thread = self._thread, None
+            self._stopped = True
+            self._cond.notify_all()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def _spread(self, gap: float) -> float:
+        return gap * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._stopped and not self._requested and time.time() < self.next_run_at:
+                    self._cond.wait(min(_MAX_WAIT, self.next_run_at - time.time()))
+                if self._stopped:
+                    return
+                force, self._force, self._requested = self._force, False, False
+                self._running = True
+            searched = None
+            try:
+                searched = self.run(force)
+            except Exception:
+                logging.getLogger(__name__).exception("Exception occurred during sync")
+            finally:
+                with self._cond:
+                    self._running = False
+                    self._gap = self._next_gap(searched)
+                    self.next_run_at = time.time() + self._spread(self._gap)
+            logging.getLogger(__name__).info(
+                f"Next sync in {self.next_run_at - time.time():.0f}s"
+                + (" (follow-up requested)" if self._requested else "")
+            )
+
+    def _next_gap(self, searched: Optional[int]) -> float:
+        if searched is None or searched > 0:
+            return self.interval
+        return min(self.max_interval, self._gap * 2)
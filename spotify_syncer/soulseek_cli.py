@@ -0,0 +1,369 @@
+"""
+soulseek_cli.py: Helpers around the soulseek-cli executable shared by all searches.
+"""
+
+import logging
+import re
+import subprocess
+import threading
+import time
+from typing import Iterable, List, Optional, Tuple
+
+from spotify_syncer.config import SOULSEEK_AUTH_TTL
+from spotify_syncer.domain import Candidate
+from spotify_syncer.metrics import metrics
+from spotify_syncer.tracing import tracer
+
+# Output fragments soulseek-cli prints when the session is not usable
+AUTH_ERRORS = ('timeout login', 'econnreset', 'not logged in', 'authentication failed', 'error: read')
+
+
+# Output fragments soulseek-cli prints when a search completed and found nothing
+NO_RESULTS = ('no search results', 'no results found')
+
+
+def is_auth_error(output: str) -> bool:
+    """Return True if CLI output indicates a login/connection failure."""
+    text = (output or '').lower()
+    return any(error in text for error in AUTH_ERRORS)
+
+
+def is_no_results(output: str) -> bool:
+    """Return True if CLI output reports a completed search with an empty result set."""
+    text = (output or '').lower()
+    return any(marker in text for marker in NO_RESULTS)
+
+
+class SoulseekAuth:
+    """Soulseek login and health probe, cached with a TTL and shared across searches."""
+    def __init__(self, account: Optional[str] = None, password: Optional[str] = None,
+                 ttl: Optional[float] = None) -> None:
+        self.account = account
+        self.password = password
+        self.ttl = SOULSEEK_AUTH_TTL if ttl is None else ttl
+        self._lock = threading.Lock()
+        self._login_thread: Optional[threading.Thread] = None
+        self._checked_at: Optional[float] = None
+        self._healthy = False
+
+    def start_login(self) -> None:
+        """Run `soulseek login` on a background thread so startup does not wait on it."""
+        if not self.account or not self.password:
+            logging.getLogger(__name__).error(
+                "Soulseek account/password not set. Please set SOULSEEK_ACCOUNT and SOULSEEK_PASSWORD in your .env."
+            )
+            return
+        self._login_thread = threading.Thread(target=self.login, name="soulseek-login", daemon=True)
+        self._login_thread.start()
+
+    def login(self) -> bool:
+        """Log in to the Soulseek CLI; returns True on success."""
+        try:
+            result = subprocess.run(
+                ["soulseek", "login", self.account, self.password],
+                capture_output=True, text=True, timeout=60
+            )
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Could not login to Soulseek: {e}")
+            return False
+        if result.returncode != 0:
+            msg = (result.stderr or result.stdout or "").strip()
+            logging.getLogger(__name__).error(f"Soulseek login failed: {msg}")
+            return False
+        logging.getLogger(__name__).info("Successfully logged in to Soulseek CLI.")
+        return True
+
+    def ensure(self) -> bool:
+        """Return the cached health result, probing only when the TTL has lapsed."""
+        login_thread = self._login_thread
+        if login_thread is not None:
+            login_thread.join()
+            self._login_thread = None
+        with self._lock:
+            if self._fresh():
+                return self._healthy
+            healthy = self.probe()
+            if not healthy and self.account and self.password:
+                logging.getLogger(__name__).info("Soulseek session looks stale, logging in again...")
+                healthy = self.login() and self.probe()
+            self._healthy = healthy
+            self._checked_at = time.monotonic()
+            return healthy
+
+    def probe(self) -> bool:
+        """Run a quick test query; False only when the CLI reports an auth/connection error."""
+        with metrics.timer('soulseek_auth_probe_seconds', result='ok') as labels, \
+                tracer.span('soulseek auth probe', cat='cli', argv=["soulseek", "query", "test"]) as span:
+            try:
+                logging.getLogger(__name__).info("Testing Soulseek authentication...")
+                result = subprocess.run(
+                    ["soulseek", "query", "test"],
+                    capture_output=True,
+                    text=True,
+                    timeout=10
+                )
+                span['exit_code'] = result.returncode
+                if is_auth_error(result.stdout + " " + result.stderr):
+                    labels['result'] = 'auth_error'
+                    return False
+                logging.getLogger(__name__).info("Soulseek authentication test passed.")
+            except subprocess.TimeoutExpired:
+                labels['result'] = 'timeout'
+                logging.getLogger(__name__).warning("Soulseek authentication test timed out, proceeding anyway...")
+            except Exception as e:
+                labels['result'] = 'error'
+                logging.getLogger(__name__).warning(f"Soulseek authentication test failed: {e}, proceeding anyway...")
+        return True
+
+    def mark_healthy(self) -> None:
+        """Record that a real query just succeeded, extending the cached result."""
+        with self._lock:
+            self._healthy = True
+            self._checked_at = time.monotonic()
+
+    def invalidate(self) -> None:
+        """Drop the cached result so the next search probes (and re-logs in) again."""
+        with self._lock:
+            self._checked_at = None
+
+    def _fresh(self) -> bool:
+        return self._checked_at is not None and time.monotonic() - self._checked_at < self.ttl
+
+
+AUDIO_EXTENSIONS = ('mp3', 'flac', 'wav', 'ogg', 'm4a', 'aac')
+
+_EXT_RE = re.compile(r'\.(?:%s)(?=$|[\s),\]|])' % '|'.join(AUDIO_EXTENSIONS), re.I)
+_LEAD_RE = re.compile(r'^(?:\d+[.)]\s+|\d+\s*-\s*(?=\[))?(?:\[([^\]]+)\])?\s*[-:|]?\s*')
+_NUMBER_RE = re.compile(r'^(\d+)\s*[.)-]')
+_USER_RE = re.compile(r'\buser(?:name)?\s*[:=]\s*([^\s,)]+)', re.I)
+_BITRATE_RE = re.compile(r'(\d{2,4})\s*kbps', re.I)
+_SPEED_RE = re.compile(r'(\d+(?:\.\d+)?)\s*([KMG]?i?B)/s', re.I)
+_SIZE_RE = re.compile(r'(\d+(?:\.\d+)?)\s*([KMG]?i?B)\b(?!/s)', re.I)
+_DURATION_RE = re.compile(r'(?<![\d:])(?:(\d{1,2}):)?(\d{1,2}):([0-5]\d)(?![\d:])')
+_NO_SLOT_RE = re.compile(r'no free slots?|slots?\s*[:=]\s*0\b|queued', re.I)
+_UNITS = {'b': 1, 'kb': 1024, 'kib': 1024, 'mb': 1024 ** 2, 'mib': 1024 ** 2, 'gb': 1024 ** 3, 'gib': 1024 ** 3}
+
+
+def _bytes(match: Optional[re.Match]) -> int:
+    if not match:
+        return 0
+    return int(float(match.group(1)) * _UNITS.get(match.group(2).lower(), 1))
+
+
+def _duration(match: Optional[re.Match]) -> Optional[int]:
+    if not match:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds)
+
+
+def _attributes(text: str) -> dict:
+    bitrate = _BITRATE_RE.search(text)
+    return {
+        'bitrate': int(bitrate.group(1)) if bitrate else None,
+        'size': _bytes(_SIZE_RE.search(_SPEED_RE.sub('', text))),
+        'speed': _bytes(_SPEED_RE.search(text)),
+        'slots': not _NO_SLOT_RE.search(text),
+        'duration': _duration(_DURATION_RE.search(text)),
+    }
+
+
+def parse_choices(output: str) -> List[Tuple[int, Candidate]]:
+    """Parse soulseek-cli result listings into (choice number, candidate) pairs.
+
+    Each audio file line is expected to look roughly like
+    ``1. [user] Music\\Artist\\Song.mp3 (320 kbps, 8.1 MB, 1.2 MB/s)``; the
+    index, brackets and attribute order are all optional. Lines naming a user
+    but no audio file are treated as folder headers whose number, user, path
+    and attributes apply to the file lines beneath them. Entries without a
+    printed number are numbered by their position in the listing.
+    """
+    choices: List[Tuple[int, Candidate]] = []
+    folder_user, folder_path, folder_attrs, folder_number = '', '', {}, 0
+    position = 0
+    for line in (output or '').splitlines():
+        if not line.strip():
+            continue
+        lead = _LEAD_RE.match(line)
+        user = lead.group(1) or ''
+        number = _NUMBER_RE.match(line)
+        body = line[lead.end():]
+        named = _USER_RE.search(body)
+        if not user and named:
+            user = named.group(1)
+            body = (body[:named.start()] + body[named.end():]).strip()
+        ext = None
+        for ext in _EXT_RE.finditer(body):
+            pass
+        if ext is None:
+            if user:
+                position += 1
+                folder_number = int(number.group(1)) if number else position
+                folder_user = user
+                folder_path = body.split('(')[0].strip(' -|')
+                folder_attrs = _attributes(body)
+            continue
+        path = body[:ext.end()].strip(' -|')
+        attrs = _attributes(body[ext.end():])
+        if not user and folder_user:
+            # File listed beneath a folder header inherits its user, path and attributes
+            user = folder_user
+            choice = folder_number
+            if folder_path and '/' not in path and '\\' not in path:
+                sep = '\\' if '\\' in folder_path else '/'
+                path = folder_path.rstrip('/\\') + sep + path
+            for key, value in folder_attrs.items():
+                if key != 'duration' and attrs[key] in (None, 0):
+                    attrs[key] = value
+            attrs['slots'] = attrs['slots'] and folder_attrs['slots']
+        else:
+            position += 1
+            choice = int(number.group(1)) if number else position
+        choices.append((choice, Candidate(user=user, file=path, **attrs)))
+    return choices
+
+
+def parse_query_output(output: str) -> List[Candidate]:
+    """Parse soulseek-cli result listings into candidates (see parse_choices)."""
+    return [candidate for _, candidate in parse_choices(output)]
+
+
+def filter_candidates(candidates: Iterable[Candidate], mode: Optional[str] = None,
+                      min_bitrate: Optional[int] = None) -> List[Candidate]:
+    """Keep candidates matching a file mode and minimum bitrate.
+
+    FLAC always satisfies a bitrate floor; other files with an unknown bitrate
+    only pass when no minimum is set. Candidates without a file name (output we
+    could not parse) are assumed to match the mode the CLI was queried with.
+    """
+    kept = []
+    for c in candidates:
+        if mode and c.extension and c.extension != mode:
+            continue
+        if min_bitrate and c.extension != 'flac' and (c.bitrate is None or c.bitrate < min_bitrate):
+            continue
+        kept.append(c)
+    return kept
+
+
+# Prompt soulseek-cli prints once the result listing is complete
+_PROMPT_RE = re.compile(r'^\?\s|(?:choose|select|which|enter)\b.*[:?>]$|\?$', re.I)
+
+
+class DownloadSession:
+    """One interactive `soulseek download` run.
+
+    soulseek-cli searches, prints numbered results and then waits for a choice
+    on stdin. The session parses that listing so the caller can pick the exact
+    candidate it wants and have the same process download it, instead of
+    searching a second time and blindly answering "1".
+    """
+    def __init__(self, query: str, destination: str, mode: Optional[str] = None) -> None:
+        self.query = query
+        self.destination = destination
+        self.cmd = ["soulseek", "download", query, "--destination", destination]
+        if mode:
+            self.cmd += ["--mode", mode]
+        self.choices: List[Tuple[int, Candidate]] = []
+        self.waiting = False
+        self.cancelled = False
+        self._chunks: List[bytes] = []
+        self._changed = threading.Condition()
+        self._process: Optional[subprocess.Popen] = None
+        self._reader: Optional[threading.Thread] = None
+
+    @property
+    def candidates(self) -> List[Candidate]:
+        return [candidate for _, candidate in self.choices]
+
+    @property
+    def output(self) -> str:
+        with self._changed:
+            return b''.join(self._chunks).decode('utf-8', errors='replace')
+
+    @property
+    def returncode(self) -> Optional[int]:
+        return self._process.returncode if self._process else None
+
+    def start(self, timeout: float) -> List[Candidate]:
+        """Run the search and wait for the result prompt; raises TimeoutExpired."""
+        with self._changed:
+            # cancel() may race with start() when sessions are hedged
+            if self.cancelled:
+                return []
+            self._process = subprocess.Popen(
+                self.cmd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+            )
+        self._reader = threading.Thread(target=self._drain, name="soulseek-session", daemon=True)
+        self._reader.start()
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while True:
+                lines = b''.join(self._chunks).decode('utf-8', errors='replace').strip().splitlines()
+                if lines and _PROMPT_RE.search(lines[-1].strip()):
+                    self.waiting = True
+                    break
+                if not self._reader.is_alive():
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.cancel()
+                    raise subprocess.TimeoutExpired(self.cmd, timeout)
+                self._changed.wait(remaining)
+        if self.waiting:
+            self.choices = parse_choices(self.output)
+        else:
+            # Process exited without prompting (usually "No search results")
+            self._process.wait()
+            self.choices = []
+        return self.candidates
+
+    def index_of(self, candidate: Candidate) -> Optional[int]:
+        """Return the choice number for a candidate, matched on user and file."""
+        for number, listed in self.choices:
+            if listed.user == candidate.user and listed.file == candidate.file:
+                return number
+        return None
+
+    def choose(self, candidate: Candidate, timeout: float) -> Optional[int]:
+        """Download a listed candidate; returns the exit code, or None if it is not listed."""
+        number = self.index_of(candidate)
+        if number is None or not self.waiting:
+            self.cancel()
+            return None
+        try:
+            self._process.stdin.write(f"{number}\n".encode())
+            self._process.stdin.flush()
+            self._process.stdin.close()
+        except OSError:
+            pass
+        try:
+            returncode = self._process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self.cancel()
+            raise
+        self._reader.join(timeout=1)
+        return returncode
+
+    def cancel(self) -> None:
+        """Kill the process if it is still running, or stop it from starting."""
+        with self._changed:
+            self.cancelled = True
+            process = self._process
+        if process and process.poll() is None:
+            process.kill()
+            process.wait()
+
+    def _drain(self) -> None:
+        stream = self._process.stdout
+        while True:
+            chunk = stream.read1(4096) if hasattr(stream, 'read1') else stream.read(4096)
+            with self._changed:
+                if chunk:
+                    self._chunks.append(chunk)
+                self._changed.notify_all()
+            if not chunk:
+                break
@@ -3,70 +3,222 @@ spotify_client.py: Wrapper around Spotify Web API for playlist operations.
 """
 
 import logging
-from typing import List
-# Guard spotipy import for test environments
-try:
-    import spotipy
-    from spotipy.oauth2 import SpotifyOAuth
-    from spotipy.exceptions import SpotifyException
-except ImportError:
-    logging.getLogger(__name__).warning("spotipy not installed, using dummy Spotify client for tests")
-    class SpotifyException(Exception):
-        pass
-    class SpotifyOAuth:
-        def __init__(self, *args, **kwargs):
-            pass
-    class _DummySp:
-        def __init__(self, *args, **kwargs):
-            pass
-        def playlist_items(self, playlist_id):
-            return {'items': []}
-        def playlist_remove_all_occurrences_of_items(self, playlist_id, uris):
-            pass
-    spotipy = type('spotipy', (), {'Spotify': _DummySp})
-    SpotifyOAuth = SpotifyOAuth
-    SpotifyException = SpotifyException
+import threading
+import time
+from types import SimpleNamespace
+from typing import List, Optional
 
 from spotify_syncer.config import SPOTIPY_CLIENT_ID, SPOTIPY_CLIENT_SECRET, REDIRECT_URI, SPOTIFY_SCOPE, PLAYLIST_ID
 from spotify_syncer.domain import Track
+from spotify_syncer.metrics import metrics
+
+# Spotify accepts at most 100 URIs per playlist write
+REMOVE_BATCH_SIZE = 100
+# Attempts per batch when Spotify answers 429 Too Many Requests
+RATE_LIMIT_RETRIES = 5
+
+
+_spotipy_api: Optional[SimpleNamespace] = None
+_spotipy_lock = threading.Lock()
+
+
+def _spotipy() -> SimpleNamespace:
+    """Import spotipy on first use; it pulls in requests and urllib3, which slow startup.
+
+    Without spotipy (test environments) a dummy client is returned.
+    """
+    global _spotipy_api
+    with _spotipy_lock:
+        if _spotipy_api is None:
+            _spotipy_api = _load_spotipy()
+        return _spotipy_api
+
+
+def _load_spotipy() -> SimpleNamespace:
+    try:
+        import spotipy
+        from spotipy.oauth2 import SpotifyOAuth
+        from spotipy.exceptions import SpotifyException
+    except ImportError:
+        logging.getLogger(__name__).warning("spotipy not installed, using dummy Spotify client for tests")
+        class SpotifyException(Exception):
+            pass
+        class SpotifyOAuth:
+            def __init__(self, *args, **kwargs):
+                pass
+        class _DummySp:
+            def __init__(self, *args, **kwargs):
+                pass
+            def playlist(self, playlist_id, fields=None):
+                return {}
+            def playlist_items(self, playlist_id):
+                return {'items': []}
+            def next(self, result):
+                return None
+            def playlist_remove_all_occurrences_of_items(self, playlist_id, uris, snapshot_id=None):
+                pass
+        spotipy = SimpleNamespace(Spotify=_DummySp)
+    return SimpleNamespace(spotipy=spotipy, SpotifyOAuth=SpotifyOAuth, SpotifyException=SpotifyException)
+
+
+def __getattr__(name: str):
+    # spotify_client.SpotifyException etc. still resolve, importing spotipy on first access
+    if name in ('spotipy', 'SpotifyOAuth', 'SpotifyException'):
+        return getattr(_spotipy(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _retry_after(error: Exception, default: float = 1.0) -> float:
+    """Seconds to wait before retrying a rate-limited request, from its Retry-After header."""
+    headers = getattr(error, 'headers', None) or {}
+    value = headers.get('Retry-After') or headers.get('retry-after')
+    try:
+        return min(max(float(value), 0.0), 300.0)
+    except (TypeError, ValueError):
+        return default
+
 
 class SpotifyClient:
-    def __init__(self) -> None:
+    # spotipy shares one requests session; serialise calls from sync workers
+    _lock = threading.Lock()
+    _connect_lock = threading.Lock()
+    _sp = None
+    # Optional State used to persist the playlist snapshot and track list
+    state = None
+    # Snapshot the last get_tracks() result belongs to
+    snapshot_id = None
+
+    def __init__(self, state=None, sp=None) -> None:
+        self.state = state
+        # Pre-built spotipy-compatible client (benchmarks, tests) skips OAuth
+        self._sp = sp
+
+    @property
+    def sp(self):
+        """The spotipy client, created (with OAuth) on first use rather than at startup."""
+        if self._sp is None:
+            with self._connect_lock:
+                if self._sp is None:
+                    self._sp = self._connect()
+        return self._sp
+
+    @sp.setter
+    def sp(self, client) -> None:
+        self._sp = client
+
+    def _connect(self):
+        api = _spotipy()
         try:
-            auth_manager = SpotifyOAuth(
+            auth_manager = api.SpotifyOAuth(
                 client_id=SPOTIPY_CLIENT_ID,
                 client_secret=SPOTIPY_CLIENT_SECRET,
                 redirect_uri=REDIRECT_URI,
                 scope=SPOTIFY_SCOPE
             )
-            self.sp = spotipy.Spotify(auth_manager=auth_manager)
-        except SpotifyException as e:
+            return api.spotipy.Spotify(auth_manager=auth_manager)
+        except api.SpotifyException as e:
             logging.error(f"Spotify auth error: {e}")
             raise
 
+    def get_snapshot_id(self) -> Optional[str]:
+        """Fetch only the playlist's current snapshot_id."""
+        try:
+            with self._lock:
+                res = self.sp.playlist(PLAYLIST_ID, fields='snapshot_id')
+        except Exception as e:
+            logging.error(f"Spotify API error fetching playlist snapshot: {e}")
+            return None
+        return (res or {}).get('snapshot_id')
+
     def get_tracks(self) -> List[Track]:
-        """Fetch current playlist items and return a list of Track objects."""
+        """Return the playlist's tracks, reusing the cached list while its snapshot is unchanged."""
+        with metrics.timer('spotify_fetch_seconds', source='api') as labels:
+            return self._get_tracks(labels)
+
+    def _get_tracks(self, labels: dict) -> List[Track]:
+        snapshot_id = self.get_snapshot_id() if self.state is not None else None
+        self.snapshot_id = snapshot_id
+        cached = self.state.get_playlist(PLAYLIST_ID) if snapshot_id else None
+        if cached and cached[0] == snapshot_id:
+            logging.info(f"Playlist unchanged (snapshot {snapshot_id}); {len(cached[1])} cached tracks")
+            labels['source'] = 'cache'
+            return cached[1]
         try:
-            res = self.sp.playlist_items(PLAYLIST_ID)
+            items = self._fetch_all()
         except Exception as e:
             logging.error(f"Spotify API error fetching tracks: {e}")
+            labels['source'] = 'error'
             return []
-        items: List[Track] = []
-        for entry in res.get('items', []):
-            t = entry.get('track', {}) or {}
-            items.append(Track(
-                id=t.get('id', ''),
-                uri=t.get('uri', ''),
-                name=t.get('name', ''),
-                artist=(t.get('artists', [{}])[0].get('name') if t.get('artists') else '')
-            ))
         logging.info(f"Found {len(items)} tracks in playlist")
+        if snapshot_id:
+            if cached:
+                before = {t.id for t in cached[1]}
+                after = {t.id for t in items}
+                logging.info(f"Playlist changed: {len(after - before)} added, {len(before - after)} removed")
+            self.state.save_playlist(PLAYLIST_ID, snapshot_id, items)
         return items
 
-    def remove_tracks(self, uris: List[str]) -> None:
-        """Remove tracks (by URI) from the configured playlist."""
-        try:
-            self.sp.playlist_remove_all_occurrences_of_items(PLAYLIST_ID, uris)
-            logging.info(f"Removed {len(uris)} tracks from playlist")
-        except Exception as e:
-            logging.error(f"Spotify API error removing tracks: {e}")
+    def _fetch_all(self) -> List[Track]:
+        """Fetch every page of playlist items."""
+        with self._lock:
+            res = self.sp.playlist_items(PLAYLIST_ID)
+        items: List[Track] = []
+        while res:
+            for entry in res.get('items', []):
+                t = entry.get('track', {}) or {}
+                items.append(Track(
+                    id=t.get('id', ''),
+                    uri=t.get('uri', ''),
+                    name=t.get('name', ''),
+                    artist=(t.get('artists', [{}])[0].get('name') if t.get('artists') else ''),
+                    duration_ms=t.get('duration_ms')
+                ))
+            if not res.get('next'):
+                break
+            with self._lock:
+                res = self.sp.next(res)
+        return items
+
+    def remove_tracks(self, uris: List[str], snapshot_id: Optional[str] = None) -> Optional[str]:
+        """Remove tracks (by URI) from the configured playlist in batches of 100.
+
+        Each batch is pinned to snapshot_id (then to the snapshot returned by
+        the previous batch) and retried on 429 after the Retry-After delay.
+        Returns the playlist's snapshot_id after the last batch, if known.
+        """
+        pinned = snapshot_id
+        removed = 0
+        for start in range(0, len(uris), REMOVE_BATCH_SIZE):
+            batch = uris[start:start + REMOVE_BATCH_SIZE]
+            try:
+                res = self._remove_batch(batch, snapshot_id)
+            except Exception as e:
+                logging.error(f"Spotify API error removing tracks: {e}")
+                return None
+            snapshot_id = (res or {}).get('snapshot_id')
+            removed += len(batch)
+        logging.info(f"Removed {removed} tracks from playlist")
+        if pinned and snapshot_id and self.state is not None:
+            # Keep the cached list in step so the next sync doesn't refetch our own edit
+            cached = self.state.get_playlist(PLAYLIST_ID)
+            if cached and cached[0] == pinned:
+                gone = set(uris)
+                self.state.save_playlist(PLAYLIST_ID, snapshot_id, [t for t in cached[1] if t.uri not in gone])
+                self.snapshot_id = snapshot_id
+        return snapshot_id
+
+    def _remove_batch(self, uris: List[str], snapshot_id: Optional[str]):
+        for attempt in range(RATE_LIMIT_RETRIES):
+            try:
+                with self._lock:
+                    if snapshot_id:
+                        return self.sp.playlist_remove_all_occurrences_of_items(
+                            PLAYLIST_ID, uris, snapshot_id=snapshot_id
+                        )
+                    return self.sp.playlist_remove_all_occurrences_of_items(PLAYLIST_ID, uris)
+            except _spotipy().SpotifyException as e:
+                if getattr(e, 'http_status', None) != 429 or attempt == RATE_LIMIT_RETRIES - 1:
+                    raise
+                delay = _retry_after(e)
+                logging.warning(f"Spotify rate limited playlist removal; retrying in {delay:.0f}s")
+                time.sleep(delay)
@@ -1,46 +1,312 @@
 """state.py: Persistence for downloaded track IDs using SQLite."""
 
+import atexit
 import os
 import sqlite3, logging
 import threading
-from typing import Optional
+import time
+import weakref
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from spotify_syncer.domain import DownloadResult, Track
+from spotify_syncer.metrics import metrics
 
 # Alias for downloaded set type
 OptionalSet = set[str]
 
+DEFAULT_DB_PATH = os.path.expanduser('~/.spotifytorrent.db')
+
+# Pragmas applied to every connection: WAL lets readers proceed during batch commits
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+)
+
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version
+MIGRATIONS = (
+    # 1: downloaded IDs and the playlist snapshot cache
+    (
+        "CREATE TABLE IF NOT EXISTS downloaded(id TEXT PRIMARY KEY)",
+        "CREATE TABLE IF NOT EXISTS playlists(id TEXT PRIMARY KEY, snapshot_id TEXT)",
+        "CREATE TABLE IF NOT EXISTS playlist_tracks("
+        "playlist_id TEXT, position INTEGER, id TEXT, uri TEXT, name TEXT, artist TEXT, "
+        "PRIMARY KEY(playlist_id, position))",
+    ),
+    # 2: per-track download records
+    (
+        "CREATE TABLE IF NOT EXISTS downloads("
+        "track_id TEXT PRIMARY KEY, name TEXT, artist TEXT, path TEXT, size INTEGER, "
+        "format TEXT, bitrate INTEGER, peer TEXT, query TEXT, attempts INTEGER, "
+        "started_at REAL, finished_at REAL, search_seconds REAL, download_seconds REAL)",
+        "CREATE INDEX IF NOT EXISTS idx_downloads_finished_at ON downloads(finished_at)",
+        "CREATE INDEX IF NOT EXISTS idx_downloads_artist ON downloads(artist)",
+        "CREATE INDEX IF NOT EXISTS idx_downloads_path ON downloads(path)",
+    ),
+    # 3: failed searches and when each track may be retried
+    (
+        "CREATE TABLE IF NOT EXISTS failures("
+        "track_id TEXT PRIMARY KEY, query TEXT, attempts INTEGER, last_failed_at REAL, next_attempt_at REAL)",
+    ),
+    # 4: Soulseek query outcome cache (see query_cache.py)
+    (
+        "CREATE TABLE IF NOT EXISTS query_cache("
+        "query TEXT, mode TEXT, candidates TEXT, expires_at REAL, used_at REAL, PRIMARY KEY(query, mode))",
+        "CREATE INDEX IF NOT EXISTS idx_query_cache_used_at ON query_cache(used_at)",
+    ),
+    # 5: index of audio files already in DOWNLOAD_DIR (see library.py)
+    (
+        "CREATE TABLE IF NOT EXISTS library(path TEXT PRIMARY KEY, mtime REAL, context TEXT, titles TEXT)",
+    ),
+    # 6: track durations, used to rank search results
+    (
+        "ALTER TABLE playlist_tracks ADD COLUMN duration_ms INTEGER",
+    ),
+    # 7: search statistics per query variant kind (see variant_stats.py)
+    (
+        "CREATE TABLE IF NOT EXISTS variant_stats(kind TEXT PRIMARY KEY, tries INTEGER, wins INTEGER, seconds REAL)",
+    ),
+    # 8: rolling latency samples for adaptive timeouts (see timeouts.py)
+    (
+        "CREATE TABLE IF NOT EXISTS latencies(phase TEXT, key TEXT, samples TEXT, PRIMARY KEY(phase, key))",
+    ),
+    # 9: persistent per-track work queue (see work_queue.py)
+    (
+        "CREATE TABLE IF NOT EXISTS jobs("
+        "track_id TEXT PRIMARY KEY, uri TEXT, name TEXT, artist TEXT, duration_ms INTEGER, "
+        "status TEXT, priority INTEGER, position INTEGER, attempts INTEGER, "
+        "lease_owner TEXT, lease_expires_at REAL, enqueued_at REAL, updated_at REAL)",
+        "CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs(status, priority, position)",
+    ),
+    # 10: directory mtimes of the library index, so unchanged folders are not listed again
+    (
+        "CREATE TABLE IF NOT EXISTS library_dirs(path TEXT PRIMARY KEY, mtime REAL, subdirs TEXT)",
+    ),
+)
+
+DOWNLOAD_COLUMNS = (
+    'track_id', 'name', 'artist', 'path', 'size', 'format', 'bitrate', 'peer', 'query',
+    'attempts', 'started_at', 'finished_at', 'search_seconds', 'download_seconds',
+)
+
+
+def _flush_if_alive(ref: "weakref.ref[State]") -> None:
+    state = ref()
+    if state is not None:
+        state.flush()
+
+
 class State:
-    def __init__(self, db_path: Optional[str] = None) -> None:
-        """Initialize SQLite DB and load processed track IDs into memory."""
-        self.db_path = db_path or os.path.expanduser('~/.spotifytorrent.db')
-        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+    def __init__(self, db_path: Optional[str] = None, write_behind: bool = False,
+                 batch_size: int = 50, flush_interval: float = 5.0, read_only: bool = False) -> None:
+        """Initialize SQLite DB and load processed track IDs into memory.
+
+        With write_behind, add() updates the in-memory set at once and queues
+        the INSERT; queued IDs are committed together once batch_size build up,
+        flush() is called (at sync end and exit), or at the latest flush_interval
+        seconds after the first of them was queued (by a timer thread).
+
+        With read_only, an existing database is opened as it is: nothing is
+        created, configured or migrated, and a missing file raises
+        sqlite3.OperationalError.
+        """
+        self.db_path = db_path or DEFAULT_DB_PATH
+        if read_only:
+            uri = Path(self.db_path).absolute().as_uri() + '?mode=ro'
+            self.conn = sqlite3.connect(uri, uri=True, timeout=5, check_same_thread=False)
+        else:
+            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
         self.lock = threading.Lock()
-        self._create_table()
+        self.write_behind = write_behind
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._pending: List[str] = []
+        self._pending_records: List[tuple] = []
+        self._last_flush = time.monotonic()
+        self._flush_timer: Optional[threading.Timer] = None
+        if not read_only:
+            self._configure()
+            self._migrate()
         self.downloaded: OptionalSet = set(self._load_ids())
+        # track_id -> (attempts, next_attempt_at) for tracks whose last search found nothing
+        self.failures: Dict[str, Tuple[int, float]] = self._load_failures()
+        if write_behind:
+            atexit.register(_flush_if_alive, weakref.ref(self))
 
-    def _create_table(self) -> None:
+    def _configure(self) -> None:
         cursor = self.conn.cursor()
-        cursor.execute("CREATE TABLE IF NOT EXISTS downloaded(id TEXT PRIMARY KEY)")
-        self.conn.commit()
+        for pragma in PRAGMAS:
+            try:
+                cursor.execute(pragma)
+            except sqlite3.DatabaseError as e:
+                logging.getLogger(__name__).warning(f"Could not apply '{pragma}' to {self.db_path}: {e}")
+
+    def _migrate(self) -> None:
+        """Apply schema migrations newer than the database's user_version.
+
+        Each migration and its version bump run in one explicit transaction
+        (the sqlite3 module would otherwise autocommit every DDL statement),
+        so a crash part-way leaves the database at the previous version.
+        """
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+            cursor = self.conn.cursor()
+            cursor.execute("BEGIN")
+            try:
+                for statement in statements:
+                    cursor.execute(statement)
+                cursor.execute(f"PRAGMA user_version = {number}")
+            except BaseException:
+                self.conn.rollback()
+                raise
+            self.conn.commit()
+            logging.getLogger(__name__).info(f"Migrated {self.db_path} to schema version {number}")
 
     def _load_ids(self) -> list[str]:
         cursor = self.conn.cursor()
         cursor.execute("SELECT id FROM downloaded")
         return [row[0] for row in cursor.fetchall()]
 
-    def add(self, track_id: str) -> None:
-        """Add a track ID to the database and in-memory set."""
+    def _load_failures(self) -> Dict[str, Tuple[int, float]]:
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT track_id, attempts, next_attempt_at FROM failures")
+        return {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+
+    def add(self, track_id: str, record: Optional[tuple] = None) -> None:
+        """Add a track ID (and optionally its download record) to the database and in-memory set."""
         try:
             with self.lock:
-                cursor = self.conn.cursor()
-                cursor.execute("INSERT OR IGNORE INTO downloaded(id) VALUES(?)", (track_id,))
-                self.conn.commit()
                 self.downloaded.add(track_id)
+                self.failures.pop(track_id, None)
+                self._pending.append(track_id)
+                if record is not None:
+                    self._pending_records.append(record)
+                if self.write_behind:
+                    due = time.monotonic() - self._last_flush >= self.flush_interval
+                    if len(self._pending) < self.batch_size and not due:
+                        self._arm_flush_timer()
+                        return
+                self._commit_pending()
         except Exception as e:
             logging.getLogger(__name__).error(f"Error saving state to {self.db_path}: {e}")
 
+    def record_download(self, track: Track, result: DownloadResult, started_at: float,
+                        finished_at: Optional[float] = None) -> None:
+        """Mark a track downloaded and store where it went and how it was found."""
+        candidate = result.candidate
+        record = (
+            track.id, track.name, track.artist, result.path, result.size, result.format,
+            candidate.bitrate if candidate else None, candidate.user if candidate else None,
+            result.query, result.attempts, started_at, finished_at or time.time(),
+            result.search_seconds, result.download_seconds,
+        )
+        self.add(track.id, record)
+
+    def get_download(self, track_id: str) -> Optional[dict]:
+        """Return the stored download record for a track, if any."""
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT {', '.join(DOWNLOAD_COLUMNS)} FROM downloads WHERE track_id = ?", (track_id,)
+            ).fetchone()
+        return dict(zip(DOWNLOAD_COLUMNS, row)) if row else None
+
+    def recent_downloads(self, limit: int = 20) -> List[dict]:
+        """Return the most recently finished download records."""
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT {', '.join(DOWNLOAD_COLUMNS)} FROM downloads ORDER BY finished_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [dict(zip(DOWNLOAD_COLUMNS, row)) for row in rows]
+
+    def is_due(self, track_id: str, now: Optional[float] = None) -> bool:
+        """Return True unless the track failed recently and its backoff has not elapsed."""
+        failure = self.failures.get(track_id)
+        return failure is None or failure[1] <= (now if now is not None else time.time())
+
+    def failure_attempts(self, track_id: str) -> int:
+        """Return how many consecutive searches for the track have found nothing."""
+        failure = self.failures.get(track_id)
+        return failure[0] if failure else 0
+
+    def record_failure(self, track_id: str, query: str, next_attempt_at: float) -> int:
+        """Count a failed search and hold the track back until next_attempt_at; returns the attempt count."""
+        try:
+            with self.lock:
+                attempts = self.failures.get(track_id, (0, 0.0))[0] + 1
+                self.failures[track_id] = (attempts, next_attempt_at)
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO failures(track_id, query, attempts, last_failed_at, next_attempt_at) "
+                    "VALUES(?, ?, ?, ?, ?)",
+                    (track_id, query, attempts, time.time(), next_attempt_at)
+                )
+                self.conn.commit()
+                return attempts
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Error saving failure to {self.db_path}: {e}")
+            return self.failure_attempts(track_id)
+
+    def reset_failures(self, track_ids: Optional[List[str]] = None) -> None:
+        """Make failed tracks (all of them by default) eligible for the next sync."""
+        try:
+            with self.lock:
+                cursor = self.conn.cursor()
+                if track_ids is None:
+                    self.failures.clear()
+                    cursor.execute("DELETE FROM failures")
+                else:
+                    for track_id in track_ids:
+                        self.failures.pop(track_id, None)
+                    cursor.executemany("DELETE FROM failures WHERE track_id = ?", [(i,) for i in track_ids])
+                self.conn.commit()
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Error resetting failures in {self.db_path}: {e}")
+
+    def flush(self) -> None:
+        """Commit any IDs queued by write-behind add() calls."""
+        try:
+            with self.lock:
+                self._commit_pending()
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Error flushing state to {self.db_path}: {e}")
+
+    def _arm_flush_timer(self) -> None:
+        # Caller holds self.lock; a weak reference lets an idle State be collected before the timer fires
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(self.flush_interval, _flush_if_alive, (weakref.ref(self),))
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def _commit_pending(self) -> None:
+        # Caller holds self.lock
+        self._last_flush = time.monotonic()
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        records, self._pending_records = self._pending_records, []
+        with metrics.timer('state_commit_seconds'):
+            cursor = self.conn.cursor()
+            cursor.executemany("INSERT OR IGNORE INTO downloaded(id) VALUES(?)", [(i,) for i in pending])
+            cursor.executemany("DELETE FROM failures WHERE track_id = ?", [(i,) for i in pending])
+            if records:
+                cursor.executemany(
+                    f"INSERT OR REPLACE INTO downloads({', '.join(DOWNLOAD_COLUMNS)}) "
+                    f"VALUES({', '.join('?' * len(DOWNLOAD_COLUMNS))})",
+                    records
+                )
+            self.conn.commit()
+        metrics.inc('state_rows_written_total', len(pending))
+
     def __del__(self) -> None:
-        """Close the database connection on object deletion."""
+        """Flush queued writes and close the database connection on object deletion."""
         try:
+            if self._pending:
+                self.flush()
             self.conn.close()
         except Exception:
             pass
@@ -49,10 +315,43 @@ class State:
         """Clear all downloaded track IDs from the database and in-memory set."""
         try:
             with self.lock:
+                self._pending.clear()
+                self._pending_records.clear()
                 cursor = self.conn.cursor()
                 cursor.execute("DELETE FROM downloaded")
                 self.conn.commit()
                 self.downloaded.clear()
                 logging.getLogger(__name__).info("Cleared downloaded state database.")
         except Exception as e:
-            logging.getLogger(__name__).error(f"Error clearing state {self.db_path}: {e}")
\ No newline at end of file
+            logging.getLogger(__name__).error(f"Error clearing state {self.db_path}: {e}")
+
+    def get_playlist(self, playlist_id: str) -> Optional[Tuple[str, List[Track]]]:
+        """Return the cached (snapshot_id, tracks) for a playlist, if any."""
+        with self.lock:
+            cursor = self.conn.cursor()
+            row = cursor.execute("SELECT snapshot_id FROM playlists WHERE id = ?", (playlist_id,)).fetchone()
+            if not row:
+                return None
+            cursor.execute(
+                "SELECT id, uri, name, artist, duration_ms FROM playlist_tracks WHERE playlist_id = ? ORDER BY position",
+                (playlist_id,)
+            )
+            return row[0], [Track(*r) for r in cursor.fetchall()]
+
+    def save_playlist(self, playlist_id: str, snapshot_id: str, tracks: List[Track]) -> None:
+        """Replace the cached track list for a playlist snapshot."""
+        try:
+            with self.lock:
+                cursor = self.conn.cursor()
+                cursor.execute("DELETE FROM playlist_tracks WHERE playlist_id = ?", (playlist_id,))
+                cursor.executemany(
+                    "INSERT INTO playlist_tracks(playlist_id, position, id, uri, name, artist, duration_ms) "
+                    "VALUES(?, ?, ?, ?, ?, ?, ?)",
+                    [(playlist_id, i, t.id, t.uri, t.name, t.artist, t.duration_ms) for i, t in enumerate(tracks)]
+                )
+                cursor.execute(
+                    "INSERT OR REPLACE INTO playlists(id, snapshot_id) VALUES(?, ?)", (playlist_id, snapshot_id)
+                )
+                self.conn.commit()
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Error caching playlist in {self.db_path}: {e}")
@@ -0,0 +1,254 @@
+"""
+syncer.py: Playlist sync pipeline shared by the tray apps.
+"""
+
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Optional, Set
+
+from spotify_syncer.config import DELETE_AFTER_DOWNLOADED, RETRY_BASE_DELAY, RETRY_MAX_DELAY, SYNC_WORKERS, TRACE_FILE
+from spotify_syncer.domain import Track
+from spotify_syncer.events import event_bus
+from spotify_syncer.metrics import metrics
+from spotify_syncer.tracing import tracer
+from spotify_syncer.spotify_client import REMOVE_BATCH_SIZE
+from spotify_syncer.torrent_searchers import SearchUnavailable
+from spotify_syncer.work_queue import PRIORITY_NEW, PRIORITY_RETRY
+
+# Finished work-queue jobs are kept this long for status output
+JOB_RETENTION = 7 * 24 * 3600
+
+
+def backoff_delay(attempts: int, base: float = RETRY_BASE_DELAY, cap: float = RETRY_MAX_DELAY) -> float:
+    """Exponential delay for the given failure count, with jitter so retries spread out."""
+    delay = min(cap, base * 2 ** max(0, attempts - 1))
+    return delay * random.uniform(0.75, 1.0)
+
+
+class Syncer:
+    """Fetch the playlist and run pending tracks through a bounded worker pool."""
+    def __init__(self, spotify_client, state, searcher, workers: Optional[int] = None,
+                 delete_after: Optional[bool] = None, library=None, queue=None) -> None:
+        self.sp = spotify_client
+        self.state = state
+        self.searcher = searcher
+        # Optional LibraryIndex; tracks already on disk are marked downloaded instead of searched
+        self.library = library
+        # Optional WorkQueue; pending tracks are persisted and claimed from it so an interrupted sync resumes
+        self.queue = queue
+        self.workers = max(1, workers or SYNC_WORKERS)
+        self.delete_after = DELETE_AFTER_DOWNLOADED if delete_after is None else delete_after
+        # Playlist removals are deferred and written in batches pinned to the sync's snapshot
+        self._removals: List[str] = []
+        self._removals_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._snapshot_id: Optional[str] = None
+
+    def pending(self, tracks: List[Track], force: bool = False) -> List[Track]:
+        """Return tracks not yet downloaded, dropping duplicate playlist entries.
+
+        Tracks whose earlier searches failed are held back until their backoff
+        elapses, unless force is set.
+        """
+        seen = set()
+        pending: List[Track] = []
+        now = time.time()
+        for track in tracks:
+            if track.id in self.state.downloaded:
+                logging.info(f"Skipping already downloaded track: {track.name} by {track.artist}")
+                continue
+            if track.id in seen:
+                continue
+            if not force and not self.state.is_due(track.id, now):
+                seen.add(track.id)
+                logging.info(f"Skipping {track.name} by {track.artist} until its retry is due")
+                continue
+            seen.add(track.id)
+            pending.append(track)
+        return pending
+
+    def sync(self, force: bool = False) -> int:
+        """Run one full sync of the configured playlist; force retries tracks still backing off.
+
+        Returns the number of tracks searched.
+        """
+        with metrics.timer('sync_seconds'):
+            return self._sync(force)
+
+    def _sync(self, force: bool) -> int:
+        logging.info("Sync started")
+        event_bus.publish('sync_started')
+        playlist = self.sp.get_tracks()
+        self._snapshot_id = getattr(self.sp, 'snapshot_id', None)
+        if self.library is not None:
+            self.library.refresh()
+            for track in playlist:
+                if track.id in self.state.downloaded:
+                    continue
+                path = self.library.find(track)
+                if path:
+                    logging.info(f"Already in library: {track.name} by {track.artist} at {path}")
+                    self.state.add(track.id)
+        if self.delete_after:
+            # Downloaded tracks still listed (e.g. a removal lost to a crash) go in the same batches
+            for track in playlist:
+                if track.id in self.state.downloaded:
+                    self.queue_removal(track.uri)
+        tracks = self.pending(playlist, force=force)
+        processed = 0
+        try:
+            if self.queue is not None:
+                processed = self._drain_queue(tracks)
+            else:
+                processed = self._run_pool(tracks)
+        finally:
+            metrics.set('sync_queue_depth', 0)
+            with tracer.span('state write', op='flush'):
+                self.state.flush()
+            self.flush_removals()
+            if tracer.enabled and TRACE_FILE:
+                tracer.export(TRACE_FILE)
+            event_bus.publish('sync_finished')
+        logging.info("Sync finished")
+        return processed
+
+    def _run_pool(self, tracks: List[Track]) -> int:
+        logging.info(f"{len(tracks)} tracks to process with {self.workers} workers")
+        metrics.set('sync_queue_depth', len(tracks))
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="sync") as pool:
+            futures = {pool.submit(self._run_pooled, track): track for track in tracks}
+            for future in as_completed(futures):
+                track = futures[future]
+                try:
+                    future.result()
+                except Exception:
+                    logging.exception(f"Exception processing {track.name} by {track.artist}")
+        return len(tracks)
+
+    def _run_pooled(self, track: Track) -> bool:
+        metrics.add('sync_queue_depth', -1)
+        return self._run_track(track)
+
+    def _drain_queue(self, tracks: List[Track]) -> int:
+        """Queue tracks and have every worker claim jobs until none are left.
+
+        Jobs left over from an interrupted run (pending, or leased by a dead
+        process) are claimed along with this sync's tracks, but only run if
+        their track is still in the playlist and due; the rest are marked
+        failed. New tracks go before retries of earlier failures.
+        """
+        self.queue.recover()
+        self.queue.purge(JOB_RETENTION)
+        self.queue.enqueue([t for t in tracks if not self.state.failure_attempts(t.id)], PRIORITY_NEW)
+        self.queue.enqueue([t for t in tracks if self.state.failure_attempts(t.id)], PRIORITY_RETRY)
+        depth = self.queue.pending()
+        logging.info(f"{depth} queued tracks to process with {self.workers} workers")
+        metrics.set('sync_queue_depth', depth)
+        due = {t.id for t in tracks}
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="sync") as pool:
+            futures = [pool.submit(self._work, due) for _ in range(self.workers)]
+            return sum(future.result() for future in futures)
+
+    def _work(self, due: Set[str]) -> int:
+        """Worker loop for _drain_queue(); runs claimed jobs whose track is in due, returns how many."""
+        count = 0
+        while True:
+            try:
+                track = self.queue.claim()
+            except Exception:
+                logging.exception("Could not claim from the work queue")
+                return count
+            if track is None:
+                return count
+            # Set rather than decremented: skipped jobs and reclaimed expired leases also leave the queue
+            metrics.set('sync_queue_depth', self.queue.pending())
+            if track.id in self.state.downloaded:
+                self.queue.complete(track.id)
+                continue
+            if track.id not in due:
+                logging.info(f"Dropping queued {track.name} by {track.artist}: no longer in the playlist or not due")
+                self.queue.fail(track.id)
+                continue
+            count += 1
+            ok = False
+            try:
+                ok = self._run_track(track)
+            except Exception:
+                logging.exception(f"Exception processing {track.name} by {track.artist}")
+            finally:
+                if ok:
+                    self.queue.complete(track.id)
+                else:
+                    self.queue.fail(track.id)
+
+    def _run_track(self, track: Track) -> bool:
+        """process_one() with in-flight and per-track timing metrics.
+
+        A track that could not be searched at all (e.g. during a Soulseek
+        login outage) records no failure, so it is due again next sync.
+        """
+        with metrics.in_flight('sync_in_flight'), metrics.timer('track_seconds', outcome='error') as labels:
+            try:
+                ok = self.process_one(track)
+                labels['outcome'] = 'downloaded' if ok else 'not_found'
+                return ok
+            except SearchUnavailable as e:
+                labels['outcome'] = 'unavailable'
+                logging.warning(f"Could not search for {track.name} by {track.artist}: {e}")
+                return False
+            finally:
+                metrics.inc('tracks_total', outcome=labels['outcome'])
+
+    def queue_removal(self, uri: str) -> None:
+        """Defer a playlist removal, flushing once a full batch has built up."""
+        with self._removals_lock:
+            if uri not in self._removals:
+                self._removals.append(uri)
+            full = len(self._removals) >= REMOVE_BATCH_SIZE
+        if full:
+            self.flush_removals()
+
+    def flush_removals(self) -> None:
+        """Write all queued removals to Spotify."""
+        with self._flush_lock:
+            with self._removals_lock:
+                uris, self._removals = self._removals, []
+            if uris:
+                with tracer.span('playlist removal', uris=len(uris), snapshot_id=self._snapshot_id):
+                    self._snapshot_id = self.sp.remove_tracks(uris, snapshot_id=self._snapshot_id)
+
+    def process_one(self, track: Track) -> bool:
+        """Process a single track: search via Soulseek, notify, and remove.
+
+        The run is traced under a fresh correlation ID, which the published
+        events carry as correlation_id.
+        """
+        with tracer.track('track', track_id=track.id, title=track.name, artist=track.artist) as correlation_id:
+            return self._process(track, correlation_id)
+
+    def _process(self, track: Track, correlation_id: str) -> bool:
+        query = f"{track.name} {track.artist}"
+        logging.info(f"Searching Soulseek for: '{query}' [{correlation_id}]")
+        started_at = time.time()
+        result = self.searcher.search_track(query, track)
+        if not result:
+            attempts = self.state.failure_attempts(track.id) + 1
+            delay = backoff_delay(attempts)
+            with tracer.span('state write', op='record_failure'):
+                self.state.record_failure(track.id, query, time.time() + delay)
+            logging.warning(f"No download for {query} (attempt {attempts}); retrying in {delay / 3600:.1f}h")
+            event_bus.publish('torrent_not_found', query, track_name=track.name, correlation_id=correlation_id,
+                              seconds=time.time() - started_at)
+            return False
+        with tracer.span('state write', op='record_download'):
+            self.state.record_download(track, result, started_at=started_at)
+        if self.library is not None:
+            self.library.add(result.path)
+        if self.delete_after:
+            self.queue_removal(track.uri)
+        logging.info(f"✔️ {track.name} by {track.artist}")
+        event_bus.publish('download_success', track, correlation_id=correlation_id, seconds=time.time() - started_at)
+        return True
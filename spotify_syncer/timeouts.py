@@ -0,0 +1,99 @@
+"""
+timeouts.py: Query and download timeouts learned from observed Soulseek latency.
+"""
+
+import json
+import logging
+import math
+import threading
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+# Fixed allowance for connecting to a peer before bytes flow (seconds)
+DOWNLOAD_OVERHEAD = 15.0
+
+
+def percentile(samples, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class AdaptiveTimeouts:
+    """Rolling latency windows per phase and format, stored in the State database.
+
+    Query timeouts are the p95 of recent listing times for the mode times a
+    margin. Download deadlines use the slow (p5) end of observed throughput
+    for the format when the candidate's size is known, else the p95 download
+    time. Timed-out attempts are recorded at the timeout they hit, so a run of
+    timeouts pushes the limit up rather than hiding below it. Until a window
+    holds min_samples, callers' defaults are used.
+    """
+    def __init__(self, state, window: int = 200, min_samples: int = 20, margin: float = 1.5,
+                 query_bounds: Tuple[float, float] = (5.0, 60.0),
+                 download_bounds: Tuple[float, float] = (20.0, 900.0)) -> None:
+        self.state = state
+        self.window = window
+        self.min_samples = min_samples
+        self.margin = margin
+        self.query_bounds = query_bounds
+        self.download_bounds = download_bounds
+        self._lock = threading.Lock()
+        # (phase, key) -> recent samples; phases are 'query' (seconds), 'download' (seconds), 'rate' (bytes/s)
+        self._samples: Dict[Tuple[str, str], Deque[float]] = {}
+        with state.lock:
+            rows = state.conn.execute("SELECT phase, key, samples FROM latencies").fetchall()
+        for phase, key, samples in rows:
+            self._samples[(phase, key)] = deque(json.loads(samples), maxlen=window)
+
+    def _window(self, phase: str, key: str) -> Optional[list]:
+        with self._lock:
+            samples = self._samples.get((phase, key))
+            return list(samples) if samples and len(samples) >= self.min_samples else None
+
+    def query(self, mode: Optional[str], default: float) -> float:
+        """Seconds to wait for a result listing in the given mode."""
+        samples = self._window('query', mode or '')
+        if samples is None:
+            return default
+        low, high = self.query_bounds
+        return round(min(high, max(low, percentile(samples, 0.95) * self.margin)), 1)
+
+    def download(self, fmt: str, size: int, default: float) -> float:
+        """Seconds to allow a download of the given format and size (0 if unknown)."""
+        low, high = self.download_bounds
+        rates = self._window('rate', fmt)
+        if size and rates is not None:
+            slow = max(1.0, percentile(rates, 0.05))
+            return round(min(high, max(low, DOWNLOAD_OVERHEAD + size / slow * self.margin)), 1)
+        samples = self._window('download', fmt)
+        if samples is None:
+            if size:
+                # Too little history, but a large file still needs longer than the default
+                return round(min(high, max(default, DOWNLOAD_OVERHEAD + size / (256 * 1024) * self.margin)), 1)
+            return default
+        return round(min(high, max(low, percentile(samples, 0.95) * self.margin)), 1)
+
+    def record_query(self, mode: Optional[str], seconds: float) -> None:
+        self._record([('query', mode or '', seconds)])
+
+    def record_download(self, fmt: str, seconds: float, size: int) -> None:
+        samples = [('download', fmt, seconds)]
+        if size and seconds > 0:
+            samples.append(('rate', fmt, size / seconds))
+        self._record(samples)
+
+    def _record(self, samples) -> None:
+        rows = []
+        with self._lock:
+            for phase, key, value in samples:
+                window = self._samples.setdefault((phase, key), deque(maxlen=self.window))
+                window.append(round(value, 3))
+                rows.append((phase, key, json.dumps(list(window))))
+        try:
+            with self.state.lock:
+                self.state.conn.executemany(
+                    "INSERT OR REPLACE INTO latencies(phase, key, samples) VALUES(?, ?, ?)", rows
+                )
+                self.state.conn.commit()
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Error saving latency samples: {e}")
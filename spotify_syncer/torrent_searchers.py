@@ -4,14 +4,29 @@ torrent_searchers.py: Defines the TorrentSearcher interface and implementations.
 
 import logging
 import re
-import requests
 from abc import ABC, abstractmethod
-from typing import Optional, Type, Dict
-from bs4 import BeautifulSoup
+from typing import Callable, Optional, Type, Dict, List, Tuple
 from urllib.parse import quote_plus
-import subprocess, os, shutil
-from spotify_syncer.config import DOWNLOAD_DIR
+import contextvars, subprocess, os, shutil, tempfile, threading, time
+from spotify_syncer.config import DOWNLOAD_DIR, SOULSEEK_HEDGE_SLOTS, SOULSEEK_HEDGE_VARIANTS
+from spotify_syncer.domain import Candidate, DownloadResult, Track
+from spotify_syncer.metrics import metrics
+from spotify_syncer.tracing import tracer
+from spotify_syncer.query_cache import QueryCache
+from spotify_syncer.ranking import CandidateRanker
+from spotify_syncer.timeouts import AdaptiveTimeouts
+from spotify_syncer.variant_stats import VariantStats
+from spotify_syncer.soulseek_cli import AUDIO_EXTENSIONS, DownloadSession, SoulseekAuth, filter_candidates, is_auth_error, is_no_results
  
+# Each download attempt gets its own directory under DOWNLOAD_DIR/<STAGING_DIRNAME>
+STAGING_DIRNAME = '.spotifytorrent-staging'
+AUDIO_SUFFIXES = tuple('.' + ext for ext in AUDIO_EXTENSIONS)
+_PROMOTE_LOCK = threading.Lock()
+
+
+class SearchUnavailable(Exception):
+    """The search could not run at all (as opposed to running and finding nothing)."""
+
 class AbstractTorrentSearcher(ABC):
     """Template method pattern: search flow for torrent providers."""
     def search(self, query: str) -> Optional[str]:
@@ -39,6 +54,8 @@ class AbstractTorrentSearcher(ABC):
 
     def fetch(self, url: str) -> Optional[str]:
         """Fetch the page content, returning text or None on error."""
+        # Only web-scraping providers need requests; it is slow to import
+        import requests
         try:
             r = requests.get(url, timeout=10)
             r.raise_for_status()
@@ -64,6 +81,7 @@ class AbstractTorrentSearcher(ABC):
 
     def parse_fallback(self, content: str) -> Optional[str]:
         """Fallback: return first magnet link found, if any."""
+        from bs4 import BeautifulSoup
         soup = BeautifulSoup(content, "html.parser")
         link = soup.select_one('a[href^="magnet:"]')
         if link and link.has_attr('href'):
@@ -83,6 +101,24 @@ class AbstractTorrentSearcher(ABC):
 
 class SoulseekSearcher(AbstractTorrentSearcher):
     """Search and download via Soulseek network using soulseek-cli with progressive fallback and fast query check."""
+    def __init__(self, auth: Optional[SoulseekAuth] = None, hedge_variants: Optional[int] = None,
+                 hedge_slots: Optional[int] = None, cache: Optional[QueryCache] = None,
+                 stats: Optional[VariantStats] = None, timeouts: Optional[AdaptiveTimeouts] = None) -> None:
+        self.auth = auth or SoulseekAuth()
+        # Known query outcomes; a cached miss skips spawning soulseek for that variant and mode
+        self.cache = cache
+        # Learned variant ordering; None keeps the built-in order
+        self.stats = stats
+        # Latency-derived timeouts; None keeps the fixed per-pass timeouts
+        self.timeouts = timeouts
+        self.hedge_variants = SOULSEEK_HEDGE_VARIANTS if hedge_variants is None else hedge_variants
+        # Bounds the extra sessions hedging adds across all concurrent searches
+        self.hedge_slots = threading.BoundedSemaphore(SOULSEEK_HEDGE_SLOTS if hedge_slots is None else max(1, hedge_slots))
+        # Called with the track when a download begins (e.g. to move its work-queue job on)
+        self.on_download: Optional[Callable[[Track], None]] = None
+        # Called with the track before each query or quality tier (e.g. to renew its work-queue lease)
+        self.on_attempt: Optional[Callable[[Track], None]] = None
+
     def build_url(self, query: str) -> str:
         return ''
 
@@ -102,7 +138,23 @@ class SoulseekSearcher(AbstractTorrentSearcher):
         logging.getLogger(__name__).error("=" * 60)
 
     def search(self, query: str) -> Optional[str]:
-        """Search and download from Soulseek with improved error handling and timeouts"""
+        """Search and download from Soulseek, returning a file:// URL"""
+        try:
+            result = self.search_track(query)
+        except SearchUnavailable:
+            return None
+        return result.url if result else None
+
+    def search_track(self, query: str, track: Optional[Track] = None) -> Optional[DownloadResult]:
+        """Search and download from Soulseek with improved error handling and timeouts
+
+        When the Spotify track is given, each listing is ranked against it and
+        results that are clearly another song are skipped; otherwise listing
+        order is kept. Returns None when the searches ran and nothing usable
+        downloaded; raises SearchUnavailable when nothing could be searched
+        (no CLI, login failing, download directory not writable, or no query
+        got an answer before timing out).
+        """
         soulseek_path = shutil.which("soulseek")
         if not soulseek_path:
             logging.getLogger(__name__).error(
@@ -114,28 +166,14 @@ class SoulseekSearcher(AbstractTorrentSearcher):
                                title="SpotifyTorrent Error")
             except ImportError:
                 pass
-            return None
+            raise SearchUnavailable("soulseek-cli not found")
         
         logging.getLogger(__name__).info(f"Using soulseek-cli at: {soulseek_path}")
         
-        # Test authentication with a quick query
-        try:
-            logging.getLogger(__name__).info("Testing Soulseek authentication...")
-            test_result = subprocess.run(
-                ["soulseek", "query", "test"], 
-                capture_output=True, 
-                text=True, 
-                timeout=10
-            )
-            output_text = (test_result.stdout + " " + test_result.stderr).lower()
-            if any(error in output_text for error in ['timeout login', 'econnreset', 'not logged in', 'authentication failed', 'error: read']):
-                self.notify_authentication_error()
-                return None
-            logging.getLogger(__name__).info("Soulseek authentication test passed.")
-        except subprocess.TimeoutExpired:
-            logging.getLogger(__name__).warning("Soulseek authentication test timed out, proceeding anyway...")
-        except Exception as e:
-            logging.getLogger(__name__).warning(f"Soulseek authentication test failed: {e}, proceeding anyway...")
+        # Auth/health is probed once per TTL and shared across searches
+        if not self.auth.ensure():
+            self.notify_authentication_error()
+            raise SearchUnavailable("Soulseek login failed")
         
         # Ensure download directory exists
         if not os.path.exists(DOWNLOAD_DIR):
@@ -144,31 +182,118 @@ class SoulseekSearcher(AbstractTorrentSearcher):
                 logging.getLogger(__name__).info(f"Created download directory: {DOWNLOAD_DIR}")
             except OSError as e:
                 logging.getLogger(__name__).error(f"Failed to create download directory: {e}")
-                return None
+                raise SearchUnavailable(f"cannot create {DOWNLOAD_DIR}") from e
+        try:
+            os.makedirs(self.staging_root(), exist_ok=True)
+        except OSError as e:
+            logging.getLogger(__name__).error(f"Failed to create staging directory: {e}")
+            raise SearchUnavailable(f"cannot create {self.staging_root()}") from e
         
         logging.getLogger(__name__).info(f"Starting Soulseek search for: '{query}'")
         
+        with tracer.span('variants', query=query) as span:
+            plan = self.variant_plan(query)
+            span['plan'] = plan
+        queries = [q for _, q in plan]
+        logging.getLogger(__name__).info(f"Generated {len(queries)} search variants: {plan}")
+        
+        run = _SearchRun(self, CandidateRanker.for_track(track) if track else None, track)
+        result = None
+        try:
+            # Race the top variants and try the first usable listing before the ordered passes
+            if self.hedge_variants > 1 and len(queries) > 1:
+                winner = run.hedge(queries[:self.hedge_variants], 'mp3', 256, timeout=20)
+                if winner:
+                    for quality in ['320', '256']:
+                        result = run.attempt(winner, 'mp3', quality, query_timeout=20, download_timeout=60)
+                        if result:
+                            return result
+            result = self._search_passes(query, queries, run.attempt)
+            if result is None and queries and not run.answered:
+                raise SearchUnavailable(f"no Soulseek query for '{query}' was answered")
+            return result
+        finally:
+            run.close()
+            # An outage says nothing about how good the variants are
+            if self.stats is not None and run.answered:
+                kinds = dict((q, kind) for kind, q in plan)
+                spent: Dict[str, float] = {}
+                for q, seconds in run.spent.items():
+                    spent[kinds[q]] = spent.get(kinds[q], 0.0) + seconds
+                self.stats.record(spent, kinds.get(result.query) if result else None)
+
+    def _search_passes(self, query: str, queries: List[str], attempt) -> Optional[DownloadResult]:
+        """Walk variants, modes and quality tiers in priority order until a download succeeds."""
+        modes = ['mp3', 'flac']
+        qualities = ['320', '256', '192', None]
+        
+        # Try a fast search strategy: start with highest quality and most likely queries
+        high_priority_queries = queries[:3]  # First 3 queries are usually best
+        low_priority_queries = queries[3:]
+        
+        # First pass: try high-priority queries with high quality
+        for q in high_priority_queries:
+            for mode in modes:  # Prioritize mp3 first
+                for quality in ['320', '256']:  # Only try high quality first
+                    logging.getLogger(__name__).info(
+                        f"Soulseek search (priority): '{q}' mode={mode} quality={quality}"
+                    )
+                    result = attempt(q, mode, quality, query_timeout=20, download_timeout=60)
+                    if result:
+                        return result
+        
+        # Second pass: try remaining combinations if nothing found
+        all_remaining = [(q, mode, quality) for q in low_priority_queries 
+                        for mode in modes for quality in qualities]
+        
+        # Add lower quality searches for high-priority queries
+        for q in high_priority_queries:
+            for mode in modes:
+                for quality in ['192', None]:
+                    all_remaining.append((q, mode, quality))
+        
+        for q, mode, quality in all_remaining:
+            logging.getLogger(__name__).info(
+                f"Soulseek search (extended): '{q}' mode={mode} quality={quality}"
+            )
+            result = attempt(q, mode, quality, query_timeout=25, download_timeout=90)
+            if result:
+                return result
+        
+        logging.getLogger(__name__).info(f"No results found for any variant of: {query}")
+        return None
+
+    def variants(self, query: str) -> List[str]:
+        """Generate search query variants in priority order (at most 8)."""
+        return [q for _, q in self.variant_plan(query)]
+
+    def variant_plan(self, query: str) -> List[Tuple[str, str]]:
+        """Generate (kind, query) search variants in priority order (at most 8).
+
+        The kind names the rule that produced the variant; with variant stats
+        the plan is reordered by how well each kind has done so far.
+        """
         sanitized = self.sanitize(query)
         raw = query.strip()
         
         # Generate search variants (improved logic)
-        variants = [raw, sanitized]
+        variants = [('raw', raw), ('sanitized', sanitized)]
         
         # Handle common patterns
         if '(' in raw:
-            variants.append(raw.split('(')[0].strip())
+            variants.append(('paren', raw.split('(')[0].strip()))
         if '-' in raw:
             parts = raw.split('-', 1)
             if len(parts) == 2:
-                variants.append(parts[0].strip())
-                variants.append(parts[1].strip())
+                variants.append(('dash_left', parts[0].strip()))
+                variants.append(('dash_right', parts[1].strip()))
         if ' by ' in raw.lower():
             artist_song = raw.lower().split(' by ')
             if len(artist_song) == 2:
-                variants.append(artist_song[1].strip())  # Just the song
-                variants.append(f"{artist_song[1].strip()} {artist_song[0].strip()}")  # Song Artist
+                variants.append(('by_song', artist_song[1].strip()))  # Just the song
+                variants.append(('by_song_artist', f"{artist_song[1].strip()} {artist_song[0].strip()}"))  # Song Artist
         if ':' in raw:
-            variants.append(raw.split(':', 1)[0].strip())
+            variants.append(('colon', raw.split(':', 1)[0].strip()))
         
         # Remove featuring/feat variations
         lower_raw = raw.lower()
@@ -176,232 +301,474 @@ class SoulseekSearcher(AbstractTorrentSearcher):
             if key in lower_raw:
                 idx = lower_raw.find(key)
                 if idx != -1:
-                    variants.append(raw[:idx].strip())
+                    variants.append(('feat', raw[:idx].strip()))
         
         # Remove quality indicators
         for qual in ['official video', 'official', 'video', 'lyrics', 'audio', 'hd', 'live', 'remastered']:
             if qual in lower_raw:
                 idx = lower_raw.find(qual)
                 if idx != -1:
-                    variants.append(raw[:idx].strip())
+                    variants.append(('qualifier', raw[:idx].strip()))
+        
+        # Add word-based variations for longer queries
+        words = sanitized.split()
+        if len(words) > 2:
+            # First few words
+            for i in range(2, min(len(words), 4)):
+                variants.append(('prefix', ' '.join(words[:i+1])))
+        
+        if self.stats is not None:
+            variants = self.stats.order(variants)
         
         # Generate final queries list
-        queries = []
+        plan = []
         seen = set()
         
         # Add variants in order of priority
-        for v in variants:
+        for kind, v in variants:
             sv = self.sanitize(v).strip()
             if sv and len(sv) > 2 and sv not in seen:  # Minimum length check
                 seen.add(sv)
-                queries.append(sv)
-        
-        # Add word-based variations for longer queries
-        words = sanitized.split()
-        if len(words) > 2:
-            # First few words
-            for i in range(2, min(len(words), 4)):
-                partial = ' '.join(words[:i+1])
-                if partial not in seen:
-                    queries.append(partial)
-                    seen.add(partial)
+                plan.append((kind, sv))
         
         # Limit total queries to prevent excessive searching
-        queries = queries[:8]  # Maximum 8 query variants
+        return plan[:8]  # Maximum 8 query variants
+
+    def open_session(self, q: str, mode: Optional[str], timeout: int = 30,
+                     session: Optional[DownloadSession] = None) -> Optional[DownloadSession]:
+        """Start `soulseek download` for a query and parse its result listing.
+
+        The returned session is left waiting at the result prompt so the
+        chosen candidate downloads without a second search. Returns None when
+        there are no results; quality is filtered locally by the caller.
+        """
+        session = session or self.new_session(q, mode)
+        started = time.monotonic()
+        labels = {'mode': mode or ''}
+        try:
+            logging.getLogger(__name__).debug(f"Running query: {' '.join(session.cmd)}")
+            with tracer.span('soulseek query', cat='cli', argv=list(session.cmd), timeout=timeout) as span, \
+                    metrics.in_flight('soulseek_queries_in_flight'):
+                try:
+                    session.start(timeout)
+                finally:
+                    span.update(exit_code=session.returncode, listed=session.waiting, cancelled=session.cancelled)
+        except subprocess.TimeoutExpired:
+            logging.getLogger(__name__).warning(f"Soulseek query timed out for '{q}' after {timeout}s")
+            outcome = 'cancelled' if session.cancelled else 'timeout'
+            metrics.observe('soulseek_query_seconds', time.monotonic() - started, outcome=outcome, **labels)
+            if self.timeouts and not session.cancelled:
+                self.timeouts.record_query(mode, timeout)
+            self.discard(session)
+            return None
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Soulseek query failed for '{q}': {e}")
+            metrics.observe('soulseek_query_seconds', time.monotonic() - started, outcome='error', **labels)
+            self.discard(session)
+            return None
+        elapsed = time.monotonic() - started
         
-        logging.getLogger(__name__).info(f"Generated {len(queries)} search variants: {queries}")
+        output = session.output
+        if output:
+            logging.getLogger(__name__).debug(f"Query output: {output.strip()}")
         
-        modes = ['mp3', 'flac']
-        qualities = ['320', '256', '192', None]
+        # Check for authentication/connection errors
+        output_text = output.lower()
+        if is_auth_error(output_text):
+            logging.getLogger(__name__).error(f"Soulseek authentication/connection error for '{q}'.")
+            metrics.observe('soulseek_query_seconds', elapsed, outcome='auth_error', **labels)
+            self.auth.invalidate()
+            self.discard(session)
+            return None
         
-        def has_results(q, mode, quality, timeout=30):
-            """Check if query has results with timeout"""
-            cmd = ["soulseek", "query", q]
-            if mode:
-                cmd += ["--mode", mode]
-            if quality:
-                cmd += ["--quality", quality]
-            
+        if self.timeouts and not session.cancelled:
+            self.timeouts.record_query(mode, elapsed)
+        if session.cancelled:
+            outcome = 'cancelled'
+        else:
+            outcome = 'results' if session.waiting else 'empty'
+        metrics.observe('soulseek_query_seconds', elapsed, outcome=outcome, **labels)
+        if not session.waiting:
+            # Only a clean "no results" is worth remembering; error exits may succeed next time
+            if session.returncode == 0 and is_no_results(output) and self.cache:
+                self.cache.put(q, mode, [])
+            self.discard(session)
+            return None
+        self.auth.mark_healthy()
+        if not session.choices:
+            # Results listed in a layout we can't parse; let the CLI pick its first result
+            logging.getLogger(__name__).debug(f"Could not parse query output for '{q}'")
+            session.choices = [(1, Candidate(user='', file=''))]
+        if self.cache:
+            self.cache.put(q, mode, session.candidates)
+        return session
+    
+    def try_download(self, session: DownloadSession, candidate: Candidate, timeout: int = 90) -> Optional[str]:
+        """Download a chosen candidate into the session's staging directory and move it into place"""
+        q = session.query
+        started = time.monotonic()
+        labels = {'format': candidate.extension or 'unknown', 'outcome': 'failed'}
+        metrics.add('soulseek_downloads_in_flight', 1)
+        try:
             try:
-                logging.getLogger(__name__).debug(f"Running query: {' '.join(cmd)}")
-                
-                # Use Popen for better control over the process
-                process = subprocess.Popen(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    stdin=subprocess.PIPE,
-                    text=True,
-                    bufsize=1,  # Line buffered
-                    universal_newlines=True
+                logging.getLogger(__name__).debug(
+                    f"Downloading '{candidate.file}' from '{candidate.user}' for '{q}'"
                 )
+                with tracer.span('soulseek download', cat='cli', argv=list(session.cmd), user=candidate.user,
+                                 file=candidate.file, timeout=timeout) as span:
+                    try:
+                        returncode = session.choose(candidate, timeout=timeout)
+                    finally:
+                        span['exit_code'] = session.returncode
+                output = session.output
                 
-                try:
-                    stdout, stderr = process.communicate(timeout=timeout)
-                    
-                    # Log the output for debugging
-                    if stdout:
-                        logging.getLogger(__name__).debug(f"Query stdout: {stdout.strip()}")
-                    if stderr:
-                        logging.getLogger(__name__).debug(f"Query stderr: {stderr.strip()}")
-                    
-                    # Check for authentication/connection errors
-                    output_text = (stdout + " " + stderr).lower()
-                    if any(error in output_text for error in ['timeout login', 'econnreset', 'not logged in', 'authentication failed', 'error: read']):
-                        logging.getLogger(__name__).error(f"Soulseek authentication/connection error for '{q}'.")
-                        return False
-                    
-                    # Check if the query was successful and found results
-                    success = process.returncode == 0
-                    has_content = stdout and len(stdout.strip()) > 0
-                    has_results_text = stdout and ("results" in stdout.lower() or "result:" in stdout.lower())
-                    no_results = "no results" in output_text or "0 results" in output_text
-                    
-                    return success and has_content and has_results_text and not no_results
-                    
-                except subprocess.TimeoutExpired:
-                    process.kill()
-                    process.wait()  # Clean up zombie process
-                    logging.getLogger(__name__).warning(f"Soulseek query timed out for '{q}' after {timeout}s")
-                    return False
-                    
-            except Exception as e:
-                logging.getLogger(__name__).error(f"Soulseek query failed for '{q}': {e}")
-                return False
-        
-        def try_download(q, mode, quality, timeout=90):
-            """Try to download with timeout and better error handling"""
-            def get_all_files_recursive(directory):
-                """Get all files recursively from a directory"""
-                all_files = set()
-                try:
-                    for root, dirs, files in os.walk(directory):
-                        for file in files:
-                            all_files.add(os.path.join(root, file))
-                except OSError:
-                    pass
-                return all_files
-            
-            try:
-                before = get_all_files_recursive(DOWNLOAD_DIR)
-            except OSError:
-                before = set()
-            
-            cmd = ["soulseek", "download", q, "--destination", DOWNLOAD_DIR]
-            if mode:
-                cmd += ["--mode", mode]
-            if quality:
-                cmd += ["--quality", quality]
-            
-            try:
-                logging.getLogger(__name__).debug(f"Running download: {' '.join(cmd)}")
-                
-                # Use Popen to handle interactive input
-                process = subprocess.Popen(
-                    cmd, 
-                    stdin=subprocess.PIPE,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True
-                )
+                # Log output for debugging
+                if output:
+                    logging.getLogger(__name__).debug(f"Download output: {output.strip()}")
                 
-                # Send "1" and Enter to automatically select the first result
-                try:
-                    stdout, stderr = process.communicate(input="1\n", timeout=timeout)
-                    
-                    # Log output for debugging
-                    if stdout:
-                        logging.getLogger(__name__).debug(f"Download stdout: {stdout.strip()}")
-                    if stderr:
-                        logging.getLogger(__name__).debug(f"Download stderr: {stderr.strip()}")
-                    
-                    if process.returncode != 0:
-                        logging.getLogger(__name__).warning(
-                            f"Soulseek download failed for '{q}' (exit code {process.returncode})"
-                        )
-                        # Check if it failed due to no search results
-                        if stdout and "No search results" in stdout:
-                            return None
-                        # Check if it failed due to user cancellation or timeout
-                        if stderr and ("cancelled" in stderr.lower() or "timeout" in stderr.lower()):
-                            return None
-                            
-                except subprocess.TimeoutExpired:
-                    process.kill()
-                    logging.getLogger(__name__).warning(f"Soulseek download timed out for '{q}' after {timeout}s")
+                if returncode is None:
+                    logging.getLogger(__name__).warning(
+                        f"Chosen candidate '{candidate.file}' is no longer listed for '{q}'"
+                    )
+                    labels['outcome'] = 'unlisted'
                     return None
+                if returncode != 0:
+                    logging.getLogger(__name__).warning(
+                        f"Soulseek download failed for '{q}' (exit code {returncode})"
+                    )
+                    # Check if it failed due to no search results
+                    if "No search results" in output:
+                        return None
+                    # Check if it failed due to user cancellation or timeout
+                    if "cancelled" in output.lower() or "timeout" in output.lower():
+                        return None
                     
+            except subprocess.TimeoutExpired:
+                logging.getLogger(__name__).warning(f"Soulseek download timed out for '{q}' after {timeout}s")
+                labels['outcome'] = 'timeout'
+                if self.timeouts and candidate.extension:
+                    self.timeouts.record_download(candidate.extension, timeout, candidate.size)
+                return None
             except Exception as e:
                 logging.getLogger(__name__).error(
-                    f"Soulseek download failed for '{q}' mode={mode} quality={quality}: {e}"
+                    f"Soulseek download failed for '{q}' file={candidate.file}: {e}"
                 )
+                labels['outcome'] = 'error'
                 return None
             
-            # Check for downloaded files (including in subdirectories)
+            # Only this attempt writes to its staging directory, so anything there is ours
             try:
-                after = get_all_files_recursive(DOWNLOAD_DIR)
-                new_files = after - before
-                if new_files:
-                    # Filter for audio files and sort by modification time
-                    audio_extensions = {'.mp3', '.flac', '.wav', '.ogg', '.m4a', '.aac'}
-                    audio_files = [f for f in new_files if any(f.lower().endswith(ext) for ext in audio_extensions)]
-                    
-                    if audio_files:
-                        # Sort by modification time to get the most recent file
-                        audio_files.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-                        filepath = audio_files[0]
-                        
-                        # Verify the file is not empty
-                        if os.path.getsize(filepath) > 0:
-                            logging.getLogger(__name__).info(f"Soulseek downloaded: {filepath} ({os.path.getsize(filepath)} bytes)")
-                            return f"file://{filepath}"
-                        else:
-                            logging.getLogger(__name__).warning(f"Downloaded file is empty: {filepath}")
-                            os.remove(filepath)  # Clean up empty file
-                            return None
-                    else:
-                        logging.getLogger(__name__).warning(f"New files found but none are audio files: {new_files}")
-                else:
-                    logging.getLogger(__name__).warning(f"No new files found after download attempt for '{q}'")
+                with tracer.span('file detection', staging=session.destination) as span:
+                    filepath = self.promote(session.destination, candidate)
+                    span['path'] = filepath
             except OSError as e:
-                logging.getLogger(__name__).error(f"Error scanning download directory: {e}")
+                logging.getLogger(__name__).error(f"Error moving download into {DOWNLOAD_DIR}: {e}")
+                return None
+            if filepath:
+                size = os.path.getsize(filepath)
+                logging.getLogger(__name__).info(f"Soulseek downloaded: {filepath} ({size} bytes)")
+                labels['outcome'] = 'ok'
+                metrics.inc('soulseek_download_bytes_total', size)
+                if self.timeouts:
+                    fmt = os.path.splitext(filepath)[1].lower().lstrip('.')
+                    self.timeouts.record_download(fmt, time.monotonic() - started, size)
+                return f"file://{filepath}"
             return None
-        # Try a fast search strategy: start with highest quality and most likely queries
-        high_priority_queries = queries[:3]  # First 3 queries are usually best
-        low_priority_queries = queries[3:]
-        
-        # First pass: try high-priority queries with high quality
-        for q in high_priority_queries:
-            for mode in ['mp3', 'flac']:  # Prioritize mp3 first
-                for quality in ['320', '256']:  # Only try high quality first
-                    logging.getLogger(__name__).info(
-                        f"Soulseek search (priority): '{q}' mode={mode} quality={quality}"
-                    )
-                    if has_results(q, mode, quality, timeout=20):  # 20 second timeout for query
-                        result = try_download(q, mode, quality, timeout=60)  # 60 second timeout for download
-                        if result:
-                            return result
-                    else:
-                        logging.getLogger(__name__).debug(f"No results found for '{q}' mode={mode} quality={quality}")
-        
-        # Second pass: try remaining combinations if nothing found
-        all_remaining = [(q, mode, quality) for q in low_priority_queries 
-                        for mode in modes for quality in qualities]
-        
-        # Add lower quality searches for high-priority queries
-        for q in high_priority_queries:
-            for mode in modes:
-                for quality in ['192', None]:
-                    all_remaining.append((q, mode, quality))
-        
-        for q, mode, quality in all_remaining:
-            logging.getLogger(__name__).info(
-                f"Soulseek search (extended): '{q}' mode={mode} quality={quality}"
-            )
-            if has_results(q, mode, quality, timeout=25):  # Slightly longer timeout for extended search
-                result = try_download(q, mode, quality, timeout=90)  # Longer download timeout
-                if result:
-                    return result
-        
-        logging.getLogger(__name__).info(f"No results found for any variant of: {query}")
-        return None
+        finally:
+            metrics.add('soulseek_downloads_in_flight', -1)
+            metrics.observe('soulseek_download_seconds', time.monotonic() - started, **labels)
+            self.discard(session)
+
+    def query_timeout(self, mode: Optional[str], default: float) -> float:
+        """Seconds to wait for a listing; learned when timeouts are tracked, else default."""
+        return self.timeouts.query(mode, default) if self.timeouts else default
+
+    def download_timeout(self, candidate: Candidate, default: float) -> float:
+        """Seconds to allow a download, scaled to the candidate's size when it is known."""
+        if not self.timeouts:
+            return default
+        return self.timeouts.download(candidate.extension, candidate.size, default)
+
+    def staging_root(self) -> str:
+        return os.path.join(DOWNLOAD_DIR, STAGING_DIRNAME)
+
+    def new_session(self, q: str, mode: Optional[str]) -> DownloadSession:
+        """Create a session that downloads into its own staging directory."""
+        os.makedirs(self.staging_root(), exist_ok=True)
+        staging = tempfile.mkdtemp(prefix='dl-', dir=self.staging_root())
+        return DownloadSession(q, staging, mode)
+
+    def discard(self, session: DownloadSession) -> None:
+        """Stop a session and remove its staging directory."""
+        session.cancel()
+        shutil.rmtree(session.destination, ignore_errors=True)
+
+    def promote(self, staging: str, candidate: Candidate) -> Optional[str]:
+        """Move the downloaded audio file from staging into DOWNLOAD_DIR, keeping its subfolder."""
+        audio_files = []
+        for root, dirs, files in os.walk(staging):
+            for file in files:
+                if file.lower().endswith(AUDIO_SUFFIXES):
+                    audio_files.append(os.path.join(root, file))
+        if not audio_files:
+            logging.getLogger(__name__).warning(f"No audio file found after download attempt for '{candidate.file or staging}'")
+            return None
+        # Folder downloads may bring a whole album; prefer the file we chose, then the newest
+        audio_files.sort(key=lambda f: (os.path.basename(f) == candidate.filename, os.path.getmtime(f)), reverse=True)
+        source = audio_files[0]
+        if os.path.getsize(source) == 0:
+            logging.getLogger(__name__).warning(f"Downloaded file is empty: {source}")
+            return None
+        relative = os.path.relpath(source, staging)
+        with _PROMOTE_LOCK:
+            target = _unique_path(os.path.join(DOWNLOAD_DIR, relative))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(source, target)
+        return target
+
+    def cleanup_staging(self, max_age: float = 24 * 3600) -> None:
+        """Remove staging directories left behind by a crash."""
+        root = self.staging_root()
+        try:
+            entries = os.listdir(root)
+        except OSError:
+            return
+        cutoff = time.time() - max_age
+        for entry in entries:
+            path = os.path.join(root, entry)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                pass
+
+
+def _unique_path(path: str) -> str:
+    """Return path, or 'name (n).ext' if something is already there."""
+    if not os.path.exists(path):
+        return path
+    base, ext = os.path.splitext(path)
+    n = 1
+    while os.path.exists(f"{base} ({n}){ext}"):
+        n += 1
+    return f"{base} ({n}){ext}"
+
+
+class _SearchRun:
+    """Per-track search state: parsed listings, attempted candidates and open sessions."""
+    def __init__(self, searcher: SoulseekSearcher, ranker: Optional[CandidateRanker] = None,
+                 track: Optional[Track] = None) -> None:
+        self.searcher = searcher
+        self.ranker = ranker
+        self.track = track
+        # Each (variant, mode) is searched once; quality tiers are applied to the parsed results
+        self.results: Dict[Tuple[str, str], List[Candidate]] = {}
+        self.attempted = set()
+        # At most one listing is kept open, so consecutive quality tiers reuse it
+        self.live: Dict[Tuple[str, str], DownloadSession] = {}
+        self.started = time.monotonic()
+        self.attempts = 0
+        # Keys whose results came from the cache rather than a live listing
+        self.cached = set()
+        # Seconds spent waiting on listings, per variant
+        self.spent: Dict[str, float] = {}
+        self._spent_lock = threading.Lock()
+        # Set once any query gets an answer (a listing or a clean "no results"), cached ones included
+        self.answered = False
+
+    def load_cached(self, key: Tuple[str, str]) -> bool:
+        """Fill results for key from the query cache; returns True on a hit."""
+        cache = self.searcher.cache
+        if key in self.results or cache is None:
+            return key in self.results
+        cached = cache.get(*key)
+        if cached is None:
+            return False
+        logging.getLogger(__name__).debug(f"Query cache hit for '{key[0]}' mode={key[1]}: {len(cached)} results")
+        self.results[key] = cached
+        self.cached.add(key)
+        self.answered = True
+        return True
+
+    def usable(self, candidates: List[Candidate], mode: str, min_bitrate: Optional[int]) -> List[Candidate]:
+        """Candidates meeting the mode and bitrate floor, best match first when ranking."""
+        kept = filter_candidates(candidates, mode, min_bitrate)
+        return self.ranker.rank(kept) if self.ranker else kept
+
+    def add_spent(self, q: str, seconds: float) -> None:
+        with self._spent_lock:
+            self.spent[q] = self.spent.get(q, 0.0) + seconds
+
+    def note_answer(self, session: DownloadSession) -> None:
+        """Record whether a finished query was answered rather than timed out, killed or refused."""
+        if session.waiting or (session.returncode is not None and session.returncode >= 0
+                               and not is_auth_error(session.output)):
+            self.answered = True
+
+    def session_for(self, key: Tuple[str, str], timeout: int) -> Optional[DownloadSession]:
+        for other in [k for k in self.live if k != key]:
+            self.searcher.discard(self.live.pop(other))
+        if key not in self.live:
+            started = time.monotonic()
+            session = self.searcher.new_session(*key)
+            opened = self.searcher.open_session(key[0], key[1], timeout=timeout, session=session)
+            self.add_spent(key[0], time.monotonic() - started)
+            self.note_answer(session)
+            if opened is None:
+                return None
+            self.live[key] = opened
+        return self.live[key]
+
+    def callback(self, hook: Optional[Callable[[Track], None]]) -> None:
+        if hook is not None and self.track is not None:
+            try:
+                hook(self.track)
+            except Exception as e:
+                logging.getLogger(__name__).error(f"Error in search callback: {e}")
+
+    def attempt(self, q: str, mode: str, quality: Optional[str], query_timeout: int,
+                download_timeout: int) -> Optional[DownloadResult]:
+        self.callback(self.searcher.on_attempt)
+        key = (q, mode)
+        min_bitrate = int(quality) if quality else None
+        query_timeout = self.searcher.query_timeout(mode, query_timeout)
+        if not self.load_cached(key):
+            session = self.session_for(key, query_timeout)
+            self.results[key] = session.candidates if session else []
+        matches = [c for c in self.usable(self.results[key], mode, min_bitrate)
+                   if (key, c) not in self.attempted]
+        if not matches:
+            logging.getLogger(__name__).debug(f"No results found for '{q}' mode={mode} quality={quality}")
+            return None
+        # Re-runs the search only if an earlier tier already consumed the listing
+        session = self.session_for(key, query_timeout)
+        if key in self.cached:
+            # The live listing supersedes the cached one
+            self.cached.discard(key)
+            self.results[key] = session.candidates if session else []
+            matches = [c for c in self.usable(self.results[key], mode, min_bitrate)
+                       if (key, c) not in self.attempted]
+            if not matches:
+                return None
+        if session is None:
+            return None
+        candidate = matches[0]
+        self.attempted.add((key, candidate))
+        self.live.pop(key)
+        self.attempts += 1
+        download_started = time.monotonic()
+        download_timeout = self.searcher.download_timeout(candidate, download_timeout)
+        self.callback(self.searcher.on_download)
+        url = self.searcher.try_download(session, candidate, timeout=download_timeout)
+        if not url:
+            return None
+        path = url[len('file://'):]
+        return DownloadResult(
+            path=path,
+            size=os.path.getsize(path),
+            query=q,
+            candidate=candidate if candidate.user else None,
+            attempts=self.attempts,
+            search_seconds=download_started - self.started,
+            download_seconds=time.monotonic() - download_started,
+        )
+
+    def hedge(self, queries: List[str], mode: str, min_bitrate: Optional[int], timeout: int) -> Optional[str]:
+        """Search several variants at once and keep the first listing with usable results.
+
+        The first variant always runs; each extra one needs a free hedge slot.
+        Losing sessions are killed; listings that completed before the winner
+        are kept so the ordered passes do not search them again.
+        """
+        self.callback(self.searcher.on_attempt)
+        finished: List[Tuple[str, DownloadSession, Optional[DownloadSession]]] = []
+        changed = threading.Condition()
+        timeout = self.searcher.query_timeout(mode, timeout)
+        slots = self.searcher.hedge_slots
+
+        def run(q: str, session: DownloadSession, hedged: bool) -> None:
+            started = time.monotonic()
+            try:
+                opened = self.searcher.open_session(q, mode, timeout=timeout, session=session)
+            finally:
+                if hedged:
+                    slots.release()
+                self.add_spent(q, time.monotonic() - started)
+            self.note_answer(session)
+            with changed:
+                finished.append((q, session, opened))
+                changed.notify_all()
+
+        launched: List[Tuple[str, DownloadSession, threading.Thread]] = []
+        started = 0
+        try:
+            for i, q in enumerate(queries):
+                if self.load_cached((q, mode)):
+                    if self.usable(self.results[(q, mode)], mode, min_bitrate) and not launched:
+                        # A cached listing with usable results wins without racing anything
+                        return q
+                    continue
+                hedged = bool(launched)
+                if hedged and not slots.acquire(blocking=False):
+                    break
+                try:
+                    session = self.searcher.new_session(q, mode)
+                except BaseException:
+                    if hedged:
+                        slots.release()
+                    raise
+                # Copy the context so spans on hedge threads keep the track's correlation ID
+                thread = threading.Thread(target=contextvars.copy_context().run, args=(run, q, session, hedged),
+                                          name="soulseek-hedge", daemon=True)
+                launched.append((q, session, thread))
+            if not launched:
+                return None
+            logging.getLogger(__name__).info(f"Racing {len(launched)} query variants: {[q for q, _, _ in launched]}")
+            for _, _, thread in launched:
+                thread.start()
+                started += 1
+        except BaseException:
+            # Sessions whose thread never ran still hold a hedge slot (all but the first) and a staging dir
+            for index, (_, session, thread) in enumerate(launched):
+                session.cancel()
+                if index < started:
+                    thread.join()
+                elif index > 0:
+                    slots.release()
+                self.searcher.discard(session)
+            raise
+
+        winner = None
+        with changed:
+            while winner is None and len(finished) < len(launched):
+                changed.wait()
+                for q, _, opened in finished:
+                    if opened and self.usable(opened.candidates, mode, min_bitrate):
+                        winner = q
+                        break
+        for q, session, thread in launched:
+            if q != winner:
+                session.cancel()
+        for q, session, thread in launched:
+            thread.join()
+            if q != winner:
+                self.searcher.discard(session)
+
+        for q, session, opened in finished:
+            if q == winner:
+                self.live[(q, mode)] = opened
+                self.results[(q, mode)] = opened.candidates
+            elif opened is not None and opened.waiting:
+                # Completed listing from a losing variant (its process is killed by now): keep its results
+                self.results[(q, mode)] = opened.candidates
+            elif opened is None and session.returncode is not None and session.returncode >= 0:
+                # Finished on its own with no usable listing
+                self.results[(q, mode)] = []
+        if winner:
+            logging.getLogger(__name__).info(f"Hedged search winner: '{winner}' mode={mode}")
+        return winner
+
+    def close(self) -> None:
+        for session in self.live.values():
+            self.searcher.discard(session)
+        self.live.clear()
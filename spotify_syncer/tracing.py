@@ -0,0 +1,105 @@
+"""Per-track tracing spans, exportable as Chrome/Perfetto trace JSON."""
+
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, Optional
+
+_correlation: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('correlation_id', default=None)
+
+
+def current_correlation_id() -> Optional[str]:
+    """Correlation ID of the track being processed on this thread/context, if any."""
+    return _correlation.get()
+
+
+class Tracer:
+    """Collects complete ("X") trace events while enabled.
+
+    Every span carries the correlation ID of the track it ran for, so a
+    track's variants, CLI runs and writes can be picked out of a trace even
+    when they ran on hedge threads. Only the newest max_events are kept.
+    Disabled tracers yield from span() without recording anything.
+    """
+    def __init__(self, enabled: bool = False, max_events: int = 100000) -> None:
+        self.enabled = enabled
+        self._events: Deque[dict] = deque(maxlen=max_events)
+        self._lock = threading.Lock()
+        self._threads: Dict[int, str] = {}
+
+    @contextmanager
+    def track(self, name: str, /, **args) -> Iterator[str]:
+        """Run the block under a new correlation ID inside a top-level span; yields the ID."""
+        correlation_id = uuid.uuid4().hex[:12]
+        token = _correlation.set(correlation_id)
+        try:
+            with self.span(name, cat='track', **args):
+                yield correlation_id
+        finally:
+            _correlation.reset(token)
+
+    @contextmanager
+    def span(self, name: str, /, cat: str = 'sync', **args) -> Iterator[Dict[str, object]]:
+        """Time the block as a span; the yielded dict adds args (e.g. an exit code) before it ends."""
+        if not self.enabled:
+            yield args
+            return
+        started_wall = time.time()
+        started = time.perf_counter()
+        try:
+            yield args
+        finally:
+            thread = threading.current_thread()
+            event = {
+                'name': name,
+                'cat': cat,
+                'ph': 'X',
+                'ts': int(started_wall * 1e6),
+                'dur': int((time.perf_counter() - started) * 1e6),
+                'pid': os.getpid(),
+                'tid': thread.ident,
+                'args': dict(args, correlation_id=_correlation.get()),
+            }
+            with self._lock:
+                self._events.append(event)
+                self._threads[thread.ident] = thread.name
+
+    def events(self, correlation_id: Optional[str] = None) -> list:
+        """Recorded events, optionally only those of one track."""
+        with self._lock:
+            events = list(self._events)
+        if correlation_id is not None:
+            events = [e for e in events if e['args'].get('correlation_id') == correlation_id]
+        return events
+
+    def export(self, path: str) -> None:
+        """Write every buffered event to path in Chrome trace format (chrome://tracing, Perfetto)."""
+        with self._lock:
+            events = list(self._events)
+            threads = dict(self._threads)
+        metadata = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid, 'args': {'name': name}}
+            for tid, name in threads.items()
+        ]
+        tmp = f"{path}.tmp"
+        try:
+            with open(tmp, 'w') as f:
+                json.dump({'traceEvents': metadata + events, 'displayTimeUnit': 'ms'}, f)
+            os.replace(tmp, path)
+        except OSError as e:
+            logging.getLogger(__name__).warning(f"Could not write trace to {path}: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._events.clear()
+            self._threads.clear()
+
+
+# Global tracer; the container enables it when TRACE_FILE is set
+tracer = Tracer()
@@ -0,0 +1,84 @@
+"""
+variant_stats.py: Learned ordering of Soulseek query variants.
+"""
+
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# Assumed seconds per search for kinds with little history
+_PRIOR_SECONDS = 10.0
+
+
+class VariantStats:
+    """Per-variant-kind search history, stored in the State database.
+
+    For every track searched, each variant kind that spawned a search gets a
+    try and its search time; the kind whose query led to the download gets a
+    win. Once min_samples tries have been recorded across all kinds, plans
+    are ordered by estimated hit rate per second of searching, and kinds that
+    have never won after prune_after tries are dropped.
+    """
+    def __init__(self, state, min_samples: int = 200, prune_after: int = 100) -> None:
+        self.state = state
+        self.min_samples = min_samples
+        self.prune_after = prune_after
+        self._lock = threading.Lock()
+        # kind -> [tries, wins, seconds]
+        self._stats: Dict[str, List[float]] = {}
+        with state.lock:
+            rows = state.conn.execute("SELECT kind, tries, wins, seconds FROM variant_stats").fetchall()
+        for kind, tries, wins, seconds in rows:
+            self._stats[kind] = [tries, wins, seconds]
+
+    def rate(self, kind: str) -> float:
+        """Estimated hits per second of searching for a kind (smoothed toward the prior)."""
+        tries, wins, seconds = self._stats.get(kind, (0, 0, 0.0))
+        return ((wins + 1) / (tries + 2)) / ((seconds + _PRIOR_SECONDS) / (tries + 1))
+
+    def pruned(self, kind: str) -> bool:
+        tries, wins, _ = self._stats.get(kind, (0, 0, 0.0))
+        return tries >= self.prune_after and wins == 0
+
+    def order(self, plan: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """Reorder (kind, query) pairs best kind first, keeping the default order until trained."""
+        with self._lock:
+            if sum(stats[0] for stats in self._stats.values()) < self.min_samples:
+                return list(plan)
+            kept = [item for item in plan if not self.pruned(item[0])]
+            if not kept:
+                return list(plan)
+            rates = {kind: self.rate(kind) for kind, _ in kept}
+        # sorted() is stable, so variants of one kind stay in their generated order
+        return sorted(kept, key=lambda item: -rates[item[0]])
+
+    def record(self, seconds: Dict[str, float], winner: Optional[str]) -> None:
+        """Record one track: search seconds spent per kind tried, and the winning kind if any."""
+        if not seconds and winner is None:
+            return
+        with self._lock:
+            rows = []
+            for kind in set(seconds) | ({winner} if winner else set()):
+                stats = self._stats.setdefault(kind, [0, 0, 0.0])
+                if kind in seconds:
+                    stats[0] += 1
+                    stats[2] += seconds[kind]
+                if kind == winner:
+                    stats[1] += 1
+                rows.append((kind, stats[0], stats[1], stats[2]))
+        try:
+            with self.state.lock:
+                self.state.conn.executemany(
+                    "INSERT OR REPLACE INTO variant_stats(kind, tries, wins, seconds) VALUES(?, ?, ?, ?)", rows
+                )
+                self.state.conn.commit()
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Error saving variant stats: {e}")
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Current statistics per kind, for logging and status output."""
+        with self._lock:
+            return {
+                kind: {'tries': tries, 'wins': wins, 'seconds': seconds, 'rate': self.rate(kind)}
+                for kind, (tries, wins, seconds) in self._stats.items()
+            }
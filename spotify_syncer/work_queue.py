@@ -0,0 +1,189 @@
+"""
+work_queue.py: Crash-safe per-track work queue stored in the State database.
+"""
+
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Dict, Iterable, Optional
+
+from spotify_syncer.domain import Track
+
+PENDING = 'pending'
+SEARCHING = 'searching'
+DOWNLOADING = 'downloading'
+DONE = 'done'
+FAILED = 'failed'
+ACTIVE = (SEARCHING, DOWNLOADING)
+
+# Priorities: higher is claimed first
+PRIORITY_NEW = 1
+PRIORITY_RETRY = 0
+
+_TRACK_COLUMNS = "track_id, uri, name, artist, duration_ms"
+
+
+def _owner_gone(owner: str, own: str) -> bool:
+    """True if a lease owner ("host:pid:token") is a dead process (or an earlier run of this one) on this host."""
+    host, _, rest = (owner or '').partition(':')
+    pid, _, token = rest.partition(':')
+    own_host, _, own_rest = own.partition(':')
+    if host != own_host or not pid.isdigit():
+        return False
+    if int(pid) == os.getpid():
+        # os.execv (the updater) keeps the PID; a different token is an earlier run
+        return owner != own
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        return False
+    return False
+
+
+class WorkQueue:
+    """Per-track jobs that move pending -> searching -> downloading -> done/failed.
+
+    Workers claim the highest-priority pending job (earliest in the playlist
+    within a priority) by leasing it; a job whose lease expires, or whose
+    owner process on this host has died, is claimable again, so work
+    interrupted by a quit, crash or update restart resumes on the next sync
+    instead of being rediscovered from the playlist. Claims are conditional
+    UPDATEs, so two processes sharing the database never take the same job.
+    """
+    def __init__(self, state, lease_seconds: float = 1800) -> None:
+        self.state = state
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def enqueue(self, tracks: Iterable[Track], priority: int = PRIORITY_NEW) -> None:
+        """Add tracks as pending jobs; jobs already pending or in progress keep their place."""
+        now = time.time()
+        rows = [
+            (t.id, t.uri, t.name, t.artist, t.duration_ms, PENDING, priority, position, now, now)
+            for position, t in enumerate(tracks)
+        ]
+        if not rows:
+            return
+        try:
+            with self.state.lock:
+                self.state.conn.executemany(
+                    f"INSERT INTO jobs({_TRACK_COLUMNS}, status, priority, position, attempts, enqueued_at, updated_at) "
+                    "VALUES(?, ?, ?, ?, ?, ?, ?, ?, 0, ?, ?) "
+                    "ON CONFLICT(track_id) DO UPDATE SET status = excluded.status, priority = excluded.priority, "
+                    "position = excluded.position, lease_owner = NULL, lease_expires_at = NULL, "
+                    "enqueued_at = excluded.enqueued_at, updated_at = excluded.updated_at "
+                    f"WHERE jobs.status IN ('{DONE}', '{FAILED}')",
+                    rows,
+                )
+                self.state.conn.commit()
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Error queueing tracks: {e}")
+
+    def claim(self) -> Optional[Track]:
+        """Lease the next job for this process and mark it searching; None when nothing is claimable."""
+        while True:
+            now = time.time()
+            with self.state.lock:
+                row = self.state.conn.execute(
+                    f"SELECT {_TRACK_COLUMNS}, status, lease_owner FROM jobs "
+                    f"WHERE status = ? OR (status IN (?, ?) AND lease_expires_at < ?) "
+                    "ORDER BY priority DESC, position LIMIT 1",
+                    (PENDING, SEARCHING, DOWNLOADING, now),
+                ).fetchone()
+                if row is None:
+                    return None
+                # Only succeeds if nobody claimed it since the SELECT (another process included)
+                cursor = self.state.conn.execute(
+                    "UPDATE jobs SET status = ?, lease_owner = ?, lease_expires_at = ?, attempts = attempts + 1, "
+                    "updated_at = ? WHERE track_id = ? AND status = ? AND lease_owner IS ?",
+                    (SEARCHING, self.owner, now + self.lease_seconds, now, row[0], row[5], row[6]),
+                )
+                self.state.conn.commit()
+            if cursor.rowcount == 1:
+                return Track(*row[:5])
+
+    def mark_downloading(self, track: Track) -> None:
+        """Record that a claimed job's download began, renewing its lease."""
+        now = time.time()
+        self._update(
+            "UPDATE jobs SET status = ?, lease_expires_at = ?, updated_at = ? "
+            "WHERE track_id = ? AND lease_owner = ? AND status IN (?, ?)",
+            (DOWNLOADING, now + self.lease_seconds, now, track.id, self.owner, SEARCHING, DOWNLOADING),
+        )
+
+    def renew(self, track: Track) -> None:
+        """Extend a claimed job's lease as its search makes progress.
+
+        Only written once less than half the lease is left, so calling this
+        before every query costs at most one write per half lease.
+        """
+        now = time.time()
+        self._update(
+            "UPDATE jobs SET lease_expires_at = ?, updated_at = ? "
+            "WHERE track_id = ? AND lease_owner = ? AND status IN (?, ?) AND lease_expires_at < ?",
+            (now + self.lease_seconds, now, track.id, self.owner, SEARCHING, DOWNLOADING,
+             now + self.lease_seconds / 2),
+        )
+
+    def complete(self, track_id: str) -> None:
+        self._finish(track_id, DONE)
+
+    def fail(self, track_id: str) -> None:
+        self._finish(track_id, FAILED)
+
+    def _finish(self, track_id: str, status: str) -> None:
+        self._update(
+            "UPDATE jobs SET status = ?, lease_owner = NULL, lease_expires_at = NULL, updated_at = ? "
+            "WHERE track_id = ?",
+            (status, time.time(), track_id),
+        )
+
+    def recover(self) -> int:
+        """Return in-progress jobs of dead owners on this host to pending at once; returns how many."""
+        with self.state.lock:
+            rows = self.state.conn.execute(
+                "SELECT track_id, lease_owner FROM jobs WHERE status IN (?, ?)", ACTIVE
+            ).fetchall()
+        stale = [track_id for track_id, owner in rows if _owner_gone(owner, self.owner)]
+        if stale:
+            self._update(
+                "UPDATE jobs SET status = ?, lease_owner = NULL, lease_expires_at = NULL, updated_at = ? "
+                "WHERE track_id = ?",
+                [(PENDING, time.time(), track_id) for track_id in stale],
+                many=True,
+            )
+            logging.getLogger(__name__).info(f"Resuming {len(stale)} interrupted tracks")
+        return len(stale)
+
+    def pending(self) -> int:
+        """Number of jobs waiting to be claimed."""
+        with self.state.lock:
+            return self.state.conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (PENDING,)).fetchone()[0]
+
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs per status."""
+        with self.state.lock:
+            rows = self.state.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+    def purge(self, older_than: float) -> None:
+        """Delete finished jobs last updated more than older_than seconds ago."""
+        self._update(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+            (DONE, FAILED, time.time() - older_than),
+        )
+
+    def _update(self, sql: str, params, many: bool = False) -> None:
+        try:
+            with self.state.lock:
+                if many:
+                    self.state.conn.executemany(sql, params)
+                else:
+                    self.state.conn.execute(sql, params)
+                self.state.conn.commit()
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Error updating work queue: {e}")
@@ -0,0 +1,24 @@
+from benchmarks.fake_spotify import FakeSpotipy
+from benchmarks.sync_benchmark import run_benchmark
+from spotify_syncer.spotify_client import SpotifyClient
+
+
+def test_fake_spotify_pages_playlist():
+    fake = FakeSpotipy(250)
+    tracks = SpotifyClient(sp=fake).get_tracks()
+    assert len(tracks) == 250
+    assert len({t.id for t in tracks}) == 250
+    assert fake.calls['next'] == 2
+    assert all(t.duration_ms for t in tracks)
+
+
+def test_benchmark_runs_real_sync(tmp_path):
+    result = run_benchmark(tracks=10, workers=2, latency=0.01, download_latency=0.01,
+                           hit_rate=1.0, hedge_variants=1, workdir=str(tmp_path))
+    assert result['processed'] == 10
+    assert result['downloaded'] == 10
+    # One probe, then one session per track: without hedging the raw query lists first time
+    assert result['cli_spawns_by_command'] == {'query': 1, 'download': 10}
+    assert result['tracks_per_minute'] > 0
+    assert result['latency_p95'] >= result['latency_p50'] > 0
+    assert result['spotify_calls']['remove'] == 1
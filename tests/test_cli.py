@@ -0,0 +1,133 @@
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from spotify_syncer import __main__ as cli
+from spotify_syncer.domain import DownloadResult, Track
+from spotify_syncer.state import MIGRATIONS, State
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GUI_MODULES = ('rumps', 'pystray', 'PIL', 'tkinter', 'spotify_env_gui', 'pync')
+
+
+@pytest.fixture(autouse=True)
+def isolated_logging(tmp_path, monkeypatch):
+    """Keep main()'s log file out of the real home directory and drop the handlers it adds."""
+    monkeypatch.setattr('spotify_syncer.config.LOG_FILE', str(tmp_path / 'spotifytorrent.log'))
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    yield
+    for handler in root.handlers[:]:
+        if handler not in handlers:
+            root.removeHandler(handler)
+            handler.close()
+    root.setLevel(level)
+
+
+def test_entry_point_imports_no_gui_code(tmp_path):
+    code = (
+        "import sys, spotify_syncer.__main__, spotify_syncer.container\n"
+        f"print([m for m in {GUI_MODULES!r} if m in sys.modules])"
+    )
+    out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True,
+                         env=dict(os.environ, HOME=str(tmp_path)), timeout=60)
+    assert out.returncode == 0, out.stderr
+    assert out.stdout.strip() == '[]'
+
+
+def test_status_reports_state(tmp_path, monkeypatch):
+    monkeypatch.setattr('spotify_syncer.config.PLAYLIST_ID', 'pl')
+    db = str(tmp_path / 'state.db')
+    state = State(db)
+    tracks = [Track(id=str(i), uri=f"u{i}", name=f"Song {i}", artist='A') for i in range(4)]
+    state.save_playlist('pl', 'snap1', tracks)
+    state.record_download(tracks[0], DownloadResult(path='/m/0.mp3', size=1, query='q'), started_at=time.time())
+    state.record_failure('1', 'q', time.time() + 3600)
+    state.record_failure('2', 'q', time.time() - 1)
+    state.flush()
+
+    info = cli.status(db)
+    assert info['downloaded'] == 1
+    assert info['snapshot_id'] == 'snap1'
+    assert info['playlist_tracks'] == 4
+    assert info['pending'] == 2
+    assert info['backing_off'] == 1
+    assert [r['name'] for r in info['recent_downloads']] == ['Song 0']
+
+
+def test_status_command_prints_json(tmp_path, capsys):
+    assert cli.main(['status', '--json', '--db', str(tmp_path / 'state.db')]) == 0
+    assert json.loads(capsys.readouterr().out)['downloaded'] == 0
+
+
+def test_status_never_creates_or_migrates(tmp_path):
+    import sqlite3
+    missing = tmp_path / 'missing.db'
+    info = cli.status(str(missing))
+    assert info['downloaded'] == 0 and info['snapshot_id'] is None
+    assert not missing.exists()
+    # A database from an older release is read as it is; the next sync migrates it
+    old = tmp_path / 'old.db'
+    conn = sqlite3.connect(str(old))
+    for migration in MIGRATIONS[:8]:
+        for statement in migration:
+            conn.execute(statement)
+    conn.execute("INSERT INTO downloaded VALUES('a')")
+    conn.execute("PRAGMA user_version = 8")
+    conn.commit()
+    conn.close()
+    info = cli.status(str(old))
+    assert info['downloaded'] == 1 and info['queue'] == {}
+    conn = sqlite3.connect(str(old))
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 8
+    conn.close()
+
+
+class FakeSyncer:
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+    def sync(self, force=False):
+        self.calls.append(force)
+        if self.fail:
+            raise RuntimeError('boom')
+
+
+class FakeContainer:
+    def __init__(self, tmp_path, syncer):
+        self.state = State(str(tmp_path / 'state.db'))
+        self.syncer = syncer
+
+
+def test_sync_once(tmp_path, monkeypatch):
+    syncer = FakeSyncer()
+    monkeypatch.setattr(cli, '_container', lambda: FakeContainer(tmp_path, syncer))
+    assert cli.main(['sync', '--once', '--force']) == 0
+    assert syncer.calls == [True]
+    assert (tmp_path / 'spotifytorrent.log').exists()
+
+
+def test_sync_once_reports_failure(tmp_path, monkeypatch):
+    monkeypatch.setattr(cli, '_container', lambda: FakeContainer(tmp_path, FakeSyncer(fail=True)))
+    assert cli.run_once() == 1
+
+
+def test_daemon_repeats_until_stopped(tmp_path, monkeypatch):
+    syncer = FakeSyncer(fail=True)
+    monkeypatch.setattr(cli, '_container', lambda: FakeContainer(tmp_path, syncer))
+    stop = threading.Event()
+    worker = threading.Thread(target=cli.run_daemon, args=(0.01, True, stop))
+    worker.start()
+    time.sleep(0.1)
+    stop.set()
+    worker.join(2)
+    assert not worker.is_alive()
+    # Failed syncs are logged and retried; only the first pass is forced
+    assert len(syncer.calls) >= 2
+    assert syncer.calls[0] is True and not any(syncer.calls[1:])
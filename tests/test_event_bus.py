@@ -1,5 +1,9 @@
+import threading
+import time
+
 import pytest
 from spotify_syncer.events import EventBus
+from spotify_syncer.metrics import metrics
 
 class Dummy:
     def __init__(self):
@@ -37,3 +41,98 @@ def test_multiple_listeners(bus):
     assert d1.called and d2.called
     assert d1.args[0] == ('a',)
     assert d2.args[0] == ('a',)
+
+
+
+@pytest.fixture
+def async_bus():
+    bus = EventBus()
+    bus.start(capacity=3)
+    yield bus
+    bus.stop()
+
+
+def test_async_publish_does_not_wait_for_listener(async_bus):
+    release = threading.Event()
+    seen = []
+    async_bus.subscribe('evt', lambda x: (release.wait(2), seen.append(x)))
+    started = time.monotonic()
+    async_bus.publish('evt', 1)
+    assert time.monotonic() - started < 0.5
+    assert seen == []
+    release.set()
+    assert async_bus.flush(timeout=2)
+    assert seen == [1]
+
+
+def test_async_coalesces_and_drops_oldest(async_bus):
+    metrics.reset()
+    release = threading.Event()
+    seen = []
+    async_bus.subscribe('block', lambda: release.wait(2))
+    async_bus.subscribe('evt', seen.append)
+    async_bus.publish('block')
+    time.sleep(0.05)  # dispatcher is now stuck in the 'block' listener
+    for value in (1, 1, 2, 3, 4):
+        async_bus.publish('evt', value)
+    release.set()
+    assert async_bus.flush(timeout=2)
+    # The duplicate 1 coalesced; with room for 3 pending, 1 was dropped for 4
+    assert seen == [2, 3, 4]
+    dropped = {tuple(sorted(s['labels'].items())): s['value']
+               for s in metrics.snapshot()['counters']['events_dropped_total']}
+    assert dropped == {(('event', 'evt'), ('reason', 'coalesced')): 1,
+                       (('event', 'evt'), ('reason', 'overflow')): 1}
+
+
+def test_stop_delivers_pending_and_returns_to_sync():
+    bus = EventBus()
+    bus.start()
+    seen = []
+    bus.subscribe('evt', lambda x: (time.sleep(0.01), seen.append(x)))
+    for i in range(5):
+        bus.publish('evt', i)
+    bus.stop()
+    assert seen == [0, 1, 2, 3, 4]
+    assert not bus.asynchronous
+    bus.publish('evt', 5)
+    assert seen[-1] == 5
+
+
+def test_async_listener_errors_are_isolated(async_bus):
+    d = Dummy()
+    async_bus.subscribe('evt', lambda: 1 / 0)
+    async_bus.subscribe('evt', d.listener)
+    async_bus.publish('evt')
+    assert async_bus.flush(timeout=2)
+    assert d.called
+
+
+def test_lifecycle_events_survive_a_flood(async_bus):
+    from spotify_syncer.notifications import NotificationDigest
+    from test_notifications import Recorder, track
+    shown = Recorder()
+    digest = NotificationDigest(window=0, notify=shown)
+    lifecycle = []
+    release = threading.Event()
+    async_bus.subscribe('block', lambda: release.wait(2))
+    for event in ('sync_started', 'sync_finished'):
+        async_bus.subscribe(event, lambda event=event: lifecycle.append(event))
+    async_bus.subscribe('sync_started', digest.on_sync_started)
+    async_bus.subscribe('download_success', digest.on_download_success)
+    async_bus.subscribe('sync_finished', digest.on_sync_finished)
+    async_bus.publish('block')
+    time.sleep(0.05)  # dispatcher is now stuck in the 'block' listener
+    # Two back-to-back syncs flood a queue with room for 3 events
+    for sync in range(2):
+        async_bus.publish('sync_started')
+        for i in range(10):
+            async_bus.publish('download_success', track(sync * 10 + i))
+        async_bus.publish('sync_finished')
+    release.set()
+    assert async_bus.flush(timeout=2)
+    # Per-track events were dropped, but neither sync's start or end was lost or coalesced
+    assert lifecycle == ['sync_started', 'sync_finished'] * 2
+    # So the surviving downloads (all from the second sync) make up their own digest
+    assert len(shown.messages) == 1
+    assert 'Song 19 by Artist' in shown.messages[0] and 'Song 9 ' not in shown.messages[0]
@@ -0,0 +1,92 @@
+import os
+
+from spotify_syncer.domain import Track
+from spotify_syncer.library import LibraryIndex, normalize, title_keys
+from spotify_syncer.state import State
+from spotify_syncer.torrent_searchers import STAGING_DIRNAME
+
+
+def touch(path, mtime=None):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text('audio')
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return path
+
+
+def track(name, artist):
+    return Track(id=name, uri=f"uri:{name}", name=name, artist=artist)
+
+
+def test_normalize_and_title_keys():
+    assert normalize('Beyoncé & JAY-Z (Remix) feat. Someone') == 'beyonce and jay z'
+    assert 'hey jude' in title_keys('01 - The Beatles - Hey Jude')
+    assert 'hey jude' in title_keys('07. Hey Jude')
+    assert '99 problems' in title_keys('99 Problems')
+
+
+def test_find_by_title_and_artist(tmp_path):
+    touch(tmp_path / 'The Beatles' / 'Past Masters' / '07 - Hey Jude.flac')
+    touch(tmp_path / 'Adele - Hello.mp3')
+    touch(tmp_path / 'notes.txt')
+    touch(tmp_path / STAGING_DIRNAME / 'dl-x' / 'Adele - Someone Like You.mp3')
+    library = LibraryIndex(State(str(tmp_path / 'state.db')), str(tmp_path))
+    assert library.refresh() == 2
+    assert library.find(track('Hey Jude - Remastered 2015', 'The Beatles')).endswith('07 - Hey Jude.flac')
+    assert library.find(track('Hello', 'Adele'))
+    # Same title by another artist, and files still in staging, do not count
+    assert library.find(track('Hello', 'Lionel Richie')) is None
+    assert library.find(track('Someone Like You', 'Adele')) is None
+
+
+def test_refresh_is_incremental_and_persistent(tmp_path):
+    music = tmp_path / 'music'
+    song = touch(music / 'Adele - Hello.mp3', mtime=1000)
+    db = str(tmp_path / 'state.db')
+    assert LibraryIndex(State(db), str(music)).refresh() == 1
+    library = LibraryIndex(State(db), str(music))
+    assert library.find(track('Hello', 'Adele'))
+    assert library.refresh() == 0
+    touch(music / 'Adele - Skyfall.mp3')
+    song.unlink()
+    assert library.refresh() == 2
+    assert library.find(track('Hello', 'Adele')) is None
+    assert library.find(track('Skyfall', 'Adele'))
+
+
+def test_refresh_only_lists_changed_directories(tmp_path, monkeypatch):
+    music = tmp_path / 'music'
+    touch(music / 'Adele' / '25' / 'Hello.mp3')
+    touch(music / 'Muse' / 'Uprising.mp3')
+    for directory in (music, music / 'Adele', music / 'Adele' / '25', music / 'Muse'):
+        os.utime(directory, (1000, 1000))
+    db = str(tmp_path / 'state.db')
+    assert LibraryIndex(State(db), str(music)).refresh() == 2
+    library = LibraryIndex(State(db), str(music))
+    listed = []
+    real_list = LibraryIndex._list
+    monkeypatch.setattr(LibraryIndex, '_list', lambda self, d: listed.append(d) or real_list(self, d))
+    assert library.refresh() == 0
+    assert listed == []
+    # A new file deep in the tree only re-lists its own directory
+    touch(music / 'Adele' / '25' / 'Skyfall.mp3')
+    assert library.refresh() == 1
+    assert listed == [str(music / 'Adele' / '25')]
+    assert library.find(track('Skyfall', 'Adele'))
+    # Removing a folder drops the files below it
+    (music / 'Adele' / '25' / 'Hello.mp3').unlink()
+    (music / 'Adele' / '25' / 'Skyfall.mp3').unlink()
+    (music / 'Adele' / '25').rmdir()
+    assert library.refresh() == 2
+    assert library.find(track('Hello', 'Adele')) is None
+    assert library.find(track('Uprising', 'Muse'))
+
+
+def test_short_artist_names_never_match(tmp_path):
+    touch(tmp_path / 'Disc X' / 'Hello.mp3')
+    touch(tmp_path / 'Sia - Chandelier.mp3')
+    library = LibraryIndex(State(str(tmp_path / 'state.db')), str(tmp_path))
+    library.refresh()
+    # 'X' is a word in the folder name, not the artist; too short to trust
+    assert library.find(track('Hello', 'X')) is None
+    assert library.find(track('Chandelier', 'Sia'))
@@ -0,0 +1,55 @@
+import json
+import time
+import urllib.request
+
+from spotify_syncer.metrics import Metrics, serve_prometheus, write_json_periodically
+
+
+def test_counters_gauges_histograms():
+    m = Metrics(buckets=(1, 5))
+    m.inc('tracks_total', outcome='ok')
+    m.inc('tracks_total', 2, outcome='ok')
+    m.set('sync_queue_depth', 7)
+    with m.in_flight('sync_in_flight'):
+        assert m.snapshot()['gauges']['sync_in_flight'][0]['value'] == 1
+    for value in (0.5, 3, 10):
+        m.observe('query_seconds', value, mode='mp3')
+    with m.timer('query_seconds', mode='mp3') as labels:
+        labels['mode'] = 'flac'
+    snap = m.snapshot()
+    assert snap['counters']['tracks_total'] == [{'labels': {'outcome': 'ok'}, 'value': 3}]
+    assert snap['gauges']['sync_in_flight'][0]['value'] == 0
+    mp3, flac = snap['histograms']['query_seconds']
+    assert mp3['buckets'] == {'1': 1, '5': 2} and mp3['count'] == 3 and mp3['sum'] == 13.5
+    assert flac['labels'] == {'mode': 'flac'} and flac['count'] == 1
+
+
+def test_prometheus_text_and_endpoint():
+    m = Metrics(buckets=(1,))
+    m.describe('query_seconds', 'Query time')
+    m.observe('query_seconds', 2, mode='mp3')
+    m.inc('tracks_total', outcome='ok')
+    text = m.render_prometheus()
+    assert '# TYPE query_seconds histogram' in text
+    assert 'query_seconds_bucket{mode="mp3",le="1"} 0' in text
+    assert 'query_seconds_bucket{mode="mp3",le="+Inf"} 1' in text
+    assert 'tracks_total{outcome="ok"} 1' in text
+    server = serve_prometheus(m, 0)
+    try:
+        body = urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics", timeout=5).read()
+        assert body.decode() == m.render_prometheus()
+    finally:
+        server.shutdown()
+
+
+def test_json_file(tmp_path):
+    m = Metrics()
+    m.inc('tracks_total')
+    path = tmp_path / 'metrics.json'
+    stop = write_json_periodically(m, str(path), interval=60)
+    stop.set()
+    for _ in range(100):
+        if path.exists():
+            break
+        time.sleep(0.01)
+    assert json.loads(path.read_text())['counters']['tracks_total'][0]['value'] == 1
@@ -0,0 +1,75 @@
+import time
+
+from spotify_syncer import notifications
+from spotify_syncer.domain import Track
+from spotify_syncer.events import EventBus
+from spotify_syncer.notifications import NotificationDigest, register
+from spotify_syncer.state import State
+from spotify_syncer.syncer import Syncer
+from test_syncer import DummySP, SlowSearcher, make_tracks
+
+
+class Recorder:
+    def __init__(self):
+        self.messages = []
+    def __call__(self, message, title):
+        self.messages.append(message)
+
+
+def track(i):
+    return Track(id=str(i), uri=f"uri{i}", name=f"Song {i}", artist='Artist')
+
+
+def test_digest_summarises_a_sync():
+    shown = Recorder()
+    digest = NotificationDigest(window=0, notify=shown)
+    digest.on_sync_started()
+    for i in range(5):
+        digest.on_download_success(track(i), seconds=2.0)
+    digest.on_torrent_not_found('q', track_name='Lost', seconds=4.0)
+    assert shown.messages == []
+    digest.on_sync_finished()
+    assert len(shown.messages) == 1
+    summary, names = shown.messages[0].split('\n')
+    assert summary.startswith('✔️ 5 downloaded, ❌ 1 not found in 0s')
+    assert summary.endswith('(avg 2s per track)')
+    assert names == 'Song 0 by Artist, Song 1 by Artist, Song 2 by Artist and 2 more'
+
+
+def test_digest_skips_empty_sync():
+    shown = Recorder()
+    digest = NotificationDigest(window=0, notify=shown)
+    digest.on_sync_started()
+    digest.on_sync_finished()
+    assert shown.messages == []
+
+
+def test_digest_window_flushes_without_sync_end():
+    shown = Recorder()
+    digest = NotificationDigest(window=0.05, notify=shown)
+    digest.on_download_success(track(1))
+    time.sleep(0.2)
+    assert len(shown.messages) == 1
+    assert shown.messages[0].startswith('✔️ 1 downloaded')
+
+
+def test_digest_mode_notifies_once_per_sync(tmp_path, monkeypatch):
+    shown = Recorder()
+    bus = EventBus()
+    monkeypatch.setattr('spotify_syncer.syncer.event_bus', bus)
+    digest = register(bus, 'digest', window=0)
+    digest._notify = shown
+    sp = DummySP(make_tracks(20) + make_tracks(3, prefix='missing'))
+    Syncer(sp, State(str(tmp_path / "state.db")), SlowSearcher(delay=0), workers=4).sync()
+    assert len(shown.messages) == 1
+    assert shown.messages[0].startswith('✔️ 20 downloaded, ❌ 3 not found')
+
+
+def test_per_track_mode(monkeypatch):
+    shown = Recorder()
+    monkeypatch.setattr(notifications, 'notify', lambda message: shown(message, None))
+    bus = EventBus()
+    assert register(bus, 'per_track') is None
+    bus.publish('download_success', track(1), correlation_id='c', seconds=1.0)
+    bus.publish('torrent_not_found', 'q', track_name='Lost', correlation_id='d', seconds=1.0)
+    assert shown.messages == ['✔️ Song 1 by Artist', '❌ Lost not found']
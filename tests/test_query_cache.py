@@ -0,0 +1,46 @@
+import time
+
+from spotify_syncer.domain import Candidate
+from spotify_syncer.query_cache import QueryCache, normalize_query
+from spotify_syncer.state import State
+
+
+def make_cache(tmp_path, **kwargs):
+    return QueryCache(State(str(tmp_path / "cache.db")), **kwargs)
+
+
+def test_normalize_query():
+    assert normalize_query("  Hey   Jude - The BEATLES ") == normalize_query("hey jude the beatles")
+
+
+def test_roundtrip_and_persistence(tmp_path):
+    cache = make_cache(tmp_path)
+    assert cache.get('Hey Jude', 'mp3') is None
+    cache.put('Hey Jude', 'mp3', [Candidate('peer', 'a\\Hey Jude.mp3', size=10, bitrate=320)])
+    cache.put('nothing here', 'mp3', [])
+    reopened = make_cache(tmp_path)
+    assert reopened.get('hey jude', 'mp3') == [Candidate('peer', 'a\\Hey Jude.mp3', size=10, bitrate=320)]
+    assert reopened.get('hey jude', 'flac') is None
+    assert reopened.get('Nothing Here', 'mp3') == []
+
+
+def test_separate_ttls(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path, positive_ttl=100, negative_ttl=10)
+    cache.put('found', 'mp3', [Candidate('peer', 'x.mp3')])
+    cache.put('missing', 'mp3', [])
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 50)
+    assert cache.get('found', 'mp3')
+    assert cache.get('missing', 'mp3') is None
+
+
+def test_lru_eviction(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path, max_entries=2)
+    clock = iter(range(1000, 2000))
+    monkeypatch.setattr(time, 'time', lambda: next(clock))
+    cache.put('a', 'mp3', [])
+    cache.put('b', 'mp3', [])
+    assert cache.get('a', 'mp3') == []
+    cache.put('c', 'mp3', [])
+    assert cache.get('b', 'mp3') is None
+    assert cache.get('a', 'mp3') == [] and cache.get('c', 'mp3') == []
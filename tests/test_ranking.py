@@ -0,0 +1,40 @@
+import time
+
+from spotify_syncer.domain import Candidate, Track
+from spotify_syncer.ranking import CandidateRanker
+
+TRACK = Track(id='1', uri='u', name="Don't Stop Me Now - Remastered 2011", artist='Queen', duration_ms=209000)
+
+
+def test_prefers_studio_version_by_right_artist():
+    cands = [
+        Candidate('a', 'Queen\\Live at Wembley\\Dont Stop Me Now (Live).mp3', size=8_000_000, bitrate=320),
+        Candidate('b', 'Covers\\Some Band - Don\'t Stop Me Now.mp3', size=8_000_000, bitrate=320),
+        Candidate('c', 'Queen\\Jazz\\12 - Don\'t Stop Me Now.mp3', size=8_000_000, bitrate=320),
+        Candidate('d', 'Queen\\Jazz\\01 - Mustapha.mp3', size=8_000_000, bitrate=320),
+    ]
+    ranked = CandidateRanker.for_track(TRACK).rank(cands)
+    assert ranked[0].user == 'c'
+    assert 'd' not in [c.user for c in ranked]
+
+
+def test_quality_and_duration_break_ties():
+    ranker = CandidateRanker.for_track(TRACK)
+    low = Candidate('low', 'Queen - Dont Stop Me Now.mp3', size=5_000_000, bitrate=192)
+    high = Candidate('high', 'Queen - Dont Stop Me Now.mp3', size=8_300_000, bitrate=320, speed=2_000_000)
+    wrong_length = Candidate('long', 'Queen - Dont Stop Me Now.mp3', size=8_300_000, bitrate=320, duration=420)
+    right_length = Candidate('right', 'Queen - Dont Stop Me Now.mp3', size=8_300_000, bitrate=320, duration=210)
+    assert [c.user for c in ranker.rank([low, wrong_length, high, right_length])] == ['right', 'high', 'low', 'long']
+
+
+def test_placeholder_candidate_is_kept():
+    assert CandidateRanker.for_track(TRACK).rank([Candidate('', '')]) == [Candidate('', '')]
+
+
+def test_scores_large_listings_quickly():
+    cands = [Candidate(f'peer{i}', f'Music\\Queen\\Album {i}\\{i:02d} - Dont Stop Me Now.mp3', size=8_000_000,
+                       bitrate=320 - i % 3 * 64, speed=i * 1000) for i in range(500)]
+    started = time.perf_counter()
+    ranked = CandidateRanker.for_track(TRACK).rank(cands)
+    assert len(ranked) == 500
+    assert time.perf_counter() - started < 0.5
@@ -0,0 +1,107 @@
+import threading
+import time
+
+from spotify_syncer.scheduler import SyncScheduler
+
+
+class Runs:
+    """run() stand-in that blocks until released and records overlap."""
+    def __init__(self, searched=1, block=False):
+        self.searched = searched
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+        self.release = threading.Event()
+        if not block:
+            self.release.set()
+    def __call__(self, force):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            self.calls.append(force)
+        self.release.wait(2)
+        with self.lock:
+            self.active -= 1
+        return self.searched
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_triggers_during_a_sync_coalesce_into_one_follow_up():
+    runs = Runs(block=True)
+    scheduler = SyncScheduler(runs, interval=60)
+    scheduler.start()
+    assert wait_for(lambda: scheduler.running)
+    for force in (False, True, False):
+        scheduler.trigger(force=force)
+    runs.release.set()
+    assert wait_for(lambda: len(runs.calls) == 2 and not scheduler.running)
+    time.sleep(0.1)
+    scheduler.stop(timeout=2)
+    # Never two at once; the follow-up is forced because one of the triggers was
+    assert runs.peak == 1
+    assert runs.calls == [False, True]
+
+
+def test_trigger_runs_at_once_when_idle():
+    runs = Runs()
+    scheduler = SyncScheduler(runs, interval=60)
+    scheduler.start(immediately=False)
+    time.sleep(0.05)
+    assert runs.calls == []
+    scheduler.trigger()
+    assert wait_for(lambda: runs.calls == [False])
+    scheduler.stop(timeout=2)
+
+
+def test_missed_ticks_do_not_burst():
+    runs = Runs(block=True)
+    scheduler = SyncScheduler(runs, interval=0.1, jitter=0)
+    scheduler.start()
+    # Several intervals pass while the first sync runs
+    time.sleep(0.4)
+    runs.release.set()
+    assert wait_for(lambda: len(runs.calls) >= 2)
+    finished_first = time.time()
+    time.sleep(0.02)
+    scheduler.stop(timeout=2)
+    # The next run was timed from when the first finished, not from the missed ticks
+    assert len(runs.calls) == 2
+    assert scheduler.next_run_at >= finished_first
+
+
+def test_idle_runs_back_off_and_work_resets_interval():
+    scheduler = SyncScheduler(Runs(searched=0), interval=10, max_interval=35, jitter=0)
+    assert scheduler._next_gap(0) == 20
+    scheduler._gap = 20
+    assert scheduler._next_gap(0) == 35
+    scheduler._gap = 35
+    assert scheduler._next_gap(0) == 35
+    assert scheduler._next_gap(3) == 10
+    assert scheduler._next_gap(None) == 10
+
+
+def test_jitter_spreads_interval():
+    scheduler = SyncScheduler(lambda force: 1, interval=100, jitter=0.2)
+    gaps = {round(scheduler._spread(100)) for _ in range(50)}
+    assert all(80 <= gap <= 120 for gap in gaps)
+    assert len(gaps) > 1
+
+
+def test_sync_errors_keep_the_schedule():
+    calls = []
+    def run(force):
+        calls.append(force)
+        raise RuntimeError('boom')
+    scheduler = SyncScheduler(run, interval=0.02, jitter=0)
+    scheduler.start()
+    assert wait_for(lambda: len(calls) >= 3)
+    scheduler.stop(timeout=2)
@@ -0,0 +1,124 @@
+import subprocess
+import pytest
+
+from spotify_syncer.domain import Candidate
+from spotify_syncer.soulseek_cli import DownloadSession, SoulseekAuth, filter_candidates, is_auth_error, parse_query_output
+
+
+class Result:
+    def __init__(self, stdout='', stderr='', returncode=0):
+        self.stdout = stdout
+        self.stderr = stderr
+        self.returncode = returncode
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = []
+
+    def fake_run(cmd, *args, **kwargs):
+        calls.append(cmd[1])
+        return Result(stdout='3 results found')
+
+    monkeypatch.setattr(subprocess, 'run', fake_run)
+    return calls
+
+
+def test_is_auth_error():
+    assert is_auth_error('Error: Timeout login')
+    assert is_auth_error('read ECONNRESET')
+    assert not is_auth_error('12 results found')
+
+
+def test_probe_cached_until_invalidated(calls):
+    auth = SoulseekAuth(ttl=60)
+    assert auth.ensure()
+    assert auth.ensure()
+    assert calls == ['query']
+    auth.invalidate()
+    assert auth.ensure()
+    assert calls == ['query', 'query']
+
+
+def test_probe_expires_with_ttl(calls):
+    auth = SoulseekAuth(ttl=0)
+    auth.ensure()
+    auth.ensure()
+    assert calls == ['query', 'query']
+
+
+def test_auth_error_triggers_relogin(monkeypatch):
+    calls = []
+    def fake_run(cmd, *args, **kwargs):
+        calls.append(cmd[1])
+        if cmd[1] == 'query' and calls.count('login') == 0:
+            return Result(stderr='Error: timeout login')
+        return Result(stdout='results')
+    monkeypatch.setattr(subprocess, 'run', fake_run)
+    auth = SoulseekAuth('user', 'pass', ttl=60)
+    assert auth.ensure()
+    assert calls == ['query', 'login', 'query']
+
+
+def test_background_login_joined_before_probe(calls):
+    auth = SoulseekAuth('user', 'pass', ttl=60)
+    auth.start_login()
+    assert auth.ensure()
+    assert calls == ['login', 'query']
+
+
+def test_parse_query_output():
+    output = """12 results found
+1. [alice] Music\\Beatles\\Hey Jude.mp3 (320 kbps, 8 MB, 1 MB/s, 7:11)
+2. [bob] /music/hey jude.flac (45.5 MB, no free slots)
+3 - [carol] Beatles - 1 (256 kbps)
+   01 - Hey Jude.mp3 (7 MB)
+"""
+    alice, bob, carol = parse_query_output(output)
+    assert (alice.user, alice.filename, alice.bitrate) == ('alice', 'Hey Jude.mp3', 320)
+    assert alice.size == 8 * 1024 ** 2 and alice.speed == 1024 ** 2 and alice.slots
+    assert alice.duration == 431 and bob.duration is None
+    assert (bob.user, bob.extension, bob.bitrate, bob.slots) == ('bob', 'flac', None, False)
+    assert (carol.user, carol.file, carol.bitrate) == ('carol', 'Beatles - 1/01 - Hey Jude.mp3', 256)
+
+
+def test_filter_candidates():
+    cands = [
+        Candidate('a', 'x.mp3', bitrate=320),
+        Candidate('b', 'y.mp3', bitrate=192),
+        Candidate('c', 'z.flac'),
+        Candidate('d', 'w.mp3'),
+    ]
+    assert [c.user for c in filter_candidates(cands, 'mp3', 256)] == ['a']
+    assert [c.user for c in filter_candidates(cands, 'mp3')] == ['a', 'b', 'd']
+    assert [c.user for c in filter_candidates(cands, 'flac', 320)] == ['c']
+
+
+def test_download_session_chooses_listed_candidate(monkeypatch):
+    import io
+
+    class Proc:
+        def __init__(self, cmd, **kwargs):
+            self.stdout = io.BytesIO(b"1. [a] x.mp3 (320 kbps)\n2. [b] y.mp3 (256 kbps)\n? Choose a file ")
+            self.stdin = io.BytesIO()
+            self.stdin.close = lambda: None
+            self.returncode = None
+        def poll(self):
+            return self.returncode
+        def wait(self, timeout=None):
+            if self.returncode is None:
+                self.returncode = 0
+            return self.returncode
+        def kill(self):
+            self.returncode = -9
+
+    procs = []
+    monkeypatch.setattr(subprocess, 'Popen', lambda cmd, **kw: procs.append(Proc(cmd)) or procs[-1])
+    session = DownloadSession('q', '/tmp')
+    assert [c.user for c in session.start(timeout=5)] == ['a', 'b']
+    assert session.choose(Candidate('b', 'y.mp3'), timeout=5) == 0
+    assert procs[0].stdin.getvalue() == b"2\n"
+    other = DownloadSession('q', '/tmp')
+    other.start(timeout=5)
+    assert other.choose(Candidate('z', 'gone.mp3'), timeout=5) is None
+    assert procs[1].returncode == -9
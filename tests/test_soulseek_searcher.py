@@ -1,14 +1,18 @@
+import io
 import os
 import subprocess
 import shutil
+import time
 import pytest
 
-from spotify_syncer.torrent_searchers import SoulseekSearcher
+from spotify_syncer.domain import Candidate
+from spotify_syncer.torrent_searchers import STAGING_DIRNAME, SearchUnavailable, SoulseekSearcher
 
 
 @pytest.fixture(autouse=True)
 def ensure_download_dir(tmp_path, monkeypatch):
-    monkeypatch.setenv('DOWNLOAD_DIR', str(tmp_path))
+    # DOWNLOAD_DIR is read once at import, so patch the module's copy
+    monkeypatch.setattr('spotify_syncer.torrent_searchers.DOWNLOAD_DIR', str(tmp_path))
     yield
 
 
@@ -19,38 +23,356 @@ def test_soulseek_cli_not_found(monkeypatch):
     assert result is None
 
 
-def test_soulseek_fallback(monkeypatch, tmp_path):
+class FakeStdin:
+    def __init__(self):
+        self.data = ''
+    def write(self, data):
+        self.data += data.decode()
+    def flush(self):
+        pass
+    def close(self):
+        pass
+
+
+class FakeProcess:
+    """Stands in for an interactive `soulseek download` run.
+
+    handler(cmd) returns the listing text; on_choice(cmd, number) is called
+    with the number written to stdin and returns the exit code. Output
+    without a prompt exits 0, like a search that found nothing.
+    """
+    def __init__(self, cmd, handler, on_choice):
+        self.cmd = cmd
+        text = handler(cmd)
+        self.listed = '?' in text
+        self.stdout = io.BytesIO(text.encode())
+        self.stdin = FakeStdin()
+        self.on_choice = on_choice
+        self.returncode = None
+    def poll(self):
+        return self.returncode
+    def wait(self, timeout=None):
+        if self.returncode is None:
+            choice = self.stdin.data.strip()
+            if choice:
+                self.returncode = self.on_choice(self.cmd, int(choice))
+            else:
+                self.returncode = 1 if self.listed else 0
+        return self.returncode
+    def kill(self):
+        self.returncode = -9
+
+
+def fake_soulseek(monkeypatch, calls, handler, on_choice=lambda cmd, number: 0):
     monkeypatch.setattr(shutil, 'which', lambda x: '/usr/local/bin/soulseek')
+    monkeypatch.setattr(subprocess, 'run', lambda cmd, *a, **k: type('Result', (), {'stdout': '', 'stderr': '', 'returncode': 0})())
+
+    def popen(cmd, *args, **kwargs):
+        calls.append(cmd)
+        return FakeProcess(cmd, handler, on_choice)
+    monkeypatch.setattr(subprocess, 'Popen', popen)
+
+
+LISTING = """2 results found
+1. [peer] Music\\other.mp3 (128 kbps, 3 MB)
+2. [peer] Music\\downloaded.mp3 (320 kbps, 4 MB)
+? Choose a file to download
+"""
+
+
+def test_soulseek_fallback(monkeypatch, tmp_path):
     calls = []
+    choices = []
     fallback_query = 'mainquery (extra) - fallback'
 
-    def fake_run(cmd, *args, **kwargs):
-        calls.append(cmd)
-        if cmd[0] == 'soulseek' and cmd[1] == 'query':
-            rc = 0 if any(fallback_query in str(arg) for arg in cmd) else 1
-            class Result:
-                returncode = rc
-            return Result()
-        if cmd[0] == 'soulseek' and cmd[1] == 'download':
-            dest = cmd[cmd.index('--destination') + 1]
-            filepath = os.path.join(dest, 'downloaded.mp3')
-            open(filepath, 'w').close()
-            return None
-        raise RuntimeError('unexpected command')
-
-    monkeypatch.setattr(subprocess, 'run', fake_run)
-    state = iter([[], ['downloaded.mp3']])
-    monkeypatch.setattr(os, 'listdir', lambda d: next(state, ['downloaded.mp3']))
+    def handler(cmd):
+        return LISTING if fallback_query in cmd else 'No search results\n'
 
+    def on_choice(cmd, number):
+        choices.append(number)
+        dest = cmd[cmd.index('--destination') + 1]
+        with open(os.path.join(dest, 'downloaded.mp3'), 'w') as f:
+            f.write('audio')
+        return 0
+
+    fake_soulseek(monkeypatch, calls, handler, on_choice)
     searcher = SoulseekSearcher()
     searcher.sanitize = lambda q: fallback_query
     url = searcher.search('irrelevant')
     assert url and url.startswith('file://')
     assert any(fallback_query in str(c) for c in calls if isinstance(c, list))
+    # The 320 kbps candidate is picked by its listing number, in the same process
+    assert choices == [2]
+    # The file is moved out of its staging directory into DOWNLOAD_DIR
+    assert url == f"file://{tmp_path / 'downloaded.mp3'}"
+    assert os.listdir(tmp_path / STAGING_DIRNAME) == []
+    assert sum(fallback_query in c for c in calls) == 1
+
+
+def test_single_search_per_variant_and_mode(monkeypatch):
+    calls = []
+    fake_soulseek(monkeypatch, calls, lambda cmd: 'No search results\n')
+    searcher = SoulseekSearcher()
+    assert searcher.search('Some Song Artist Name') is None
+    searches = [tuple(c) for c in calls]
+    assert all('--quality' not in c for c in searches)
+    assert len(searches) == len(set(searches))
+    assert len(searches) == 2 * len(searcher.variants('Some Song Artist Name'))
 
 
 def test_soulseek_query_error(monkeypatch):
+    calls = []
+
+    def fail(cmd, *args, **kwargs):
+        calls.append(cmd)
+        raise Exception('fail')
     monkeypatch.setattr(shutil, 'which', lambda x: '/usr/local/bin/soulseek')
-    monkeypatch.setattr(subprocess, 'run', lambda *a, **k: (_ for _ in ()).throw(Exception('fail')))
+    monkeypatch.setattr(subprocess, 'run', fail)
+    monkeypatch.setattr(subprocess, 'Popen', fail)
     searcher = SoulseekSearcher()
-    assert searcher.search('test') is None
\ No newline at end of file
+    assert searcher.search('test') is None
+    assert any(cmd[:2] == ['soulseek', 'download'] for cmd in calls)
+
+def test_auth_failure_is_unavailable_not_a_miss(monkeypatch):
+    calls = []
+    fake_soulseek(monkeypatch, calls, lambda cmd: 'No search results\n')
+    searcher = SoulseekSearcher()
+    monkeypatch.setattr(searcher.auth, 'ensure', lambda: False)
+    with pytest.raises(SearchUnavailable):
+        searcher.search_track('Some Song Artist Name')
+    assert calls == []
+
+
+def test_all_queries_timing_out_is_unavailable(monkeypatch):
+    monkeypatch.setattr(shutil, 'which', lambda x: '/usr/local/bin/soulseek')
+    monkeypatch.setattr(subprocess, 'run', lambda cmd, *a, **k: type('Result', (), {'stdout': '', 'stderr': '', 'returncode': 0})())
+    monkeypatch.setattr(subprocess, 'Popen', lambda cmd, *a, **k: PipeProcess(cmd, None))
+    searcher = SoulseekSearcher(hedge_variants=1)
+    monkeypatch.setattr(searcher, 'query_timeout', lambda mode, default: 0.01)
+    with pytest.raises(SearchUnavailable):
+        searcher.search_track('Song Name')
+
+
+class PipeProcess:
+    """Fake session whose listing only arrives if `listing` is given; otherwise it hangs until killed."""
+    def __init__(self, cmd, listing):
+        read_fd, self._write_fd = os.pipe()
+        self.cmd = cmd
+        self.stdout = os.fdopen(read_fd, 'rb')
+        self.stdin = FakeStdin()
+        self.returncode = None
+        if listing is not None:
+            os.write(self._write_fd, listing.encode())
+            if '?' not in listing:
+                self._exit(0)
+    def _exit(self, code):
+        self.returncode = code
+        os.close(self._write_fd)
+    def poll(self):
+        return self.returncode
+    def wait(self, timeout=None):
+        if self.returncode is None:
+            dest = self.cmd[self.cmd.index('--destination') + 1]
+            with open(os.path.join(dest, 'song.mp3'), 'w') as f:
+                f.write('audio')
+            self._exit(0)
+        return self.returncode
+    def kill(self):
+        if self.returncode is None:
+            self._exit(-9)
+
+
+def test_hedged_variants_first_success_wins(monkeypatch):
+    monkeypatch.setattr(shutil, 'which', lambda x: '/usr/local/bin/soulseek')
+    monkeypatch.setattr(subprocess, 'run', lambda cmd, *a, **k: type('Result', (), {'stdout': '', 'stderr': '', 'returncode': 0})())
+    procs = {}
+
+    def popen(cmd, *args, **kwargs):
+        q = cmd[2]
+        if q == 'Slow Song Live':
+            listing = None  # variant #1 hangs
+        elif q == 'Slow Song':
+            listing = "1. [peer] song.mp3 (320 kbps)\n? Choose a file "
+        else:
+            listing = "No search results\n"
+        procs[q] = PipeProcess(cmd, listing)
+        return procs[q]
+
+    monkeypatch.setattr(subprocess, 'Popen', popen)
+    from spotify_syncer.tracing import tracer
+    monkeypatch.setattr(tracer, 'enabled', True)
+    tracer.clear()
+    searcher = SoulseekSearcher(hedge_variants=3, hedge_slots=2)
+    with tracer.track('track') as correlation_id:
+        url = searcher.search('Slow Song (Live)')
+    assert url and url.endswith('song.mp3')
+    # Spans from the hedge threads carry the track's correlation ID
+    queries = [e for e in tracer.events() if e['name'] == 'soulseek query']
+    assert len(queries) == 2 and {e['args']['correlation_id'] for e in queries} == {correlation_id}
+    tracer.clear()
+    assert procs['Slow Song Live'].returncode == -9
+    assert procs['Slow Song'].stdin.data == '1\n'
+    # Hedge slots are all returned once the race is over
+    assert searcher.hedge_slots.acquire(blocking=False) and searcher.hedge_slots.acquire(blocking=False)
+
+
+def test_hedge_keeps_losing_listings(monkeypatch):
+    calls = []
+
+    def handler(cmd):
+        if cmd[2] == 'Song Name':
+            time.sleep(0.2)  # the winner lists after the loser
+            return "1. [peer] Music\\song.mp3 (320 kbps)\n? Choose a file to download\n"
+        return "1. [peer] Music\\song.ogg (320 kbps)\n? Choose a file to download\n"
+
+    fake_soulseek(monkeypatch, calls, handler, on_choice=lambda cmd, number: 1)
+    searcher = SoulseekSearcher(hedge_variants=2, hedge_slots=1)
+    assert searcher.search('Song Name (Live)') is None
+    # The losing variant's mp3 listing came back before the winner's; the ordered passes reuse it
+    assert [c for c in calls if c[2] == 'Song Name Live' and c[-1] == 'mp3'] == [calls[0]]
+
+
+def test_hedge_returns_slots_when_a_session_cannot_start(monkeypatch):
+    calls = []
+    fake_soulseek(monkeypatch, calls, lambda cmd: 'No search results\n')
+    searcher = SoulseekSearcher(hedge_variants=3, hedge_slots=2)
+    real_new_session = searcher.new_session
+    made = []
+
+    def new_session(q, mode):
+        if len(made) == 2:
+            raise OSError('No space left on device')
+        made.append(real_new_session(q, mode))
+        return made[-1]
+    monkeypatch.setattr(searcher, 'new_session', new_session)
+    with pytest.raises(OSError):
+        searcher.search_track('Song Name - Other (Live)')
+    assert calls == []
+    assert all(not os.path.exists(session.destination) for session in made)
+    assert searcher.hedge_slots.acquire(blocking=False) and searcher.hedge_slots.acquire(blocking=False)
+
+
+def test_promote_keeps_existing_files(monkeypatch, tmp_path):
+    (tmp_path / 'Album').mkdir()
+    (tmp_path / 'Album' / 'song.mp3').write_text('old')
+    searcher = SoulseekSearcher()
+    session = searcher.new_session('q', 'mp3')
+    os.makedirs(os.path.join(session.destination, 'Album'))
+    for name in ('song.mp3', 'other.mp3', 'cover.jpg'):
+        with open(os.path.join(session.destination, 'Album', name), 'w') as f:
+            f.write('new')
+    target = searcher.promote(session.destination, Candidate('peer', 'Album\\song.mp3'))
+    assert target == str(tmp_path / 'Album' / 'song (1).mp3')
+    assert (tmp_path / 'Album' / 'song.mp3').read_text() == 'old'
+    searcher.discard(session)
+    assert not os.path.exists(session.destination)
+
+
+def test_query_cache_skips_known_misses(monkeypatch, tmp_path):
+    from spotify_syncer.query_cache import QueryCache
+    from spotify_syncer.state import State
+    calls = []
+    fake_soulseek(monkeypatch, calls, lambda cmd: 'No search results\n')
+    cache = QueryCache(State(str(tmp_path / 'state.db')))
+    searcher = SoulseekSearcher(cache=cache)
+    assert searcher.search('Some Song Artist Name') is None
+    first = len(calls)
+    assert first and searcher.search('some song, artist name') is None
+    assert len(calls) == first
+
+
+def test_query_cache_ignores_error_exits(monkeypatch, tmp_path):
+    from spotify_syncer.query_cache import QueryCache
+    from spotify_syncer.state import State
+    calls = []
+    fake_soulseek(monkeypatch, calls, lambda cmd: 'Error: connection reset by peer\n')
+    cache = QueryCache(State(str(tmp_path / 'state.db')))
+    searcher = SoulseekSearcher(cache=cache)
+    assert searcher.search('Some Song Artist Name') is None
+    first = len(calls)
+    # Nothing was found, but the search did not complete, so the next sync asks again
+    assert first and searcher.search('some song, artist name') is None
+    assert len(calls) == 2 * first
+
+
+def test_query_cache_hit_still_downloads_from_live_listing(monkeypatch, tmp_path):
+    from spotify_syncer.query_cache import QueryCache
+    from spotify_syncer.state import State
+    calls = []
+
+    def on_choice(cmd, number):
+        dest = cmd[cmd.index('--destination') + 1]
+        with open(os.path.join(dest, 'downloaded.mp3'), 'w') as f:
+            f.write('audio')
+        return 0
+
+    fake_soulseek(monkeypatch, calls, lambda cmd: LISTING if cmd[2] == 'Song Name' else 'No search results\n', on_choice)
+    cache = QueryCache(State(str(tmp_path / 'state.db')))
+    cache.put('Song Name', 'mp3', [Candidate('peer', 'Music\\downloaded.mp3', bitrate=320)])
+    searcher = SoulseekSearcher(cache=cache, hedge_variants=1)
+    assert searcher.search('Song Name').endswith('downloaded.mp3')
+    assert [c[2] for c in calls] == ['Song Name']
+
+
+def test_ranked_candidate_chosen_for_track(monkeypatch):
+    from spotify_syncer.domain import Track
+    calls = []
+    choices = []
+    listing = """3 results found
+1. [peer1] Music\\Artist\\Song Name (Live).mp3 (320 kbps, 9 MB)
+2. [peer2] Music\\Other\\Different Song.mp3 (320 kbps, 9 MB)
+3. [peer3] Music\\Artist\\Song Name.mp3 (320 kbps, 9 MB)
+? Choose a file to download
+"""
+
+    def on_choice(cmd, number):
+        choices.append(number)
+        dest = cmd[cmd.index('--destination') + 1]
+        with open(os.path.join(dest, 'Song Name.mp3'), 'w') as f:
+            f.write('audio')
+        return 0
+
+    fake_soulseek(monkeypatch, calls, lambda cmd: listing, on_choice)
+    searcher = SoulseekSearcher(hedge_variants=1)
+    attempted = []
+    searcher.on_attempt = attempted.append
+    track = Track('id', 'uri', 'Song Name', 'Artist')
+    result = searcher.search_track('Song Name Artist', track)
+    assert choices == [3]
+    assert result.candidate.user == 'peer3'
+    # Each query gives the caller a chance to renew its work-queue lease
+    assert attempted == [track]
+
+
+def test_variant_stats_recorded_per_kind(monkeypatch, tmp_path):
+    from spotify_syncer.state import State
+    from spotify_syncer.variant_stats import VariantStats
+    calls = []
+
+    def on_choice(cmd, number):
+        dest = cmd[cmd.index('--destination') + 1]
+        with open(os.path.join(dest, 'downloaded.mp3'), 'w') as f:
+            f.write('audio')
+        return 0
+
+    fake_soulseek(monkeypatch, calls, lambda cmd: LISTING if cmd[2] == 'Song Name' else 'No search results\n', on_choice)
+    stats = VariantStats(State(str(tmp_path / 'state.db')))
+    searcher = SoulseekSearcher(stats=stats, hedge_variants=1)
+    assert searcher.variant_plan('Song Name (Live)') == [('raw', 'Song Name Live'), ('paren', 'Song Name')]
+    assert searcher.search('Song Name (Live)')
+    summary = stats.summary()
+    assert summary['raw']['tries'] == 1 and summary['raw']['wins'] == 0
+    assert summary['paren']['wins'] == 1
+
+
+def test_adaptive_timeouts_fed_and_used(monkeypatch, tmp_path):
+    from spotify_syncer.state import State
+    from spotify_syncer.timeouts import AdaptiveTimeouts
+    calls = []
+    fake_soulseek(monkeypatch, calls, lambda cmd: 'No search results\n')
+    timeouts = AdaptiveTimeouts(State(str(tmp_path / 'state.db')), min_samples=2)
+    searcher = SoulseekSearcher(timeouts=timeouts, hedge_variants=1)
+    assert searcher.search('Some Song Artist Name') is None
+    assert len(timeouts._samples[('query', 'mp3')]) == len(calls) // 2
+    # Fast misses bring the listing timeout down to the floor
+    assert searcher.query_timeout('mp3', 20) == 5.0
@@ -57,3 +57,75 @@ def test_remove_tracks_error(monkeypatch):
     client.sp = DummySP()
     # Should not raise
     client.remove_tracks(['uri1'])
+
+class PagedSP:
+    """Serves `total` tracks 100 per page and counts item fetches."""
+    def __init__(self, total, snapshot='s1'):
+        self.total = total
+        self.snapshot = snapshot
+        self.item_calls = 0
+    def playlist(self, playlist_id, fields=None):
+        return {'snapshot_id': self.snapshot}
+    def _page(self, offset):
+        self.item_calls += 1
+        end = min(offset + 100, self.total)
+        return {
+            'items': [{'track': {'id': str(i), 'uri': f'uri{i}', 'name': f'T{i}', 'artists': [{'name': 'A'}]}}
+                      for i in range(offset, end)],
+            'next': end if end < self.total else None,
+        }
+    def playlist_items(self, playlist_id):
+        return self._page(0)
+    def next(self, result):
+        return self._page(result['next'])
+
+def test_get_tracks_paginates():
+    client = SpotifyClient()
+    client.sp = PagedSP(250)
+    tracks = client.get_tracks()
+    assert len(tracks) == 250
+    assert tracks[-1].id == '249'
+    assert client.sp.item_calls == 3
+
+def test_get_tracks_reuses_unchanged_snapshot(tmp_path):
+    from spotify_syncer.state import State
+    client = SpotifyClient()
+    client.state = State(str(tmp_path / 'state.db'))
+    client.sp = PagedSP(150)
+    first = client.get_tracks()
+    assert client.sp.item_calls == 2
+    assert client.get_tracks() == first
+    assert client.sp.item_calls == 2
+    client.sp.snapshot = 's2'
+    client.sp.total = 120
+    assert len(client.get_tracks()) == 120
+    assert client.sp.item_calls == 4
+
+def test_remove_tracks_batches_and_retries(monkeypatch):
+    from spotify_syncer import spotify_client
+    sleeps = []
+    monkeypatch.setattr(spotify_client.time, 'sleep', sleeps.append)
+
+    class RateLimited(spotify_client.SpotifyException):
+        def __init__(self):
+            Exception.__init__(self, 'rate limited')
+            self.http_status = 429
+            self.headers = {'Retry-After': '7'}
+
+    class LimitedSP:
+        def __init__(self):
+            self.calls = []
+            self.failed = False
+        def playlist_remove_all_occurrences_of_items(self, playlist_id, uris, snapshot_id=None):
+            if len(self.calls) == 1 and not self.failed:
+                self.failed = True
+                raise RateLimited()
+            self.calls.append((len(uris), snapshot_id))
+            return {'snapshot_id': f'snap{len(self.calls)}'}
+
+    client = SpotifyClient()
+    client.sp = LimitedSP()
+    snapshot = client.remove_tracks([f'uri{i}' for i in range(230)], snapshot_id='snap0')
+    assert client.sp.calls == [(100, 'snap0'), (100, 'snap1'), (30, 'snap2')]
+    assert sleeps == [7.0]
+    assert snapshot == 'snap3'
@@ -0,0 +1,69 @@
+"""Startup budget: what importing and building the app costs before the tray can render."""
+
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Generous for slow CI runners; importing spotify_syncer.container takes ~50ms on a laptop
+IMPORT_BUDGET_SECONDS = 0.5
+CONTAINER_BUDGET_SECONDS = 1.5
+# Only needed once a sync talks to Spotify or a scraping provider runs
+LAZY_MODULES = ('spotipy', 'requests', 'bs4', 'http.server', 'tkinter', 'spotify_env_gui')
+
+
+def run_python(args, tmp_path, **env):
+    return subprocess.run(
+        [sys.executable] + args, cwd=ROOT, capture_output=True, text=True, timeout=60,
+        env=dict(os.environ, HOME=str(tmp_path), DOWNLOAD_DIR=str(tmp_path / 'music'), **env),
+    )
+
+
+def import_times(stderr):
+    """module -> cumulative seconds, from `python -X importtime` output."""
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def test_import_budget(tmp_path):
+    out = run_python(['-X', 'importtime', '-c', 'import spotify_syncer.container'], tmp_path)
+    assert out.returncode == 0, out.stderr
+    times = import_times(out.stderr)
+    assert [m for m in LAZY_MODULES if m in times] == []
+    assert times['spotify_syncer.container'] < IMPORT_BUDGET_SECONDS
+
+
+def test_container_does_not_wait_for_login_or_oauth(tmp_path):
+    # A soulseek login that hangs must not hold up startup
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    (bin_dir / 'soulseek').write_text('#!/bin/sh\nsleep 5\n')
+    (bin_dir / 'soulseek').chmod(0o755)
+    code = (
+        "import sys, time\n"
+        "started = time.perf_counter()\n"
+        "from spotify_syncer.container import Container\n"
+        "Container()\n"
+        "print(time.perf_counter() - started, 'spotipy' in sys.modules)\n"
+    )
+    out = run_python(['-c', code], tmp_path, SOULSEEK_ACCOUNT='user', SOULSEEK_PASSWORD='pass',
+                     PATH=f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}")
+    assert out.returncode == 0, out.stderr
+    seconds, spotipy_loaded = out.stdout.split()
+    assert float(seconds) < CONTAINER_BUDGET_SECONDS
+    assert spotipy_loaded == 'False'
+
+
+def test_importing_config_adds_no_log_handlers(tmp_path):
+    # Import-time warnings (here the localhost redirect rewrite) must not configure the root logger
+    code = "import logging, spotify_syncer.config\nprint(len(logging.getLogger().handlers))\n"
+    out = run_python(['-c', code], tmp_path, SPOTIPY_REDIRECT_URI='http://localhost:8888/callback')
+    assert out.returncode == 0, out.stderr
+    assert out.stdout.strip() == '0'
+    assert '127.0.0.1' in out.stderr
@@ -1,5 +1,6 @@
 import pytest
 import os
+import time
 from spotify_syncer.state import State
 
 def test_state_persistence(tmp_path):
@@ -41,3 +42,85 @@ def test_thread_safety(tmp_path):
         t.join()
     # Should have 100 unique IDs
     assert len(state.downloaded) == 100
+
+def test_write_behind_batches(tmp_path):
+    db_file = tmp_path / "test_wb.db"
+    state = State(str(db_file), write_behind=True, batch_size=3, flush_interval=3600)
+    state.add('a')
+    state.add('b')
+    # visible in memory immediately, not yet committed
+    assert {'a', 'b'} <= state.downloaded
+    assert State(str(db_file)).downloaded == set()
+    state.add('c')
+    assert State(str(db_file)).downloaded == {'a', 'b', 'c'}
+    state.add('d')
+    state.flush()
+    assert State(str(db_file)).downloaded == {'a', 'b', 'c', 'd'}
+
+def test_write_behind_flushes_after_interval(tmp_path):
+    db_file = tmp_path / "test_wb.db"
+    state = State(str(db_file), write_behind=True, batch_size=100, flush_interval=0.05)
+    state.add('a')
+    assert State(str(db_file)).downloaded == set()
+    # No further add() comes along; the timer commits the queued ID on its own
+    deadline = time.monotonic() + 2
+    while State(str(db_file)).downloaded != {'a'} and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert State(str(db_file)).downloaded == {'a'}
+    assert state._flush_timer is None
+
+def test_wal_enabled(tmp_path):
+    state = State(str(tmp_path / "test_wal.db"))
+    assert state.conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+
+def test_migrates_legacy_database(tmp_path):
+    import sqlite3
+    db_file = tmp_path / "legacy.db"
+    conn = sqlite3.connect(str(db_file))
+    conn.execute("CREATE TABLE downloaded(id TEXT PRIMARY KEY)")
+    conn.execute("INSERT INTO downloaded(id) VALUES('old')")
+    conn.commit()
+    conn.close()
+    state = State(str(db_file))
+    assert 'old' in state.downloaded
+    assert state.conn.execute("PRAGMA user_version").fetchone()[0] == 10
+    indexes = {row[1] for row in state.conn.execute("PRAGMA index_list(downloads)")}
+    assert 'idx_downloads_finished_at' in indexes
+
+def test_record_download(tmp_path):
+    from spotify_syncer.domain import Candidate, DownloadResult, Track
+    state = State(str(tmp_path / "records.db"))
+    track = Track(id='t1', uri='u1', name='Song', artist='Artist')
+    result = DownloadResult(path='/music/Song.flac', size=1234, query='Song Artist',
+                            candidate=Candidate('peer', 'Song.flac', bitrate=None), attempts=2,
+                            search_seconds=3.5, download_seconds=10.0)
+    state.record_download(track, result, started_at=100.0, finished_at=114.0)
+    assert 't1' in state.downloaded
+    record = State(str(tmp_path / "records.db")).get_download('t1')
+    assert record['format'] == 'flac' and record['peer'] == 'peer' and record['attempts'] == 2
+    assert state.recent_downloads(1)[0]['track_id'] == 't1'
+
+def test_success_clears_failure(tmp_path):
+    state = State(str(tmp_path / "failures.db"))
+    state.record_failure('t1', 'Song Artist', next_attempt_at=2e9)
+    assert not state.is_due('t1', now=1e9)
+    state.add('t1')
+    assert state.is_due('t1') and State(state.db_path).failure_attempts('t1') == 0
+
+def test_failed_migration_applies_nothing(tmp_path, monkeypatch):
+    import sqlite3
+    from spotify_syncer import state as state_module
+    db = str(tmp_path / "partial.db")
+    base = state_module.MIGRATIONS
+    add_column = "ALTER TABLE playlist_tracks ADD COLUMN extra INTEGER"
+    monkeypatch.setattr(state_module, 'MIGRATIONS', base + ((add_column, "NOT VALID SQL"),))
+    with pytest.raises(sqlite3.OperationalError):
+        State(db)
+    conn = sqlite3.connect(db)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(base)
+    assert 'extra' not in {row[1] for row in conn.execute("PRAGMA table_info(playlist_tracks)")}
+    conn.close()
+    # Once fixed, the same migration applies cleanly instead of hitting "duplicate column"
+    monkeypatch.setattr(state_module, 'MIGRATIONS', base + ((add_column,),))
+    state = State(db)
+    assert state.conn.execute("PRAGMA user_version").fetchone()[0] == len(base) + 1
@@ -0,0 +1,162 @@
+import threading
+import time
+import pytest
+
+from spotify_syncer.domain import DownloadResult, Track
+from spotify_syncer.events import event_bus
+from spotify_syncer.state import State
+from spotify_syncer.syncer import Syncer
+
+
+class DummySP:
+    snapshot_id = 'snap0'
+
+    def __init__(self, tracks):
+        self.tracks = tracks
+        self.removed = []
+        self.batches = []
+    def get_tracks(self):
+        return list(self.tracks)
+    def remove_tracks(self, uris, snapshot_id=None):
+        self.batches.append((list(uris), snapshot_id))
+        self.removed.extend(uris)
+        return f"snap{len(self.batches)}"
+
+
+class SlowSearcher:
+    """Records peak concurrency; fails queries containing 'missing'."""
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+        self.queries = []
+    def search_track(self, query, track=None):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            self.queries.append(query)
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+        if 'missing' in query:
+            return None
+        return DownloadResult(path=f"/tmp/{query}.mp3", size=1, query=query)
+
+
+def make_tracks(n, prefix='song'):
+    return [Track(id=f"{prefix}{i}", uri=f"uri{prefix}{i}", name=f"{prefix}{i}", artist='Artist') for i in range(n)]
+
+
+@pytest.fixture
+def state(tmp_path):
+    return State(str(tmp_path / "state.db"))
+
+
+def test_sync_bounded_pool(state):
+    sp = DummySP(make_tracks(12))
+    searcher = SlowSearcher()
+    Syncer(sp, state, searcher, workers=3, delete_after=True).sync()
+    assert searcher.peak == 3
+    assert len(state.downloaded) == 12
+    record = state.get_download('song5')
+    assert record['path'] == '/tmp/song5 Artist.mp3' and record['format'] == 'mp3'
+    assert record['query'] == 'song5 Artist' and record['finished_at'] >= record['started_at']
+    assert sorted(sp.removed) == sorted(t.uri for t in sp.tracks)
+
+
+def test_sync_skips_downloaded_and_duplicates(state):
+    tracks = make_tracks(3)
+    state.add(tracks[0].id)
+    sp = DummySP(tracks + [tracks[1]])
+    searcher = SlowSearcher(delay=0)
+    Syncer(sp, state, searcher, workers=2, delete_after=False).sync()
+    assert len(searcher.queries) == 2
+    assert state.downloaded == {t.id for t in tracks}
+
+
+def test_sync_publishes_not_found(state):
+    missing = []
+    event_bus.subscribe('torrent_not_found', lambda query, track_name=None, **kwargs: missing.append(track_name))
+    sp = DummySP(make_tracks(2) + make_tracks(2, prefix='missing'))
+    Syncer(sp, state, SlowSearcher(delay=0), workers=4).sync()
+    assert sorted(missing) == ['missing0', 'missing1']
+    assert state.downloaded == {'song0', 'song1'}
+
+
+def test_removals_batched_and_pinned(state):
+    tracks = make_tracks(250)
+    state.add(tracks[0].id)
+    sp = DummySP(tracks)
+    Syncer(sp, state, SlowSearcher(delay=0), workers=8, delete_after=True).sync()
+    assert sorted(sp.removed) == sorted(t.uri for t in tracks)
+    assert [len(b) for b, _ in sp.batches] == [100, 100, 50]
+    # Each batch is pinned to the snapshot the previous write returned
+    assert [snap for _, snap in sp.batches] == ['snap0', 'snap1', 'snap2']
+
+
+def test_failed_tracks_back_off(state):
+    sp = DummySP(make_tracks(1) + make_tracks(1, prefix='missing'))
+    searcher = SlowSearcher(delay=0)
+    syncer = Syncer(sp, state, searcher, workers=2, delete_after=False)
+    syncer.sync()
+    assert state.failure_attempts('missing0') == 1
+    assert not state.is_due('missing0')
+    syncer.sync()
+    assert searcher.queries.count('missing0 Artist') == 1
+    syncer.sync(force=True)
+    assert searcher.queries.count('missing0 Artist') == 2
+    assert state.failure_attempts('missing0') == 2
+    # Backoff survives a restart
+    assert State(state.db_path).failure_attempts('missing0') == 2
+
+
+def test_unsearchable_tracks_do_not_back_off(state):
+    from spotify_syncer.metrics import metrics
+    from spotify_syncer.torrent_searchers import SearchUnavailable
+
+    class LoggedOutSearcher(SlowSearcher):
+        def search_track(self, query, track=None):
+            raise SearchUnavailable("Soulseek login failed")
+
+    metrics.reset()
+    missing = []
+    event_bus.subscribe('torrent_not_found', lambda query, **kwargs: missing.append(query))
+    Syncer(DummySP(make_tracks(2)), state, LoggedOutSearcher(delay=0), workers=2, delete_after=False).sync()
+    assert state.failure_attempts('song0') == 0 and state.is_due('song0')
+    assert missing == []
+    totals = {s['labels']['outcome']: s['value'] for s in metrics.snapshot()['counters']['tracks_total']}
+    assert totals == {'unavailable': 2}
+
+
+def test_backoff_delay_grows_and_caps():
+    from spotify_syncer.syncer import backoff_delay
+    assert 75 <= backoff_delay(1, base=100, cap=1000) <= 100
+    assert 300 <= backoff_delay(3, base=100, cap=1000) <= 400
+    assert backoff_delay(20, base=100, cap=1000) <= 1000
+
+
+def test_library_tracks_are_not_searched(state, tmp_path):
+    from spotify_syncer.library import LibraryIndex
+    (tmp_path / 'music').mkdir()
+    (tmp_path / 'music' / 'Artist - song1.mp3').write_text('audio')
+    library = LibraryIndex(state, str(tmp_path / 'music'))
+    sp = DummySP(make_tracks(3))
+    searcher = SlowSearcher(delay=0)
+    Syncer(sp, state, searcher, workers=2, delete_after=True, library=library).sync()
+    assert sorted(searcher.queries) == ['song0 Artist', 'song2 Artist']
+    assert state.downloaded == {'song0', 'song1', 'song2'}
+    assert sorted(sp.removed) == sorted(t.uri for t in sp.tracks)
+
+
+def test_sync_metrics(state):
+    from spotify_syncer.metrics import metrics
+    metrics.reset()
+    sp = DummySP(make_tracks(3) + make_tracks(1, prefix='missing'))
+    Syncer(sp, state, SlowSearcher(delay=0), workers=2, delete_after=False).sync()
+    snap = metrics.snapshot()
+    totals = {s['labels']['outcome']: s['value'] for s in snap['counters']['tracks_total']}
+    assert totals == {'downloaded': 3, 'not_found': 1}
+    assert snap['gauges']['sync_in_flight'][0]['value'] == 0
+    assert snap['gauges']['sync_queue_depth'][0]['value'] == 0
+    assert snap['histograms']['sync_seconds'][0]['count'] == 1
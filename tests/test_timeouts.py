@@ -0,0 +1,46 @@
+from spotify_syncer.state import State
+from spotify_syncer.timeouts import AdaptiveTimeouts
+
+
+def make(tmp_path, **kwargs):
+    return AdaptiveTimeouts(State(str(tmp_path / 'timeouts.db')), min_samples=10, **kwargs)
+
+
+def test_defaults_until_enough_samples(tmp_path):
+    timeouts = make(tmp_path)
+    for _ in range(9):
+        timeouts.record_query('mp3', 2.0)
+    assert timeouts.query('mp3', 20) == 20
+    timeouts.record_query('mp3', 2.0)
+    assert timeouts.query('mp3', 20) == 5.0  # 2s * 1.5 margin, raised to the 5s floor
+    assert timeouts.query('flac', 25) == 25
+
+
+def test_query_timeout_tracks_p95_and_persists(tmp_path):
+    timeouts = make(tmp_path)
+    for i in range(20):
+        timeouts.record_query('mp3', 8.0 if i < 19 else 30.0)
+    assert timeouts.query('mp3', 20) == 12.0
+    assert make(tmp_path).query('mp3', 20) == 12.0
+
+
+def test_timeouts_push_limit_up(tmp_path):
+    timeouts = make(tmp_path, window=10)
+    for _ in range(10):
+        timeouts.record_query('mp3', 4.0)
+    assert timeouts.query('mp3', 20) == 6.0
+    timeouts.record_query('mp3', 6.0)  # an attempt that hit the 6s limit
+    assert timeouts.query('mp3', 20) == 9.0
+
+
+def test_size_aware_download_deadline(tmp_path):
+    timeouts = make(tmp_path)
+    mb = 1024 * 1024
+    # Without history, a big file still gets more than the default
+    assert timeouts.download('flac', 40 * mb, 60) > 60
+    assert timeouts.download('mp3', 0, 60) == 60
+    for _ in range(10):
+        timeouts.record_download('flac', 20.0, 40 * mb)  # 2 MB/s
+    assert timeouts.download('flac', 40 * mb, 60) == 45.0
+    assert timeouts.download('flac', 200 * mb, 60) == 165.0
+    assert timeouts.download('flac', 0, 60) == 30.0
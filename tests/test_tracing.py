@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from spotify_syncer.domain import Track
+from spotify_syncer.events import event_bus
+from spotify_syncer.state import State
+from spotify_syncer.syncer import Syncer
+from spotify_syncer.tracing import Tracer, current_correlation_id, tracer
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setattr(tracer, 'enabled', True)
+    tracer.clear()
+    yield tracer
+    tracer.clear()
+
+
+def test_disabled_tracer_records_nothing():
+    t = Tracer()
+    with t.track('track') as correlation_id:
+        with t.span('work') as span:
+            span['exit_code'] = 0
+        assert current_correlation_id() == correlation_id
+    assert current_correlation_id() is None
+    assert t.events() == []
+
+
+def test_export_chrome_trace(tmp_path):
+    t = Tracer(enabled=True)
+    with t.track('track', title='Song') as correlation_id:
+        with t.span('soulseek query', cat='cli', argv=['soulseek', 'download', 'Song']) as span:
+            span['exit_code'] = 0
+    path = tmp_path / 'trace.json'
+    t.export(str(path))
+    events = json.loads(path.read_text())['traceEvents']
+    spans = [e for e in events if e['ph'] == 'X']
+    assert [e['name'] for e in spans] == ['soulseek query', 'track']
+    assert all(e['args']['correlation_id'] == correlation_id for e in spans)
+    assert spans[0]['args']['exit_code'] == 0 and spans[0]['dur'] >= 0
+    assert any(e['ph'] == 'M' and e['name'] == 'thread_name' for e in events)
+
+
+class Searcher:
+    def search_track(self, query, track=None):
+        with tracer.span('soulseek query', argv=['soulseek', 'download', query]):
+            return None
+
+
+class SP:
+    snapshot_id = None
+    def get_tracks(self):
+        return [Track(id=f't{i}', uri=f'u{i}', name=f'Song {i}', artist='A') for i in range(3)]
+    def remove_tracks(self, uris, snapshot_id=None):
+        return snapshot_id
+
+
+def test_track_spans_share_correlation_id_with_events(enabled, tmp_path):
+    published = []
+    event_bus.subscribe('torrent_not_found', lambda query, track_name=None, correlation_id=None, **kwargs: published.append(correlation_id))
+    Syncer(SP(), State(str(tmp_path / 'state.db')), Searcher(), workers=3, delete_after=False).sync()
+    tracks = [e for e in enabled.events() if e['name'] == 'track']
+    assert len(tracks) == 3
+    ids = {e['args']['correlation_id'] for e in tracks}
+    assert set(published) == ids
+    for correlation_id in ids:
+        names = [e['name'] for e in enabled.events(correlation_id)]
+        assert names == ['soulseek query', 'state write', 'track']
@@ -0,0 +1,22 @@
+from spotify_syncer.state import State
+from spotify_syncer.variant_stats import VariantStats
+
+PLAN = [('raw', 'a b (c)'), ('sanitized', 'a b c'), ('paren', 'a b'), ('prefix', 'a b c d'), ('prefix', 'a b c d e')]
+
+
+def test_default_order_until_trained(tmp_path):
+    stats = VariantStats(State(str(tmp_path / 'stats.db')), min_samples=10)
+    stats.record({'prefix': 1.0}, 'prefix')
+    assert stats.order(PLAN) == PLAN
+
+
+def test_reorders_by_hit_rate_and_prunes(tmp_path):
+    db = str(tmp_path / 'stats.db')
+    stats = VariantStats(State(db), min_samples=10, prune_after=5)
+    for _ in range(6):
+        stats.record({'raw': 8.0, 'sanitized': 8.0, 'paren': 2.0}, 'paren')
+    stats.record({'raw': 8.0, 'sanitized': 8.0}, 'sanitized')
+    order = [kind for kind, _ in VariantStats(State(db), min_samples=10, prune_after=5).order(PLAN)]
+    # raw never won after 7 tries and is dropped; unseen kinds keep their relative order
+    assert order == ['paren', 'prefix', 'prefix', 'sanitized']
+    assert stats.summary()['paren']['wins'] == 6
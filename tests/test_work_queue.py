@@ -0,0 +1,209 @@
+import threading
+import time
+
+import pytest
+
+from spotify_syncer import work_queue
+from spotify_syncer.domain import Track
+from spotify_syncer.state import State
+from spotify_syncer.syncer import Syncer
+from spotify_syncer.work_queue import WorkQueue
+from test_syncer import DummySP, SlowSearcher, make_tracks
+
+
+@pytest.fixture
+def state(tmp_path):
+    return State(str(tmp_path / "state.db"))
+
+
+def statuses(state):
+    return dict(state.conn.execute("SELECT track_id, status FROM jobs").fetchall())
+
+
+def test_claims_by_priority_then_playlist_order(state):
+    queue = WorkQueue(state)
+    queue.enqueue(make_tracks(2, prefix='retry'), work_queue.PRIORITY_RETRY)
+    queue.enqueue(make_tracks(2, prefix='new'), work_queue.PRIORITY_NEW)
+    claimed = [queue.claim().id for _ in range(4)]
+    assert claimed == ['new0', 'new1', 'retry0', 'retry1']
+    assert queue.claim() is None
+    assert queue.counts() == {'searching': 4}
+
+
+def test_job_lifecycle(state):
+    queue = WorkQueue(state)
+    track = Track(id='t', uri='u', name='Song', artist='A', duration_ms=1000)
+    queue.enqueue([track])
+    assert queue.claim() == track
+    queue.mark_downloading(track)
+    assert statuses(state) == {'t': 'downloading'}
+    queue.complete('t')
+    assert statuses(state) == {'t': 'done'}
+    # Enqueueing again (e.g. the download record was lost) reopens a finished job
+    queue.enqueue([track])
+    assert statuses(state) == {'t': 'pending'}
+
+
+def test_enqueue_keeps_jobs_in_progress(state):
+    queue = WorkQueue(state)
+    tracks = make_tracks(2)
+    queue.enqueue(tracks)
+    queue.claim()
+    queue.enqueue(tracks)
+    assert statuses(state) == {'song0': 'searching', 'song1': 'pending'}
+
+
+def test_concurrent_claims_never_share_a_job(state):
+    queues = [WorkQueue(state) for _ in range(4)]
+    queues[0].enqueue(make_tracks(50))
+    claimed = []
+    lock = threading.Lock()
+
+    def worker(queue):
+        while True:
+            track = queue.claim()
+            if track is None:
+                return
+            with lock:
+                claimed.append(track.id)
+
+    threads = [threading.Thread(target=worker, args=(q,)) for q in queues]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(claimed) == sorted(t.id for t in make_tracks(50))
+
+
+def test_expired_lease_is_reclaimed(state):
+    first, second = WorkQueue(state, lease_seconds=-1), WorkQueue(state)
+    first.enqueue(make_tracks(1))
+    assert first.claim().id == 'song0'
+    assert second.claim().id == 'song0'
+    assert state.conn.execute("SELECT attempts, lease_owner FROM jobs").fetchone() == (2, second.owner)
+
+
+def test_recover_only_dead_owners_on_this_host(state, monkeypatch):
+    queue = WorkQueue(state)
+    host = queue.owner.split(':')[0]
+    queue.enqueue(make_tracks(3))
+    state.conn.executemany(
+        "UPDATE jobs SET status = 'downloading', lease_owner = ?, lease_expires_at = 9e12 WHERE track_id = ?",
+        [(f"{host}:999999:dead", 'song0'), ('otherhost:1:x', 'song1'), (queue.owner, 'song2')],
+    )
+    state.conn.commit()
+    monkeypatch.setattr(work_queue.os, 'kill', lambda pid, sig: (_ for _ in ()).throw(ProcessLookupError()))
+    assert queue.recover() == 1
+    assert statuses(state) == {'song0': 'pending', 'song1': 'downloading', 'song2': 'downloading'}
+
+
+def test_recover_earlier_run_of_same_pid(state):
+    # os.execv keeps the PID, so a lease from before an update restart has a different token
+    before = WorkQueue(state)
+    before.enqueue(make_tracks(1))
+    before.claim()
+    after = WorkQueue(state)
+    assert after.recover() == 1
+    assert after.claim().id == 'song0'
+
+
+class CrashingSearcher(SlowSearcher):
+    """Dies (like the process being killed) on the track named crash_on."""
+    def __init__(self, crash_on):
+        super().__init__(delay=0)
+        self.crash_on = crash_on
+    def search_track(self, query, track=None):
+        if track is not None and track.id == self.crash_on:
+            raise SystemExit('killed')
+        return super().search_track(query, track)
+
+
+def test_sync_resumes_interrupted_work(tmp_path):
+    db = str(tmp_path / "state.db")
+    tracks = make_tracks(6)
+    state = State(db)
+    queue = WorkQueue(state)
+    syncer = Syncer(DummySP(tracks), state, CrashingSearcher('song3'), workers=1, delete_after=False, queue=queue)
+    with pytest.raises(SystemExit):
+        syncer.sync()
+    done = set(state.downloaded)
+    assert done == {'song0', 'song1', 'song2'}
+    # Simulate the process dying mid-track: its job was still leased
+    state.conn.execute(
+        "UPDATE jobs SET status = 'searching', lease_owner = ? WHERE track_id = 'song3'", (queue.owner,)
+    )
+    state.conn.commit()
+    del state, syncer
+
+    # Restart: a new process sees song3 leased by an earlier run and the rest still pending;
+    # song5 was removed from the playlist meanwhile, so its leftover job is dropped
+    state = State(db)
+    searcher = SlowSearcher(delay=0)
+    processed = Syncer(DummySP(tracks[:5]), state, searcher, workers=2, delete_after=False,
+                       queue=WorkQueue(state)).sync()
+    assert processed == 2
+    assert sorted(searcher.queries) == ['song3 Artist', 'song4 Artist']
+    assert state.downloaded == {t.id for t in tracks[:5]}
+    assert statuses(state)['song5'] == 'failed'
+
+
+def test_leftover_jobs_respect_backoff(state):
+    tracks = make_tracks(2)
+    queue = WorkQueue(state)
+    queue.enqueue(tracks)
+    state.record_failure('song1', 'song1 Artist', 9e12)
+    searcher = SlowSearcher(delay=0)
+    assert Syncer(DummySP(tracks), state, searcher, workers=1, delete_after=False, queue=queue).sync() == 1
+    assert searcher.queries == ['song0 Artist']
+    assert statuses(state) == {'song0': 'done', 'song1': 'failed'}
+
+
+def test_queue_depth_counts_skipped_jobs(state):
+    from spotify_syncer.metrics import metrics
+    tracks = make_tracks(1)
+    queue = WorkQueue(state)
+    # Leftovers claimed ahead of the playlist: one no longer listed, one downloaded meanwhile
+    queue.enqueue(make_tracks(2, prefix='gone'), priority=2)
+    state.add('gone1')
+    depths = []
+
+    class GaugeSearcher(SlowSearcher):
+        def search_track(self, query, track=None):
+            depths.append(metrics.snapshot()['gauges']['sync_queue_depth'][0]['value'])
+            return super().search_track(query, track)
+
+    metrics.reset()
+    assert Syncer(DummySP(tracks), state, GaugeSearcher(delay=0), workers=1, delete_after=False, queue=queue).sync() == 1
+    assert depths == [0]
+
+
+def test_renew_extends_only_own_expiring_leases(state):
+    queue = WorkQueue(state, lease_seconds=100)
+    other = WorkQueue(state, lease_seconds=100)
+    tracks = make_tracks(2)
+    queue.enqueue(tracks)
+    queue.claim()
+    other.claim()
+
+    def expiry(track_id):
+        return state.conn.execute("SELECT lease_expires_at FROM jobs WHERE track_id = ?", (track_id,)).fetchone()[0]
+    state.conn.execute("UPDATE jobs SET lease_expires_at = lease_expires_at - 90")
+    state.conn.commit()
+    before = expiry('song1')
+    queue.renew(tracks[0])
+    queue.renew(tracks[1])
+    assert expiry('song0') > time.time() + 90
+    assert expiry('song1') == before
+    # A lease with more than half left is not rewritten
+    renewed = expiry('song0')
+    queue.renew(tracks[0])
+    assert expiry('song0') == renewed
+
+
+def test_sync_marks_jobs_done_and_failed(state):
+    queue = WorkQueue(state)
+    sp = DummySP(make_tracks(3) + make_tracks(1, prefix='missing'))
+    assert Syncer(sp, state, SlowSearcher(delay=0), workers=2, queue=queue).sync() == 4
+    assert queue.counts() == {'done': 3, 'failed': 1}
+    # Nothing is claimed twice, and a second sync has nothing due
+    assert Syncer(sp, state, SlowSearcher(delay=0), workers=2, queue=queue).sync() == 0